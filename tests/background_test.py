@@ -0,0 +1,94 @@
+""" Testing writing and reading of background word rates
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_approx_equal
+
+from twords.twords import Twords
+from twords.background import write_background, read_background_npz, \
+    BackgroundBuilder
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "sample_java_data.csv")
+
+
+class TestBackgroundFiles(object):
+
+    def test_csv_and_npz_match(self, tmpdir):
+        csv_path = str(tmpdir.join("background.csv"))
+        npz_path = str(tmpdir.join("background.npz"))
+        write_background([u"sat", u"cat", u"caf\xe9"], [1, 6, 3], csv_path,
+                         npz_path)
+
+        background = pd.read_csv(csv_path, encoding='utf-8')
+        assert background.word.tolist() == [u"cat", u"caf\xe9", u"sat"]
+        assert background.occurrences.tolist() == [6, 3, 1]
+
+        twit = Twords()
+        twit.background_path = csv_path
+        twit.create_Background_dict()
+        from_csv = twit.background_dict
+        twit.background_path = npz_path
+        twit.create_Background_dict()
+        assert twit.background_dict == read_background_npz(npz_path)
+        assert sorted(twit.background_dict.keys()) == sorted(from_csv.keys())
+        for word in from_csv:
+            assert_approx_equal(twit.background_dict[word][0],
+                                from_csv[word][0])
+            assert twit.background_dict[word][1] == from_csv[word][1]
+        assert_approx_equal(twit.background_dict[u"cat"][0], 0.6)
+
+    def test_frequencies_relative_to_total(self, tmpdir):
+        csv_path = str(tmpdir.join("background.csv"))
+        write_background([u"cat", u"sat"], [6, 1], csv_path, total=10)
+        background = pd.read_csv(csv_path, encoding='utf-8')
+        assert background.frequency.tolist() == [0.6, 0.1]
+
+
+def write_lines(path, lines, mode="w"):
+    with open(path, mode) as f:
+        f.writelines(lines)
+
+
+class TestBackgroundBuilder(object):
+
+    def build(self, raw_folder, output_path, **kwargs):
+        builder = BackgroundBuilder(str(raw_folder), str(output_path),
+                                    stop_words=[u"the", u"a"], processes=1,
+                                    **kwargs)
+        builder.build()
+        return pd.read_csv(str(output_path), encoding='utf-8') \
+            .sort_values("word").reset_index(drop=True)
+
+    def test_resumed_build_matches_full_build(self, tmpdir):
+        with open(SAMPLE) as f:
+            lines = f.readlines()
+        header, tweets = lines[0], lines[1:]
+
+        full_folder = tmpdir.mkdir("full")
+        write_lines(str(full_folder.join("a.csv")), [header] + tweets[:5])
+        write_lines(str(full_folder.join("b.csv")), [header] + tweets[5:])
+        full = self.build(full_folder, tmpdir.join("full.csv"))
+
+        # first run sees only part of a.csv, the second run counts the rest
+        # of a.csv and the new b.csv from the saved state
+        folder = tmpdir.mkdir("incremental")
+        write_lines(str(folder.join("a.csv")), [header] + tweets[:2])
+        self.build(folder, tmpdir.join("incremental.csv"),
+                   checkpoint_every=1)
+        write_lines(str(folder.join("a.csv")), tweets[2:5], mode="a")
+        write_lines(str(folder.join("b.csv")), [header] + tweets[5:])
+        incremental = self.build(folder, tmpdir.join("incremental.csv"),
+                                 checkpoint_every=1)
+
+        assert incremental.word.tolist() == full.word.tolist()
+        assert incremental.occurrences.tolist() == \
+            full.occurrences.tolist()
+        assert_approx_equal(full.frequency.sum(), 1.)
+
+        # words below min_count are left out but still count in the total
+        rare = self.build(full_folder, tmpdir.join("rare.csv"), min_count=2)
+        assert len(rare) < len(full)
+        total = float(full.occurrences.sum())
+        assert np.allclose(rare.frequency, rare.occurrences/total)
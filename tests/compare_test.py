@@ -0,0 +1,57 @@
+""" Testing comparison of several corpora
+"""
+from math import log
+
+import nltk
+from numpy.testing import assert_approx_equal
+
+from twords.compare import compare_corpora
+
+
+def g2(a, b, c, d):
+    """ Log-likelihood of one word, computed the slow way. """
+    e1 = c*(a + b)/float(c + d)
+    e2 = d*(a + b)/float(c + d)
+    return 2*((a*log(a/e1) if a else 0) + (b*log(b/e2) if b else 0))
+
+
+class TestCompareCorpora(object):
+
+    corpora = {"brexit": nltk.FreqDist({u"eu": 30, u"vote": 10, u"cat": 1}),
+               "trump": {u"wall": 20, u"vote": 20}}
+    background_dict = {u"vote": (0.001, 100), u"cat": (0.002, 200)}
+
+    def test_counts_matrix(self):
+        comparison = compare_corpora(self.corpora)
+        assert comparison.names == ["brexit", "trump"]
+        counts = comparison.to_frame(comparison.counts)
+        assert counts.loc["brexit", u"eu"] == 30
+        assert counts.loc["trump", u"eu"] == 0
+        assert comparison.totals.tolist() == [41, 40]
+        assert len(compare_corpora(self.corpora, min_count=2).words) == 3
+
+    def test_given_words(self):
+        comparison = compare_corpora(self.corpora,
+                                     words=[u"vote", u"dog", u"eu"])
+        assert comparison.counts.tolist() == [[10, 0, 30], [20, 0, 0]]
+        # totals still count every word of each corpus
+        assert comparison.totals.tolist() == [41, 40]
+
+    def test_log_likelihood_against_rest_and_background(self):
+        comparison = compare_corpora(self.corpora, self.background_dict)
+        vote = list(comparison.words).index(u"vote")
+        rest = comparison.log_likelihoods("rest")
+        assert_approx_equal(rest[0, vote], -g2(10, 20, 41, 40))
+        assert_approx_equal(rest[1, vote], g2(20, 10, 40, 41))
+
+        # background corpus is 100000 words
+        background = comparison.log_likelihoods("background")
+        assert_approx_equal(background[0, vote], g2(10, 100, 41, 100000))
+        ratios = comparison.log_ratios("background")
+        assert_approx_equal(ratios[0, vote], log((10/41.)/0.001))
+        assert ratios[0, list(comparison.words).index(u"eu")] == 0
+
+    def test_top_words(self):
+        comparison = compare_corpora(self.corpora)
+        top = comparison.top_words("trump", n=2, reference="brexit")
+        assert top.word.tolist() == [u"wall", u"vote"]
@@ -0,0 +1,58 @@
+""" Testing keyword in context concordances
+"""
+import pandas as pd
+
+from twords.twords import Twords
+from twords.textstore import TextStore
+from twords.concordance import TokenIndex
+
+TEXTS = [u"vote leave today",
+         u"i will vote leave, obviously",
+         u"vote",
+         u"please vote remain today",
+         u"caf\xe9 vote leave"]
+
+
+class TestConcordance(object):
+
+    def test_concordance(self):
+        index = TokenIndex(TextStore.from_texts(TEXTS))
+        lines = index.concordance(u"vote", width=2)
+        assert lines["row"].tolist() == [0, 1, 2, 3, 4]
+        assert lines["left"].tolist() == [u"", u"i will", u"", u"please",
+                                          u"caf\xe9"]
+        # context stops at the end of the tweet
+        assert lines["right"].tolist() == [u"leave today", u"leave ,", u"",
+                                           u"remain today", u"leave"]
+        assert len(index.concordance(u"missing")) == 0
+        assert len(index.concordance(u"vote", max_lines=2)) == 2
+
+    def test_patterns(self):
+        index = TokenIndex(TextStore.from_texts(TEXTS))
+        patterns = index.patterns(u"vote", left=0, right=1)
+        assert patterns["right"].tolist() == [u"leave", u"", u"remain"]
+        assert patterns["occurrences"].tolist() == [3, 1, 1]
+        assert patterns["example row"].tolist() == [0, 2, 3]
+
+    def test_twords_concordance(self):
+        twit = Twords()
+        twit.tweets_df = pd.DataFrame({"text": TEXTS})
+        lines = twit.concordance("leave", width=1)
+        assert lines["left"].tolist() == [u"vote"]*3
+        assert twit.token_index() is twit.token_index()
+        assert twit.concordance_patterns("today", left=1, right=0)[
+            "occurrences"].tolist() == [1, 1]
+
+    def test_newlines_inside_texts(self):
+        index = TokenIndex(TextStore.from_texts([u"vote\nleave", u"vote"]))
+        lines = index.concordance(u"vote", width=1)
+        assert lines["row"].tolist() == [0, 1]
+        assert lines["right"].tolist() == [u"leave", u""]
+
+    def test_token_index_survives_word_counts(self):
+        twit = Twords()
+        twit.tweets_df = pd.DataFrame({"text": TEXTS})
+        token_index = twit.token_index()
+        twit.add_stop_words([u"today"])
+        twit.make_nltk_object_from_word_bag([u"vote", u"leave"])
+        assert twit.token_index() is token_index
@@ -0,0 +1,59 @@
+""" Testing tweet date normalization and date range slicing
+"""
+import numpy as np
+import pandas as pd
+
+from twords.twords import Twords
+from twords.dates import DateIndex, normalize_dates
+
+HEADER = "username;date;retweets;favorites;text;geo;mentions;hashtags;id;" \
+         "permalink\n"
+
+
+def line(i, date, text):
+    return 'user%d;%s;0;0;"%s";;;;"%d";https://twitter.com/user%d/status/' \
+           '%d\n' % (i, date, text, i, i, i)
+
+
+class TestDates(object):
+
+    def test_normalize_dates(self):
+        dates = normalize_dates(np.array([u"2016/06/25", u"2016-06-20",
+                                          np.nan, u"not a date",
+                                          u"2016/06/25"], dtype=object))
+        assert dates.dtype == np.dtype("datetime64[ns]")
+        assert str(dates[0])[:10] == "2016-06-25"
+        assert str(dates[1])[:10] == "2016-06-20"
+        assert np.isnat(dates[2]) and np.isnat(dates[3])
+        assert (normalize_dates(dates) == dates)[[0, 1, 4]].all()
+
+    def test_date_index_rows(self):
+        dates = normalize_dates(np.array([u"2016/06/19", u"2016/06/20",
+                                          u"2016/06/20", u"2016/06/26",
+                                          u"2016/06/27", None], dtype=object))
+        index = DateIndex(dates)
+        assert index.rows("2016-06-20", "2016-06-26") == slice(1, 4)
+        assert index.rows(end="2016-06-19") == slice(0, 1)
+        # tweets without a date are in no range
+        assert index.rows() == slice(0, 5)
+        assert index.rows("2016-07-01") == slice(5, 5)
+        assert index.last_date() == pd.Timestamp("2016-06-27")
+
+    def test_loaded_tweets_sorted_and_sliced(self, tmpdir):
+        path = tmpdir.join("tweets.csv")
+        path.write(HEADER + line(1, "2016/06/27", "latest") +
+                   line(2, "2016/06/21", "middle") +
+                   line(3, "2016/06/19", "earliest") +
+                   line(4, "2016/06/21", "middle again"))
+        twit = Twords()
+        twit.data_path = str(path)
+        twit.get_tweets_from_single_java_csv()
+        assert pd.api.types.is_datetime64_any_dtype(twit.tweets_df["date"])
+        # sorted by date, file order kept within a date
+        assert twit.tweets_df.text.tolist() == [u"earliest", u"middle",
+                                                u"middle again", u"latest"]
+        week = twit.tweets_in_date_range("2016-06-20", "2016-06-26")
+        assert week.text.tolist() == [u"middle", u"middle again"]
+        rows = twit.date_range_rows("2016-06-20", "2016-06-26")
+        assert twit.text_store().joined(rows.start, rows.stop) == \
+            u"middle\nmiddle again\n"
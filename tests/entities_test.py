@@ -0,0 +1,47 @@
+""" Testing hashtag and mention analytics
+"""
+import numpy as np
+import pandas as pd
+
+from twords.twords import Twords
+
+
+def make_twords():
+    twit = Twords()
+    twit.tweets_df = pd.DataFrame(
+        {"date": [u"2016/06/25", u"2016/06/26", u"2016/07/01", u"2016/07/02"],
+         "hashtags": [u"#brexit #eu", u"#brexit #brexit #leave", np.nan,
+                      u"#eu #brexit"],
+         "mentions": [u"@bbc", u"", u"@bbc @guardian", u"@bbc"]},
+        columns=["date", "hashtags", "mentions"])
+    return twit
+
+
+class TestEntityAnalytics(object):
+
+    def test_counts(self):
+        analytics = make_twords().entity_analytics()
+        # repeated hashtag in a tweet counts once
+        top = analytics.most_common("hashtags")
+        assert top.entity.tolist() == [u"#brexit", u"#eu", u"#leave"]
+        assert top.tweets.tolist() == [3, 2, 1]
+        assert analytics.hashtags.id_of("#nothere") == -1
+
+        by_month = analytics.counts_by_period("mentions", freq="M")
+        assert by_month.loc[pd.Period("2016-06", "M"), u"@bbc"] == 1
+        assert by_month.loc[pd.Period("2016-07", "M"), u"@bbc"] == 2
+
+    def test_cooccurrence(self):
+        twit = make_twords()
+        analytics = twit.entity_analytics()
+        neighbours = analytics.top_neighbours(u"#brexit")
+        assert neighbours.entity.tolist() == [u"#eu", u"#leave"]
+        assert neighbours.tweets.tolist() == [2, 1]
+
+        mentions = analytics.top_neighbours(u"#eu", other="mentions")
+        assert mentions.entity.tolist() == [u"@bbc"]
+        assert mentions.tweets.tolist() == [2]
+
+        assert twit.entity_analytics() is analytics
+        twit.lower_tweets()
+        assert twit.entity_analytics() is not analytics
@@ -0,0 +1,64 @@
+""" Testing the parser for java GetOldTweets csv files
+"""
+import os
+
+import pandas as pd
+
+from twords.java_csv import parse_java_csv_bytes, read_java_csv
+
+HEADER = "username;date;retweets;favorites;text;geo;mentions;hashtags;id;" \
+         "permalink\n"
+
+
+def line(i, text, mentions=""):
+    return 'user%d;2016/06/25;%d;0;"%s";;%s;;"%d";' \
+           'https://twitter.com/user%d/status/%d\n' % (i, i, text, mentions,
+                                                       i, i, i)
+
+
+class TestParseJavaCsv(object):
+
+    def test_tweets_with_semicolons_and_quotes_are_kept(self):
+        data = HEADER + line(1, "plain tweet", "@someone") + \
+               line(2, "first; second;; third") + \
+               line(3, 'he said "hi"; then left') + line(4, "last tweet")
+        tweets, num_malformed = parse_java_csv_bytes(data)
+        assert num_malformed == 0
+        assert tweets.text.tolist() == [u"plain tweet",
+                                        u"first; second;; third",
+                                        u'he said "hi"; then left',
+                                        u"last tweet"]
+        assert tweets.id.tolist() == [1, 2, 3, 4]
+        assert tweets.retweets.tolist() == [1, 2, 3, 4]
+        assert tweets.mentions[0] == u"@someone"
+        assert pd.isnull(tweets.mentions[1])
+
+    def test_malformed_lines_are_counted(self):
+        data = HEADER + line(1, "good tweet") + "broken;line\n" + \
+               line(2, "another good tweet")
+        tweets, num_malformed = parse_java_csv_bytes(data)
+        assert num_malformed == 1
+        assert tweets.id.tolist() == [1, 2]
+
+    def test_read_only_some_columns(self):
+        tweets, num_malformed = parse_java_csv_bytes(
+            HEADER + line(1, "tweet"), columns=["username", "id"])
+        assert list(tweets.columns) == ["username", "id"]
+
+    def test_read_complete_lines_only(self, tmpdir):
+        path = str(tmpdir.join("tweets.csv"))
+        first_line = line(1, "finished tweet")
+        with open(path, "w") as f:
+            f.write(HEADER + first_line + line(2, "unfinished")[:15])
+        tweets, end, num_malformed = read_java_csv(path,
+                                                   complete_lines_only=True)
+        assert tweets.text.tolist() == [u"finished tweet"]
+        assert end == len(HEADER + first_line)
+
+    def test_read_sample_file(self):
+        sample_java_data = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "sample_java_data.csv")
+        tweets, end, num_malformed = read_java_csv(sample_java_data)
+        assert tweets.username[0] == u"EdgeyStew"
+        assert tweets.text[0] == u"Oh no Brexit has broken Al's WiFi"
+        assert tweets.id[0] == 746855422687076352
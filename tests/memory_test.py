@@ -0,0 +1,103 @@
+""" Testing memory accounting and the memory budget
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+from twords.twords import Twords
+from twords.textstore import TextStore
+from twords.memory import deep_size, column_size, attribute_sizes, \
+    word_bag_estimates, ingestion_estimates
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "sample_java_data.csv")
+
+TEXTS = [u"Vote Leave today", u"vote remain!", u"Caf\xe9 #Brexit"] * 1000
+
+
+def make_twords():
+    twit = Twords()
+    twit.tweets_df = pd.DataFrame({"text": TEXTS,
+                                   "username": [u"User"] * len(TEXTS)})
+    return twit
+
+
+class TestDeepSize(object):
+
+    def test_containers(self):
+        words = [u"word%d" % i for i in range(100)]
+        exact = sys.getsizeof(words) + sum(sys.getsizeof(w) for w in words)
+        assert deep_size(words) == exact
+        # large containers are measured on a sample
+        assert abs(deep_size(words, sample_size=10) - exact) < 0.05*exact
+        counts = dict((w, 1) for w in words)
+        assert deep_size(counts) > sum(sys.getsizeof(w) for w in words)
+        assert deep_size(TextStore.from_texts(TEXTS)) > len(TEXTS)
+
+    def test_sampled_frame(self):
+        frame = make_twords().tweets_df
+        exact = frame.memory_usage(deep=True).sum()
+        # object columns are measured on a sample of their strings
+        assert abs(deep_size(frame, sample_size=700) - exact) < 0.05*exact
+        assert column_size(frame["text"], sample_size=700) < exact
+
+    def test_word_bag_estimates(self):
+        estimates = word_bag_estimates(TextStore.from_texts(TEXTS),
+                                       stop_words=[u"today"], chunk_size=300)
+        assert 0 < estimates["word_bag"] < estimates["tokens"]
+        assert estimates["chunk tokens"] == estimates["tokens"] // 10
+
+
+class TestMemoryBudget(object):
+
+    def test_memory_report(self):
+        twit = make_twords()
+        twit.data_path = SAMPLE
+        report = twit.memory_report()
+        held = report[report["stage"] == "held"].set_index("item")["bytes"]
+        assert held["tweets_df"] > 0
+        assert held["original tweets"] == 0
+        assert set(report["stage"]) == set(["held", "create_word_bag",
+                                            "cleaning", "ingestion"])
+
+    def test_cleaning_in_chunks(self):
+        twit = make_twords()
+        twit.lower_tweets()
+        expected = twit.tweets_df.copy()
+        twit = make_twords()
+        # leave less free memory than a copy of the text column
+        held = sum(attribute_sizes(twit).values())
+        twit.memory_budget = held + twit._column_bytes("text") // 4
+        twit.lower_tweets()
+        assert twit.tweets_df.equals(expected)
+
+    def test_fail_fast(self):
+        twit = make_twords()
+        twit.memory_budget = 1000
+        with pytest.raises(MemoryError):
+            twit.create_word_bag()
+        with pytest.raises(MemoryError):
+            twit.get_java_tweets_from_csv_list([SAMPLE])
+        assert len(twit.tweets_df) == len(TEXTS)
+
+    def test_budget_counts_text_store(self):
+        twit = make_twords()
+        held = sum(size for name, size in attribute_sizes(twit).items()
+                   if name != "word_bag")
+        estimates = word_bag_estimates(TextStore.from_texts(TEXTS),
+                                       stop_words=twit.stop_words)
+        # the word bag alone would fit, but not with the text store
+        twit.memory_budget = held + estimates["words_string"] + \
+            estimates["tokens"] + estimates["word_bag"]
+        with pytest.raises(MemoryError):
+            twit.create_word_bag()
+
+    def test_ingestion_estimates(self):
+        estimates = ingestion_estimates([SAMPLE],
+                                        sample_bytes=2000)
+        twit = Twords()
+        twit.data_path = SAMPLE
+        twit.get_tweets_from_single_java_csv()
+        assert abs(estimates["tweets"] - len(twit.tweets_df)) < \
+            0.25*len(twit.tweets_df)
@@ -0,0 +1,36 @@
+""" Testing headless rendering of word frequency charts
+"""
+import os
+
+import pandas as pd
+
+from twords.twords import Twords
+from twords.plotting import render_word_frequency_charts
+
+
+def word_freq_df(num_words):
+    return pd.DataFrame({"word": [u"word%d" % i for i in range(num_words)],
+                         "occurrences": range(num_words, 0, -1)},
+                        columns=["word", "occurrences"])
+
+
+class TestPlotting(object):
+
+    def test_long_tables_are_paginated(self, tmpdir):
+        twit = Twords()
+        twit.word_freq_df = word_freq_df(25)
+        files = twit.save_word_frequency_plot("occurrences",
+                                              str(tmpdir.join("chart.png")),
+                                              words_per_page=10)
+        assert [os.path.basename(path) for path in files] == \
+            ["chart_page1.png", "chart_page2.png", "chart_page3.png"]
+        assert all(os.path.getsize(path) > 0 for path in files)
+
+    def test_render_in_parallel(self, tmpdir):
+        jobs = [{"dataframe": word_freq_df(5), "plot_string": "occurrences",
+                 "path": str(tmpdir.join("chart%d.png" % i))}
+                for i in range(3)]
+        report = render_word_frequency_charts(jobs, processes=2)
+        assert report.chart.tolist() == [job["path"] for job in jobs]
+        assert report.pages.tolist() == [1, 1, 1]
+        assert all(os.path.exists(job["path"]) for job in jobs)
@@ -0,0 +1,44 @@
+""" Testing adaptive sizing of the java collector runs
+"""
+import os
+
+from twords.run_control import RunController, count_run_tweets, read_run_log
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "sample_java_data.csv")
+
+
+class TestRunController(object):
+
+    def test_grows_until_failure_then_stays_below(self, tmpdir):
+        controller = RunController(1000, str(tmpdir))
+        assert controller.record("2016-06-30", 1000, 1000, 60, 2) == \
+            "complete"
+        assert controller.tweets_per_run == 1250
+        # a short run marks the failure point
+        assert controller.record("2016-06-28", 1250, 400, 60, 1) == "short"
+        assert controller.tweets_per_run == 625
+        for i in range(3):
+            controller.record("2016-06-27", controller.tweets_per_run,
+                              controller.tweets_per_run, 30, 1)
+        assert controller.tweets_per_run <= 0.9*1250
+
+        log = read_run_log(str(tmpdir))
+        assert len(log) == 5
+        assert log["outcome"].tolist()[:2] == ["complete", "short"]
+
+    def test_failed_runs_step_back_further(self):
+        controller = RunController(1000)
+        steps = []
+        for i in range(4):
+            controller.record("2016-06-30", 1000, 0, 5, None, failed=True)
+            steps.append(controller.step_days)
+        assert steps == [1, 2, 4, 8]
+        controller.record("2016-06-01", 500, 500, 30, 3)
+        assert controller.step_days == 1
+
+    def test_fixed_size_when_not_adaptive(self):
+        controller = RunController(1000, adaptive=False)
+        controller.record("2016-06-30", 1000, 10, 60, 1)
+        assert controller.tweets_per_run == 1000
+        assert count_run_tweets(SAMPLE) > 0
+        assert count_run_tweets("no_such_file.csv") == 0
@@ -0,0 +1,71 @@
+""" Testing sampling of tweets
+"""
+import nltk
+import pandas as pd
+
+from twords.twords import Twords
+from twords.sampling import ReservoirSampler, stratified_sample_positions
+
+
+def make_tweets(num_tweets):
+    return pd.DataFrame({"username": [u"user%d" % (i % 4)
+                                      for i in range(num_tweets)],
+                         "date": [u"2016/06/%02d" % (1 + i % 10)
+                                  for i in range(num_tweets)],
+                         "text": [u"tweet %d" % i for i in range(num_tweets)]},
+                        columns=["username", "date", "text"])
+
+
+class TestSampling(object):
+
+    def test_reservoir_keeps_sample_in_stream_order(self):
+        sampler = ReservoirSampler(50, seed=1)
+        tweets = make_tweets(1000)
+        for start in range(0, 1000, 100):
+            sampler.add(tweets[start:start + 100])
+        sample = sampler.sample()
+        assert len(sample) == 50
+        assert sampler.sample_fraction() == 0.05
+        numbers = [int(text.split()[1]) for text in sample.text]
+        assert numbers == sorted(numbers)
+        assert len(set(numbers)) == 50
+
+    def test_stratified_sample_keeps_share_of_each_date(self):
+        tweets = make_tweets(1000)
+        positions = stratified_sample_positions(tweets, 0.1, by="date")
+        counts = tweets.date.take(positions).value_counts()
+        assert len(counts) == 10
+        assert (counts == 10).all()
+
+    def test_stratified_sample_keeps_null_values(self):
+        tweets = make_tweets(1000)
+        tweets.loc[tweets.index % 5 == 0, "date"] = None
+        positions = stratified_sample_positions(tweets, 0.1, by="date")
+        assert len(positions) == 100
+        # tweets without a date are sampled as their own stratum
+        assert tweets.date.take(positions).isnull().sum() == 20
+
+    def test_prune_log_replays_on_full_corpus(self):
+        full = Twords()
+        full.tweets_df = make_tweets(1000)
+        sample = full.sample_tweets(0.2, by="username", seed=3)
+        assert len(sample.tweets_df) == 200
+        assert sample.sample_fraction == 0.2
+        sample.drop_by_term_in_name(["user1"])
+        sample.keep_tweets_with_terms("1")
+        sample.replay_prune_log(full)
+        assert full.prune_log == sample.prune_log
+        assert set(sample.tweets_df.text) <= set(full.tweets_df.text)
+        assert len(full.tweets_df) == len(
+            [i for i in range(1000) if i % 4 != 1 and "1" in str(i)])
+
+    def test_word_freq_df_estimates_full_counts(self):
+        twit = Twords()
+        twit.sample_fraction = 0.01
+        twit.freq_dist = nltk.FreqDist({u"cat": 100, u"dog": 4})
+        twit.create_word_freq_df(2)
+        cat = twit.word_freq_df.iloc[0]
+        assert cat["estimated occurrences"] == 10000
+        assert cat["occurrences lower"] < 10000 < cat["occurrences upper"]
+        assert cat["frequency lower"] < cat["frequency"] < \
+            cat["frequency upper"]
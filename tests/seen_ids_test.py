@@ -0,0 +1,57 @@
+""" Testing duplicate suppression while collecting tweets
+"""
+import os
+import shutil
+
+from twords.twords import Twords
+from twords.java_csv import read_java_csv
+from twords.run_control import RunController
+from twords.seen_ids import SeenIds, move_new_tweets, read_overlap_log
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "sample_java_data.csv")
+
+
+class TestSeenIds(object):
+
+    def test_move_new_tweets(self, tmpdir):
+        folder = str(tmpdir)
+        sample = read_java_csv(SAMPLE, columns=["id"])[0]
+        seen_ids = SeenIds(folder)
+
+        # first run keeps every tweet
+        shutil.copy(SAMPLE, folder + "/output_got.csv")
+        stats = move_new_tweets(folder + "/output_got.csv",
+                                folder + "/run_1.csv", seen_ids)
+        assert stats["duplicates"] == 0
+        assert len(read_java_csv(folder + "/run_1.csv")[0]) == len(sample)
+        assert len(seen_ids) == sample["id"].nunique()
+
+        # second run of the same tweets keeps none, seen ids are reloaded
+        shutil.copy(SAMPLE, folder + "/output_got.csv")
+        stats = move_new_tweets(folder + "/output_got.csv",
+                                folder + "/run_2.csv", SeenIds(folder))
+        assert stats["new tweets"] == 0
+        assert stats["overlap"] == 1.
+        assert len(read_java_csv(folder + "/run_2.csv")[0]) == 0
+
+        log = read_overlap_log(folder)
+        assert log["file"].tolist() == ["run_1.csv", "run_2.csv"]
+        assert log["overlap"].tolist() == [0., 1.]
+        assert move_new_tweets(folder + "/output_got.csv",
+                               folder + "/run_3.csv", seen_ids) is None
+
+    def test_load_collector_output_folder(self, tmpdir, capsys):
+        folder = str(tmpdir)
+        shutil.copy(SAMPLE, folder + "/output_got.csv")
+        move_new_tweets(folder + "/output_got.csv", folder + "/run_1.csv",
+                        SeenIds(folder))
+        RunController(1000, folder).record("2016-06-30", 1000, 1000, 60, 2)
+        # the logs next to the run files are not loaded as tweets
+        twit = Twords()
+        twit.data_path = folder
+        twit.get_java_tweets_from_csv_list()
+        assert "malformed" not in capsys.readouterr()[0]
+        sample, end, num_malformed = read_java_csv(SAMPLE)
+        assert num_malformed == 0
+        assert len(twit.tweets_df) == len(sample)
+        assert twit.tweets_df["id"].isin(sample["id"]).all()
@@ -0,0 +1,80 @@
+""" Testing the corpus query server and its client
+"""
+import threading
+
+import nltk
+import pytest
+import pandas as pd
+
+from twords.twords import Twords
+from twords.server import TwordsServer, TwordsClient, BadQuery
+
+
+def make_twords():
+    twit = Twords()
+    twit.tweets_df = pd.DataFrame(
+        {"username": [u"alice", u"bob", u"alice"],
+         "date": [u"2016/06/25", u"2016/06/25", u"2016/06/26"],
+         "text": [u"caf\xe9 cat", u"dog", u"cat"]},
+        columns=["username", "date", "text"])
+    twit.freq_dist = nltk.FreqDist({u"cat": 2, u"dog": 1, u"caf\xe9": 1})
+    twit.background_dict = {u"cat": (0.01, 10)}
+    return twit
+
+
+class TestServer(object):
+
+    def test_client_queries(self):
+        twit = make_twords()
+        server = TwordsServer(twit, port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            client = TwordsClient(port=server.server_address[1])
+            assert client.info()["tweets"] == 3
+            assert client.tweets_by("alice").text.tolist() == \
+                [u"caf\xe9 cat", u"cat"]
+            assert len(client.tweets_containing(u"caf\xe9")) == 1
+
+            word_freq = client.word_freq_df(2)
+            assert word_freq.word.tolist() == [u"cat", u"caf\xe9"] or \
+                word_freq.word.tolist() == [u"cat", u"dog"]
+            assert word_freq.occurrences.tolist() == [2, 1]
+            custom = client.custom_word_frequency_dataframe(["dog", "bird"])
+            assert custom.occurrences.tolist() == [1, 0]
+
+            counts = client.tweet_counts(term="cat")
+            assert counts.period.tolist() == ["2016-06-25", "2016-06-26"]
+            assert counts.tweets.tolist() == [1, 1]
+
+            # repeated query is answered from the cache
+            client.word_freq_df(2)
+            assert client.info()["cache_hits"] == 1
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_errors(self):
+        twit = make_twords()
+        server = TwordsServer(twit, port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            client = TwordsClient(port=server.server_address[1])
+            with pytest.raises(Exception) as error:
+                client._get("/no_such_query")
+            assert "Bad query" in str(error.value)
+            with pytest.raises(BadQuery):
+                server.query("/tweets_by", {})
+            # failures inside a query are server errors, not bad queries
+            del twit.tweets_df["username"]
+            with pytest.raises(KeyError):
+                server.query("/tweets_containing", {"term": u"cat"})
+            with pytest.raises(Exception) as error:
+                client.tweets_containing(u"dog")
+            assert "Bad query" not in str(error.value)
+        finally:
+            server.shutdown()
+            server.server_close()
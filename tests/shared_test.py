@@ -0,0 +1,71 @@
+""" Testing shared-memory handoff of texts and counts to worker processes
+"""
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from twords.twords import Twords
+from twords.textstore import TextStore
+from twords.shared import SharedArrays, shared_word_counts, \
+    benchmark_shared_counting
+
+TEXTS = [u"vote leave today", u"vote remain", None, u"caf\xe9 #brexit",
+         u"leave @user leave", u"the vote"] * 7
+
+
+def serial_counts(texts, stop_words):
+    return Counter(word for text in texts if text for word in text.split()
+                   if word not in stop_words)
+
+
+class TestSharedArrays(object):
+
+    def test_put_get(self):
+        with SharedArrays() as shared:
+            shared.put("ids", np.arange(5))
+            view = shared.get("ids")
+            assert view.tolist() == [0, 1, 2, 3, 4]
+            assert not view.flags.writeable
+            shared.put_strings("words", [u"caf\xe9", u"vote"])
+            # a second object opens the same arrays by folder
+            other = SharedArrays(shared.folder)
+            assert other.get_strings("words") == [u"caf\xe9", u"vote"]
+            other.close()
+            assert os.path.isdir(shared.folder)
+        assert not os.path.exists(shared.folder)
+
+
+class TestSharedWordCounts(object):
+
+    def test_counts_match_serial(self):
+        store = TextStore.from_texts(TEXTS)
+        expected = serial_counts(TEXTS, set([u"the"]))
+        # u"#brexit" and u"@user" are not in the vocabulary
+        words, counts, report = shared_word_counts(
+                        store, [u"vote", u"leave", u"the", u"caf\xe9"],
+                        stop_words=[u"the"], processes=2, num_chunks=5,
+                        tokenizer="regex")
+        assert dict((w, c) for w, c in zip(words, counts) if c) == expected
+        assert len(report) == 5
+
+    def test_benchmark(self):
+        # enough tweets for the work to outweigh starting the pool
+        store = TextStore.from_texts(TEXTS*3000)
+        benchmark = benchmark_shared_counting(store, [u"vote", u"leave"],
+                                              processes=2, tokenizer="regex")
+        assert benchmark.index.tolist() == ["pickled", "shared"]
+        assert (benchmark["bytes pickled"] > 0).all()
+        # tasks are ranges: copying the texts into shared memory once and
+        # handing counts back is a small fraction of the work
+        assert benchmark.loc["shared", "bytes pickled"] < 1000
+        assert benchmark.loc["shared", "serialization fraction"] < 0.5
+
+    def test_twords_count_words_in_parallel(self):
+        twit = Twords()
+        twit.tweets_df = pd.DataFrame({"text": TEXTS})
+        twit.stop_words = [u"the"]
+        twit.count_words_in_parallel(processes=1, tokenizer="regex")
+        assert dict(twit.freq_dist) == serial_counts(TEXTS, set([u"the"]))
+        assert twit.word_bag == []
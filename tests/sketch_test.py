@@ -0,0 +1,51 @@
+""" Testing approximate word counting in twords.sketch
+"""
+from twords.sketch import SketchFreqDist, merge_sketch_freq_dists
+
+
+def make_words():
+    # "cat" 50 times, "dog" 20 times, and many words that appear once
+    return [u"cat"]*50 + [u"dog"]*20 + [u"word%d" % i for i in range(300)]
+
+
+class TestSketchFreqDist(object):
+
+    def test_counts_never_undercount(self):
+        freq_dist = SketchFreqDist(epsilon=0.01, num_heavy_hitters=20)
+        freq_dist.update(make_words())
+        assert freq_dist.N() == 370
+        assert 50 <= freq_dist[u"cat"] <= 50 + freq_dist.error_bound()
+        assert 20 <= freq_dist[u"dog"] <= 20 + freq_dist.error_bound()
+        lower, upper = freq_dist.count_bounds(u"cat")
+        assert lower <= 50 <= upper
+
+    def test_most_common(self):
+        freq_dist = SketchFreqDist(epsilon=0.001, num_heavy_hitters=20)
+        words = make_words()
+        # update in batches as create_word_bag does
+        for i in range(0, len(words), 50):
+            freq_dist.update(words[i:i+50])
+        top = freq_dist.most_common(2)
+        assert [word for word, count in top] == [u"cat", u"dog"]
+        assert len(freq_dist.most_common()) <= 20
+
+    def test_merge(self):
+        words = make_words()
+        first = SketchFreqDist(epsilon=0.001, num_heavy_hitters=20)
+        second = SketchFreqDist(epsilon=0.001, num_heavy_hitters=20)
+        first.update(words[:200])
+        second.update(words[200:])
+        merged = merge_sketch_freq_dists([first, second])
+        assert merged.N() == 370
+        assert merged.most_common(1)[0][0] == u"cat"
+        assert merged[u"cat"] >= 50
+
+    def test_save_and_load(self, tmpdir):
+        freq_dist = SketchFreqDist(epsilon=0.01, num_heavy_hitters=20)
+        freq_dist.update(make_words())
+        path = str(tmpdir.join("sketch.npz"))
+        freq_dist.save(path)
+        loaded = SketchFreqDist.load(path)
+        assert loaded.N() == freq_dist.N()
+        assert loaded[u"cat"] == freq_dist[u"cat"]
+        assert loaded.most_common(2) == freq_dist.most_common(2)
@@ -0,0 +1,100 @@
+""" Testing saving and loading of Twords sessions
+"""
+import nltk
+import numpy as np
+import pandas as pd
+
+from twords.twords import Twords
+from twords.snapshot import read_session_header, FORMAT_VERSION
+
+
+def make_twords():
+    twit = Twords()
+    twit.search_terms = [u"charisma"]
+    twit.stop_words = [u"the", u"a"]
+    twit.tweets_df = pd.DataFrame({"username": [u"user1", u"user2", u"user3"],
+                                   "retweets": [0, 5, 2],
+                                   "text": [u"the cat sat", np.nan,
+                                            u"caf\xe9 charisma"]},
+                                  columns=["username", "retweets", "text"])
+    twit.word_bag = [u"cat", u"sat", u"caf\xe9", u"cat"]
+    twit.freq_dist = nltk.FreqDist(twit.word_bag)
+    twit.background_dict = {u"cat": (2.5e-5, 10), u"sat": (1e-6, 1)}
+    return twit
+
+
+class TestSession(object):
+
+    def test_save_and_load_session(self, tmpdir):
+        path = str(tmpdir.join("session.npz"))
+        twit = make_twords()
+        twit.save_session(path)
+
+        loaded = Twords()
+        loaded.load_session(path)
+        assert loaded.search_terms == twit.search_terms
+        assert loaded.stop_words == twit.stop_words
+        assert loaded.word_bag == twit.word_bag
+        assert dict(loaded.freq_dist) == dict(twit.freq_dist)
+        assert loaded.background_dict == twit.background_dict
+        assert list(loaded.tweets_df.columns) == list(twit.tweets_df.columns)
+        assert loaded.tweets_df["retweets"].tolist() == [0, 5, 2]
+        assert loaded.tweets_df["text"][2] == u"caf\xe9 charisma"
+        assert pd.isnull(loaded.tweets_df["text"][1])
+
+    def test_session_keeps_pipeline_state(self, tmpdir):
+        path = str(tmpdir.join("session.npz"))
+        twit = make_twords()
+        twit.keep_column_of_original_tweets(compact=True)
+        twit.sample_fraction = 0.25
+        twit.prune_log = ["lower_tweets", ("drop_by_term_in_tweet", [u"rt @"])]
+        twit.cleaning_steps = ["lower_tweets"]
+        twit.ingested_offsets = {"data/tweets.csv": 2101}
+        twit.memory_budget = 2**30
+        twit.word_bag_date_range = ("2016-06-20", None)
+        twit.save_session(path)
+
+        loaded = Twords()
+        loaded.load_session(path)
+        assert loaded.sample_fraction == 0.25
+        assert loaded.prune_log == twit.prune_log
+        assert loaded.cleaning_steps == twit.cleaning_steps
+        assert loaded.ingested_offsets == twit.ingested_offsets
+        assert loaded.memory_budget == 2**30
+        assert loaded.word_bag_date_range == ("2016-06-20", None)
+        assert loaded.original_tweets().tolist()[2] == u"caf\xe9 charisma"
+        assert pd.isnull(loaded.original_tweets()[1])
+
+    def test_save_applies_pending_filters(self, tmpdir):
+        path = str(tmpdir.join("session.npz"))
+        twit = make_twords()
+        twit.start_filter_plan()
+        twit.drop_by_term_in_tweet([u"charisma"])
+        twit.save_session(path)
+
+        loaded = Twords()
+        loaded.load_session(path)
+        assert loaded.tweets_df["username"].tolist() == [u"user1", u"user2"]
+        assert loaded.prune_log == twit.prune_log
+
+    def test_path_without_extension(self, tmpdir):
+        path = str(tmpdir.join("session"))
+        make_twords().save_session(path)
+        assert tmpdir.join("session.npz").check()
+        loaded = Twords()
+        loaded.load_session(path)
+        assert loaded.tweets_df["username"].tolist()[0] == u"user1"
+        assert read_session_header(path)["version"] == FORMAT_VERSION == 2
+
+    def test_load_partial_session(self, tmpdir):
+        path = str(tmpdir.join("session.npz"))
+        make_twords().save_session(path)
+
+        loaded = Twords()
+        loaded.load_session(path, parts=["freq_dist"])
+        assert loaded.freq_dist[u"cat"] == 2
+        assert len(loaded.tweets_df) == 0
+
+        loaded.load_session(path, parts=["tweets"],
+                            tweets_columns=["username"])
+        assert list(loaded.tweets_df.columns) == ["username"]
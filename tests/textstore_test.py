@@ -0,0 +1,79 @@
+""" Testing contiguous storage of tweet texts
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from twords.twords import Twords
+from twords.textstore import TextStore
+
+TEXTS = [u"the cat", np.nan, u"caf\xe9 au lait", u"", u"cat food"]
+
+
+class TestTextStore(object):
+
+    def test_round_trip(self):
+        store = TextStore.from_texts(TEXTS)
+        assert len(store) == 5
+        assert store[2] == u"caf\xe9 au lait"
+        assert store[1] is None
+        assert store.joined(2, 4) == u"caf\xe9 au lait\n\n"
+        series = store.to_series()
+        assert series[0] == u"the cat"
+        assert pd.isnull(series[1])
+        assert series[3] == u""
+        taken = store.take(np.array([True, False, True, False, True]))
+        assert taken.to_series().tolist() == [u"the cat", u"caf\xe9 au lait",
+                                              u"cat food"]
+        # runs of consecutive rows, reordered and repeated rows
+        taken = store.take([3, 4, 0, 1, 2, 2])
+        assert taken.to_series().tolist()[:3] == [u"", u"cat food",
+                                                  u"the cat"]
+        assert taken[3] is None and taken[5] == u"caf\xe9 au lait"
+        assert taken.joined() == store.joined(3, 5) + store.joined(0, 3) + \
+            store.joined(2, 3)
+        assert len(store.take([])) == 0
+
+    def test_rows_containing_and_memory_map(self, tmpdir):
+        path = str(tmpdir.join("texts"))
+        TextStore.from_texts(TEXTS).save(path)
+        store = TextStore.load(path)
+        assert isinstance(store.data, np.memmap)
+        assert store.rows_containing(u"cat").tolist() == \
+            [True, False, False, False, True]
+        assert store.rows_containing(u"caf\xe9").tolist() == \
+            [False, False, True, False, False]
+        # matches may not span two tweets
+        assert not store.rows_containing(u"cat\\s+caf").any()
+        chunks = store.chunks(2)
+        assert chunks[0][0] == 0 and chunks[-1][1] == 5
+
+    def test_compact_original_tweets(self):
+        twit = Twords()
+        twit.tweets_df = pd.DataFrame({"text": [u"The Cat", u"A Dog",
+                                                u"Cat Food"]})
+        twit.keep_column_of_original_tweets(compact=True)
+        assert "original_tweets" not in twit.tweets_df.columns
+        twit.lower_tweets()
+        twit.drop_by_term_in_tweet("dog")
+        assert twit.original_tweets().tolist() == [u"The Cat", u"Cat Food"]
+        assert twit.text_store().joined() == u"the cat\ncat food\n"
+
+    def test_newlines_inside_texts(self):
+        store = TextStore.from_texts([u"vote\nleave", np.nan, u"caf\xe9\n\n!",
+                                      u"remain"])
+        # texts are kept as given
+        assert store[0] == u"vote\nleave"
+        assert store.lines() == u"vote leave\n\ncaf\xe9  !\nremain\n"
+        codes, uniques, rows = store.tokenize(1, 4)
+        assert uniques[codes].tolist() == [u"caf\xe9", u"!", u"remain"]
+        assert rows.tolist() == [2, 2, 3]
+        codes, uniques, rows = store.tokenize()
+        assert rows.tolist() == [0, 0, 2, 2, 3]
+        # unicode patterns match whole lines, counted in characters
+        assert store.char_offsets().tolist() == [0, 11, 12, 20, 27]
+        assert store.rows_containing(u"^\\w+ \\w+$", re.MULTILINE).tolist() \
+            == [True, False, False, False]
+        assert store.rows_containing(u"\\w+ +!").tolist() == \
+            [False, False, True, False]
@@ -0,0 +1,50 @@
+""" Testing classification of tweets at load time
+"""
+import numpy as np
+import pandas as pd
+
+from twords.twords import Twords
+from twords.textstore import TextStore
+from twords.tweet_class import classify_texts, class_bits, RETWEET, REPLY, \
+    VIA, URL_ONLY, HASHTAG_ONLY
+
+TEXTS = [u"RT @someone: brexit means brexit",
+         u"@someone I disagree",
+         u"Good read via @guardian http://gu.com/x",
+         u" http://trib.al/DiTeTmM pic.twitter.com/abc ",
+         u"#brexit #voteleave",
+         u"an ordinary tweet about art @museum",
+         np.nan]
+
+
+class TestTweetClass(object):
+
+    def test_classify_texts(self):
+        classes = classify_texts(TextStore.from_texts(TEXTS))
+        assert classes.tolist() == [RETWEET, REPLY, VIA, URL_ONLY,
+                                    HASHTAG_ONLY, 0, 0]
+        assert class_bits(["retweet", "via"]) == RETWEET | VIA
+
+    def test_drop_tweet_classes(self):
+        twit = Twords()
+        twit.tweets_df = pd.DataFrame({"username": [u"a"]*len(TEXTS),
+                                       "text": TEXTS})
+        twit.classify_tweets()
+        assert twit.tweet_class_counts()["retweet"] == 1
+        assert twit.tweet_class_mask("reply").tolist() == \
+            [False, True, False, False, False, False, False]
+        twit.start_filter_plan()
+        twit.drop_tweet_classes(["retweet", "reply"])
+        twit.drop_tweet_classes("url only")
+        report = twit.execute_filter_plan()
+        # merged into one mask
+        assert report["tweets dropped"].tolist() == [3]
+        assert len(twit.tweets_df) == 4
+        assert twit.prune_log[-1] == ("drop_tweet_classes", ["url only"])
+
+    def test_non_ascii_hashtags_and_mentions(self):
+        classes = classify_texts(TextStore.from_texts(
+                    [u"#caf\xe9", u"#\xe9t\xe9 #brexit", u"@z\xfcrich hello",
+                     u"rt @\xe9lise: caf\xe9", u"caf\xe9 #caf\xe9"]))
+        assert classes.tolist() == [HASHTAG_ONLY, HASHTAG_ONLY, REPLY,
+                                    RETWEET, 0]
@@ -10,6 +10,8 @@ sys.path.append('../twords')
 
 from twords.twords import Twords
 import pytest
+import numpy as np
+import pandas as pd
 
 from numpy.testing import assert_approx_equal
 import csv
@@ -87,3 +89,162 @@ class TestAttributeCreation(object):
         current_stop_words = twit.stop_words
         twit.add_stop_words(["marco", "polo"])
         assert twit.stop_words == current_stop_words + [u"marco", u"polo"]
+
+
+class TestFilterPlan(object):
+
+    def make_twords(self):
+        twit = Twords()
+        twit.search_terms = [u"charisma"]
+        twit.tweets_df = pd.DataFrame(
+            {"username": [u"charismabot", u"user2", u"user3", u"user4",
+                          u"user5", u"user6"],
+             "mentions": [np.nan, u"@charisma_news", np.nan, np.nan, np.nan,
+                          np.nan],
+             "text": [u"charisma rules", u"rt @charisma_news big day",
+                      u"she has charisma", u"buy now charisma",
+                      u"she has charisma", np.nan]},
+            columns=["username", "mentions", "text"])
+        return twit
+
+    def drop_steps(self, twit):
+        twit.keep_only_unicode_tweet_text()
+        twit.drop_by_search_in_name()
+        twit.drop_duplicate_tweets()
+        twit.drop_by_term_in_tweet("rt @")
+        twit.drop_by_term_in_tweet(["buy now", "free"])
+
+    def test_drop_immediately(self):
+        twit = self.make_twords()
+        self.drop_steps(twit)
+        assert twit.tweets_df.text.tolist() == [u"she has charisma"]
+        assert list(twit.tweets_df.index) == [0]
+
+    def test_filter_plan_matches_immediate_drops(self):
+        twit = self.make_twords()
+        twit.start_filter_plan()
+        self.drop_steps(twit)
+        # nothing is dropped until the plan is executed
+        assert len(twit.tweets_df) == 6
+        report = twit.execute_filter_plan()
+        assert twit.tweets_df.text.tolist() == [u"she has charisma"]
+        assert twit.filter_plan is None
+        # the two drop_by_term_in_tweet calls are merged into one filter
+        assert report["filter"].tolist() == ["unicode_text", "drop_name_terms",
+                                             "drop_text_terms",
+                                             "drop_duplicates"]
+        assert report["tweets dropped"].tolist() == [1, 2, 1, 1]
+
+    def test_rewrite_applies_pending_filters(self):
+        twit = Twords()
+        twit.tweets_df = pd.DataFrame({"text": [u"Big CHARISMA", u"charisma"]})
+        twit.start_filter_plan()
+        twit.drop_by_term_in_tweet("CHARISMA")
+        # the pending filter matches the text before it is lowered
+        twit.lower_tweets()
+        twit.execute_filter_plan()
+        assert twit.tweets_df.text.tolist() == [u"charisma"]
+
+    def test_user_counts_after_pending_filters(self):
+        twit = self.make_twords()
+        twit.start_filter_plan()
+        twit.keep_only_unicode_tweet_text()
+        twit.drop_by_term_in_tweet("buy now")
+        twit.tweets_df["username"] = [u"user2", u"user2", u"user3", u"user3",
+                                      u"user5", u"user5"]
+        # user3 has one tweet left once "buy now" is dropped, user5 has
+        # one once the tweet without text is dropped
+        twit.drop_by_username_with_n_tweets(1)
+        twit.execute_filter_plan()
+        assert twit.tweets_df.username.tolist() == [u"user3", u"user5"]
+
+
+class TestFollowMode(object):
+
+    header = "username;date;retweets;favorites;text;geo;mentions;hashtags;" \
+             "id;permalink\n"
+
+    def line(self, i, text):
+        return 'user%d;2016/06/25;0;0;"%s";;;;"%d";https://twitter.com/' \
+               'user%d/status/%d\n' % (i, text, i, i, i)
+
+    def test_refresh_reads_only_new_data(self, tmpdir):
+        first_file = tmpdir.join("brexit_2016-06-25.csv")
+        second_line = self.line(2, "Second Tweet")
+        first_file.write(self.header + self.line(1, "First Tweet") +
+                         second_line[:10])
+        twit = Twords()
+        twit.data_path = str(tmpdir)
+        # partially written line is left for the next refresh
+        assert twit.follow_java_tweets(["lower_tweets"]) == 1
+        assert twit.tweets_df.text.tolist() == [u"first tweet"]
+
+        first_file.write(second_line[10:], mode="a")
+        tmpdir.join("brexit_2016-06-26.csv").write(
+            self.header + self.line(3, "Third Tweet"))
+        assert twit.refresh_java_tweets() == 2
+        assert twit.tweets_df.text.tolist() == [u"first tweet",
+                                                u"second tweet",
+                                                u"third tweet"]
+        assert twit.refresh_java_tweets() == 0
+
+
+class TestWordFrequencyCache(object):
+
+    def make_twords(self):
+        import nltk
+        twit = Twords()
+        twit.search_terms = [u"charisma"]
+        twit.freq_dist = nltk.FreqDist({u"charisma": 5, u"cat": 3,
+                                        u"dog": 2, u"sat": 1})
+        twit.background_dict = {u"cat": (0.1, 100), u"sat": (0.5, 500)}
+        return twit
+
+    def test_top_n_slices_cached_table(self):
+        twit = self.make_twords()
+        twit.create_word_freq_df(3)
+        assert twit.word_freq_df.word.tolist() == [u"cat", u"dog"]
+        assert_approx_equal(twit.word_freq_df["relative frequency"][0],
+                            (3/11.)/0.1)
+        assert twit.word_freq_df["background occurrences"].tolist() == [100, 0]
+        table = twit._word_freq_table()
+
+        twit.create_word_freq_df(10)
+        assert twit._word_freq_table() is table
+        assert twit.word_freq_df.word.tolist() == [u"cat", u"dog", u"sat"]
+
+        # changing the counts invalidates the cached table, dropping tweets
+        # (without recounting) does not
+        twit._bump_tweets_version()
+        assert twit._word_freq_table() is table
+        twit._bump_counts_version()
+        assert twit._word_freq_table() is not table
+
+    def test_tweet_caches_survive_count_changes(self):
+        twit = self.make_twords()
+        twit.tweets_df = pd.DataFrame({"text": [u"the cat sat"]})
+        text_store = twit.text_store()
+        twit.add_stop_words([u"sat"])
+        twit.make_nltk_object_from_word_bag([u"cat"])
+        assert twit.text_store() is text_store
+        twit.lower_tweets()
+        assert twit.text_store() is not text_store
+
+    def test_tweet_caches_follow_assigned_tweets(self):
+        twit = self.make_twords()
+        twit.tweets_df = pd.DataFrame({"text": [u"the cat sat"]})
+        assert twit.token_index().positions(u"cat").tolist() == [1]
+        twit.tweets_df = pd.DataFrame({"text": [u"new text entirely"]})
+        assert twit.text_store().joined() == u"new text entirely\n"
+        assert len(twit.token_index().positions(u"cat")) == 0
+        twit.tweets_df["text"] = [u"a cat"]
+        assert twit.text_store().joined() == u"a cat\n"
+        assert twit.token_index().positions(u"cat").tolist() == [1]
+
+    def test_custom_words_match_table(self):
+        twit = self.make_twords()
+        custom = twit.custom_word_frequency_dataframe(["sat", "bird", "cat"])
+        assert custom.word.tolist() == [u"sat", u"bird", u"cat"]
+        assert custom.occurrences.tolist() == [1, 0, 3]
+        assert custom.background_occur.tolist() == [500, 0, 100]
+        assert custom["log relative frequency"][1] == 0
@@ -0,0 +1,59 @@
+""" Testing the per-user index
+"""
+import numpy as np
+import pandas as pd
+
+from twords.twords import Twords
+
+
+def make_twords():
+    twit = Twords()
+    twit.tweets_df = pd.DataFrame(
+        {"username": [u"spammer", u"alice", u"spammer", u"bob", u"spammer",
+                      u"alice"],
+         "date": [u"2016/06/25", u"2016/06/20", u"2016/06/25", u"2016/06/21",
+                  u"2016/06/25", u"2016/06/30"],
+         "retweets": [0, 3, 0, 1, 0, 2],
+         "text": [u"buy http://x.co", u"hello", u"buy http://x.co", u"hi",
+                  u"buy now", u"bye"]},
+        columns=["username", "date", "retweets", "text"])
+    return twit
+
+
+class TestUserIndex(object):
+
+    def test_features_and_lookup(self):
+        twit = make_twords()
+        features = twit.user_index().features()
+        assert features.loc[u"spammer", "tweets"] == 3
+        assert features.loc[u"alice", "retweets"] == 5
+        assert features.loc[u"alice", "days active"] == 11
+        assert features.loc[u"spammer", "duplicate ratio"] == 1/3.
+        assert features.loc[u"spammer", "url ratio"] == 2/3.
+        assert twit.tweets_by("alice").text.tolist() == [u"hello", u"bye"]
+        assert len(twit.tweets_by("nobody")) == 0
+
+    def test_index_updated_on_drops(self):
+        twit = make_twords()
+        index = twit.user_index()
+        twit.drop_by_term_in_tweet(["hello"])
+        # drop the first copy of the repeated tweet, so the user no longer
+        # has a repeated tweet
+        twit._keep_rows(np.array([False, True, True, True, True]))
+        assert twit.user_index() is index
+        assert index.features().loc[u"spammer", "duplicate ratio"] == 0
+        rebuilt = Twords()
+        rebuilt.tweets_df = twit.tweets_df
+        expected = rebuilt.user_index().features().sort_index()
+        assert index.features().sort_index().equals(expected)
+        assert twit.tweets_by("alice").text.tolist() == [u"bye"]
+        assert twit.tweets_by("spammer").text.tolist() == [u"buy http://x.co",
+                                                           u"buy now"]
+
+    def test_drop_spam_users(self):
+        twit = make_twords()
+        assert twit.drop_spam_users(min_duplicate_ratio=0.3,
+                                    min_tweets=2) == [u"spammer"]
+        assert sorted(set(twit.tweets_df.username)) == [u"alice", u"bob"]
+        twit.drop_by_username_with_n_tweets(1)
+        assert twit.tweets_df.username.tolist() == [u"bob"]
@@ -0,0 +1,69 @@
+""" Testing batch word vectors
+"""
+import numpy as np
+import pandas as pd
+
+from twords.twords import Twords
+from twords.textstore import TextStore
+from twords.word_vectors import build_word_vectors
+
+TEXTS = [u"taxes hurt liberty and liberty matters",
+         u"taxes need regulation",
+         u"guns and liberty",
+         u"caf\xe9 regulation guns regulation",
+         u"taxesx liberty",
+         u"nothing here"]
+
+
+class TestWordVectors(object):
+
+    def test_counts_along_axes(self):
+        background = pd.DataFrame({"background frequency": [0.01, 0.02]},
+                                  index=[u"liberty", u"regulation"])
+        vectors = build_word_vectors(TextStore.from_texts(TEXTS),
+                                     ["taxes", "guns"],
+                                     ["liberty", "regulation"], background)
+        # "taxesx" is not a whole-word match
+        assert vectors.tweets.tolist() == [2, 2]
+        assert vectors.counts.tolist() == [[2, 1], [1, 2]]
+        assert vectors.tokens.tolist() == [9, 7]
+        frame = vectors.to_frame("frequency")
+        assert np.isclose(frame.loc[u"taxes", u"liberty"], 2/9.)
+        assert np.isclose(vectors.to_frame().loc[u"guns", u"regulation"],
+                          np.log(2/7./0.02))
+
+    def test_similarities(self):
+        vectors = build_word_vectors(TextStore.from_texts(TEXTS),
+                                     ["taxes", "guns", "nothing"],
+                                     ["liberty", "regulation"])
+        similarities = vectors.similarities("occurrences")
+        assert np.isclose(similarities.loc[u"taxes", u"taxes"], 1.)
+        assert np.isclose(similarities.loc[u"taxes", u"guns"], 4/5.)
+        # no axis words with "nothing"
+        assert similarities.loc[u"nothing", u"taxes"] == 0
+        assert vectors.most_similar("taxes", values="occurrences").index[0] \
+            == u"guns"
+
+    def test_twords_word_vectors(self):
+        twit = Twords()
+        twit.tweets_df = pd.DataFrame({"text": TEXTS})
+        vectors = twit.word_vectors(["TAXES"], ["Liberty"], ignore_case=True)
+        assert vectors.counts.tolist() == [[2]]
+
+    def test_newlines_inside_texts(self):
+        texts = [u"taxes\nliberty", u"guns regulation"]
+        vectors = build_word_vectors(TextStore.from_texts(texts),
+                                     ["taxes", "guns"],
+                                     ["liberty", "regulation"])
+        assert vectors.tweets.tolist() == [1, 1]
+        assert vectors.counts.tolist() == [[1, 0], [0, 1]]
+        assert vectors.tokens.tolist() == [2, 2]
+
+    def test_frequencies_leave_out_stop_words(self):
+        texts = [u"taxes, and liberty!", u"The taxes"]
+        vectors = build_word_vectors(TextStore.from_texts(texts), ["taxes"],
+                                     ["liberty"], stop_words=["and", "the"],
+                                     ignore_case=True)
+        # punctuation and stop words are not counted as words
+        assert vectors.tokens.tolist() == [3]
+        assert np.isclose(vectors.frequencies()[0, 0], 1/3.)
@@ -0,0 +1,265 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Build the background word frequency file used by create_Background_dict.
+
+A BackgroundBuilder streams a folder of raw csv files written by the java
+GetOldTweets jar through the same cleaning and tokenization as
+create_word_bag, using several processes, merges the word counts and writes
+them both as the csv file create_Background_dict reads (columns word,
+occurrences, frequency) and as a binary .npz file that loads much faster.
+
+Progress is saved in a state file next to the output after every few files,
+holding the merged counts so far and the number of bytes of each raw file
+already counted. Running the builder again therefore resumes an interrupted
+build, and only counts tweets in new raw files or appended to existing ones.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from os import listdir
+from os.path import join as pathjoin, splitext, exists
+
+import numpy as np
+import pandas as pd
+
+from .java_csv import read_java_csv
+from .snapshot import encode_strings, decode_strings
+
+# cleaning applied to raw tweets before counting, as in Twords.cleaning_steps
+DEFAULT_CLEANING_STEPS = ["keep_only_unicode_tweet_text", "lower_tweets",
+                          "remove_urls_from_tweets"]
+
+
+def write_background(words, occurrences, csv_path, npz_path=None,
+                     total=None):
+    """ Write background word counts, most common first, to csv file at
+    csv_path with columns word, occurrences and frequency, and to binary
+    file at npz_path if given.
+
+    words (list): words
+    occurrences (array): number of occurrences of each word
+    total (int): number of words in the corpus, which frequencies are
+                 relative to; defaults to the sum of occurrences (pass it
+                 when rare words have been left out of words)
+    """
+    occurrences = np.asarray(occurrences, dtype=np.int64)
+    order = np.argsort(-occurrences, kind='mergesort')
+    words = np.asarray(words, dtype=object)[order]
+    occurrences = occurrences[order]
+    if total is None:
+        total = occurrences.sum()
+    frequency = occurrences/float(total) if total else \
+        np.zeros(len(occurrences))
+    background = pd.DataFrame({"word": words, "occurrences": occurrences,
+                               "frequency": frequency},
+                              columns=["word", "occurrences", "frequency"])
+    background.to_csv(csv_path, index=False, encoding='utf-8')
+    if npz_path is not None:
+        data, offsets, null = encode_strings(list(words))
+        np.savez(npz_path, words_data=data, words_offsets=offsets,
+                 occurrences=occurrences, frequency=frequency)
+
+
+def read_background_npz(path):
+    """ Read binary background file written by write_background into a
+    dictionary like Twords.background_dict: word is key, value is tuple
+    (frequency, occurrences).
+    """
+    archive = np.load(path)
+    words = decode_strings(archive["words_data"], archive["words_offsets"])
+    return dict(zip(words, zip(archive["frequency"].tolist(),
+                               archive["occurrences"].tolist())))
+
+
+def _count_new_lines(task):
+    """ Count words in the lines of a raw csv file from byte offset start on.
+    Returns (path, end, num_tweets, words, counts), where end is the offset
+    just past the last complete line counted.
+
+    Runs in a worker process, so task is a single tuple
+    (path, start, stop_words, cleaning_steps).
+    """
+    # imported here since twords.py imports this module
+    from .twords import Twords
+    path, start, stop_words, cleaning_steps = task
+    tweets, end, num_malformed = read_java_csv(path, start=start,
+                                               complete_lines_only=True)
+    twit = Twords()
+    twit.tweets_df = tweets
+    twit.stop_words = stop_words
+    twit.apply_cleaning_steps(cleaning_steps)
+    texts = [text for text in twit.tweets_df["text"].tolist()
+             if type(text) == unicode]
+    if not texts:
+        return path, end, 0, [], np.zeros(0, dtype=np.int64)
+    counts = pd.Series(twit._word_bag_from_tweets(texts),
+                       dtype=object).value_counts()
+    return path, end, len(texts), counts.index.tolist(), \
+        counts.values.astype(np.int64)
+
+
+def _merge_counts(words_list, counts_list):
+    """ Sum counts of lists of (words, counts) pairs; returns Series of
+    counts indexed by word.
+    """
+    words = [word for words in words_list for word in words]
+    counts = np.concatenate(counts_list) if counts_list else \
+        np.zeros(0, dtype=np.int64)
+    return pd.Series(counts, index=pd.Index(words, dtype=object)) \
+        .groupby(level=0).sum()
+
+
+class BackgroundBuilder(object):
+    """ Builds background word rates from a folder of raw java csv files.
+
+    raw_folder (string): folder holding the raw GetOldTweets csv files
+    output_path (string): path of the background csv file to write; the
+                          binary version is written with extension .npz
+                          and the progress state with _state.npz
+    stop_words (list): words not counted; defaults to the default Twords
+                       stop words (see Twords.create_Stop_words)
+    cleaning_steps (list): cleaning applied to tweets before counting, as in
+                           Twords.cleaning_steps
+    processes (int): number of worker processes; defaults to the number of
+                     cpus
+    checkpoint_every (int): number of raw files counted between saves of
+                            the progress state
+    min_count (int): words with fewer occurrences are left out of the
+                     output files (but kept in the state, so they can pass
+                     min_count later)
+    """
+
+    def __init__(self, raw_folder, output_path, stop_words=None,
+                 cleaning_steps=None, processes=None, checkpoint_every=20,
+                 min_count=1):
+        if stop_words is None:
+            from .twords import Twords
+            twit = Twords()
+            twit.create_Stop_words()
+            stop_words = twit.stop_words
+        if cleaning_steps is None:
+            cleaning_steps = DEFAULT_CLEANING_STEPS
+        self.raw_folder = raw_folder
+        self.output_path = output_path
+        self.npz_path = splitext(output_path)[0] + ".npz"
+        self.state_path = splitext(output_path)[0] + "_state.npz"
+        self.stop_words = list(stop_words)
+        self.cleaning_steps = [step if type(step) in (str, unicode)
+                               else list(step) for step in cleaning_steps]
+        self.processes = processes
+        self.checkpoint_every = checkpoint_every
+        self.min_count = min_count
+        self.offsets = {}
+        self.num_tweets = 0
+        self.counts = pd.Series([], dtype=np.int64)
+
+    def __repr__(self):
+        return "BackgroundBuilder for " + self.raw_folder
+
+    def _settings(self):
+        return {"stop_words": self.stop_words,
+                "cleaning_steps": self.cleaning_steps}
+
+    def load_state(self):
+        """ Load counts and raw file offsets saved by an earlier run, if the
+        state file exists.
+        """
+        if not exists(self.state_path):
+            return
+        archive = np.load(self.state_path)
+        header = json.loads(archive["header"].tobytes())
+        if header["settings"] != json.loads(json.dumps(self._settings())):
+            raise Exception("State file " + self.state_path + " was built "
+                            "with different stop words or cleaning steps - "
+                            "delete it to rebuild the background from "
+                            "scratch")
+        self.offsets = header["offsets"]
+        self.num_tweets = header["num_tweets"]
+        words = decode_strings(archive["words_data"], archive["words_offsets"])
+        self.counts = pd.Series(archive["counts"],
+                                index=pd.Index(words, dtype=object))
+
+    def save_state(self):
+        """ Save counts and raw file offsets. The file is written under a
+        temporary name and then renamed, so an interrupted save leaves the
+        previous state intact.
+        """
+        header = {"settings": self._settings(), "offsets": self.offsets,
+                  "num_tweets": self.num_tweets}
+        data, offsets, null = encode_strings(self.counts.index.tolist())
+        temp_path = self.state_path + ".tmp.npz"
+        np.savez(temp_path, header=np.frombuffer(json.dumps(header),
+                                                 dtype=np.uint8),
+                 words_data=data, words_offsets=offsets,
+                 counts=self.counts.values.astype(np.int64))
+        os.rename(temp_path, self.state_path)
+
+    def _tasks(self):
+        """ Return list of tasks for raw files with bytes not yet counted. """
+        tasks = []
+        for file_name in sorted(listdir(self.raw_folder)):
+            if not file_name.endswith(".csv"):
+                continue
+            path = pathjoin(self.raw_folder, file_name)
+            start = self.offsets.get(file_name, 0)
+            if os.path.getsize(path) > start:
+                tasks.append((path, start, self.stop_words,
+                              self.cleaning_steps))
+        return tasks
+
+    def _merge(self, results):
+        """ Merge list of worker results into counts and offsets. """
+        self.counts = _merge_counts(
+                        [self.counts.index.tolist()] +
+                        [words for path, end, num, words, counts in results],
+                        [self.counts.values.astype(np.int64)] +
+                        [counts for path, end, num, words, counts in results])
+        for path, end, num_tweets, words, counts in results:
+            self.offsets[os.path.basename(path)] = end
+            self.num_tweets += num_tweets
+
+    def build(self):
+        """ Count words of all raw tweets not yet counted, save progress, and
+        write the background csv and npz files. Returns number of tweets
+        counted in this run.
+        """
+        start_time = time.time()
+        self.load_state()
+        tasks = self._tasks()
+        print "Raw files with tweets to count:", len(tasks)
+        num_tweets_before = self.num_tweets
+        results = []
+        if self.processes == 1:
+            pool = None
+            result_iterator = (_count_new_lines(task) for task in tasks)
+        else:
+            pool = multiprocessing.Pool(self.processes)
+            result_iterator = pool.imap_unordered(_count_new_lines, tasks)
+        try:
+            for i, result in enumerate(result_iterator):
+                results.append(result)
+                if len(results) >= self.checkpoint_every:
+                    self._merge(results)
+                    self.save_state()
+                    results = []
+                    print "Files counted:", i + 1, "of", len(tasks)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self._merge(results)
+        self.save_state()
+
+        kept = self.counts[self.counts >= self.min_count]
+        # frequencies are relative to all words counted, including those
+        # below min_count
+        write_background(kept.index.tolist(), kept.values, self.output_path,
+                         self.npz_path, total=int(self.counts.sum()))
+        print "Tweets counted in background:", self.num_tweets
+        print "Words in background:", len(kept)
+        print "Time to build background: ", \
+              round((time.time() - start_time)/60., 3), "minutes"
+        return self.num_tweets - num_tweets_before
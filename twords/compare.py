@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Compare word counts of many corpora at once.
+
+create_word_freq_df compares a single corpus with background_dict one word at
+a time. A CorpusComparison instead holds the word counts of any number of
+corpora (Twords objects, freq_dists or plain count tables) as one
+corpus-by-word matrix over a shared vocabulary, and computes frequencies, log
+ratios and log-likelihood (G²) keyness scores for every corpus and word with
+array operations.
+
+Each corpus can be compared against
+
+- "background": the rates in a background_dict
+- "rest": the sum of all the other corpora
+- the name of one of the corpora
+
+Log-likelihood follows Rayson and Garside (2000): for a word occurring a times
+in a corpus of c words and b times in a reference corpus of d words,
+
+    G² = 2 (a ln(a/E1) + b ln(b/E2)),  E1 = c(a+b)/(c+d),  E2 = d(a+b)/(c+d)
+
+G² above 3.84 is significant at p < 0.05, above 6.63 at p < 0.01 and above
+15.13 at p < 0.0001. Scores are signed: negative when the word is less
+frequent in the corpus than in the reference.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .sketch import SketchFreqDist
+
+
+def _corpus_counts(corpus):
+    """ Return (words, counts) of corpus, which is a Twords object, an nltk
+    FreqDist, a SketchFreqDist (only its heavy hitters have counts), a
+    dictionary of word counts or a pandas Series of counts indexed by word.
+    """
+    if hasattr(corpus, "freq_dist"):
+        corpus = corpus.freq_dist
+    if isinstance(corpus, SketchFreqDist):
+        items = corpus.most_common()
+        return [word for word, count in items], [count for word, count
+                                                 in items]
+    if isinstance(corpus, pd.Series):
+        return list(corpus.index), corpus.values
+    return list(corpus.keys()), list(corpus.values())
+
+
+def _xlogy(x, y):
+    """ x*log(y) elementwise, with 0 where x is 0. """
+    result = np.zeros(np.broadcast(x, y).shape)
+    nonzero = np.broadcast_to(x != 0, result.shape)
+    x = np.broadcast_to(x, result.shape)
+    y = np.broadcast_to(y, result.shape)
+    result[nonzero] = x[nonzero]*np.log(y[nonzero])
+    return result
+
+
+class CorpusComparison(object):
+    """ Word counts of several corpora over a shared vocabulary.
+
+    names (list): name of each corpus (row of counts)
+    words (numpy object array): shared vocabulary (column of counts)
+    counts (2d numpy int64 array): counts[i, j] is the number of times
+                                   words[j] occurs in corpus names[i]
+    totals (numpy int64 array): total number of words in each corpus,
+                                counting words left out of the vocabulary
+    background_counts, background_total: counts of the vocabulary in the
+                                background corpus and its estimated size,
+                                if a background_dict was given
+    """
+
+    def __init__(self, names, words, counts, totals, background_counts=None,
+                 background_total=None):
+        self.names = list(names)
+        self.words = np.asarray(words, dtype=object)
+        self.counts = counts
+        self.totals = np.asarray(totals, dtype=np.int64)
+        self.background_counts = background_counts
+        self.background_total = background_total
+
+    def __repr__(self):
+        return "CorpusComparison of %d corpora over %d words" % \
+            (len(self.names), len(self.words))
+
+    def _reference(self, reference):
+        """ Return (ref_counts, ref_totals) broadcastable against counts and
+        totals[:, None] for reference "background", "rest" or a corpus name.
+        """
+        if reference == "background":
+            if self.background_counts is None:
+                raise Exception("No background_dict was given to compare "
+                                "against")
+            return self.background_counts[None, :], \
+                np.array([[self.background_total]], dtype=np.float64)
+        if reference == "rest":
+            return self.counts.sum(axis=0)[None, :] - self.counts, \
+                (self.totals.sum() - self.totals)[:, None].astype(np.float64)
+        if reference in self.names:
+            i = self.names.index(reference)
+            return self.counts[i][None, :], \
+                np.array([[self.totals[i]]], dtype=np.float64)
+        raise Exception("Unknown reference " + str(reference) +
+                        ": use 'background', 'rest' or a corpus name")
+
+    def frequencies(self):
+        """ Return matrix of word frequencies in each corpus. """
+        totals = np.maximum(self.totals, 1)[:, None].astype(np.float64)
+        return self.counts/totals
+
+    def log_ratios(self, reference="background", smoothing=0.):
+        """ Return matrix of natural log of the ratio of each word's frequency
+        in each corpus to its frequency in reference.
+
+        Like create_word_freq_df, the ratio is 0 where the word is missing
+        from the corpus or reference, unless smoothing is positive: then
+        smoothing is added to all counts and every ratio is defined.
+
+        reference (string): "background", "rest" or a corpus name
+        smoothing (float): pseudocount added to each count
+        """
+        ref_counts, ref_totals = self._reference(reference)
+        counts = self.counts + smoothing
+        ref_counts = ref_counts + smoothing
+        totals = self.totals[:, None] + smoothing*len(self.words)
+        ref_totals = ref_totals + smoothing*len(self.words)
+        counts, ref_counts = np.broadcast_arrays(counts, ref_counts)
+        defined = (counts > 0) & (ref_counts > 0)
+        ratios = np.zeros(counts.shape)
+        ratios[defined] = np.log(counts[defined]) - np.log(ref_counts[defined])
+        ratios += np.where(defined, np.log(ref_totals) - np.log(totals), 0)
+        return ratios
+
+    def log_likelihoods(self, reference="background", signed=True):
+        """ Return matrix of log-likelihood (G²) keyness score of each word in
+        each corpus against reference.
+
+        reference (string): "background", "rest" or a corpus name
+        signed (bool): make scores negative for words less frequent in the
+                       corpus than in the reference
+        """
+        ref_counts, ref_totals = self._reference(reference)
+        a = self.counts.astype(np.float64)
+        b = np.broadcast_to(ref_counts, a.shape).astype(np.float64)
+        c = self.totals[:, None].astype(np.float64)
+        d = ref_totals
+        expected_a = c*(a + b)/(c + d)
+        expected_b = d*(a + b)/(c + d)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g2 = 2*(_xlogy(a, a/expected_a) + _xlogy(b, b/expected_b))
+        if signed:
+            g2 = np.where(a/np.maximum(c, 1) < b/np.maximum(d, 1), -g2, g2)
+        return g2
+
+    def to_frame(self, matrix):
+        """ Return matrix (e.g. from log_likelihoods) as dataframe with a row
+        for each corpus and a column for each word.
+        """
+        return pd.DataFrame(matrix, index=self.names, columns=self.words)
+
+    def top_words(self, name, n=20, reference="background"):
+        """ Return dataframe of the n words with highest log-likelihood score
+        in corpus name against reference, with their occurrences,
+        frequencies and log ratios.
+        """
+        i = self.names.index(name)
+        g2 = self.log_likelihoods(reference)[i]
+        top = np.argsort(-g2, kind='mergesort')[:n]
+        return pd.DataFrame({'word': self.words[top],
+                             'occurrences': self.counts[i, top],
+                             'frequency': self.frequencies()[i, top],
+                             'log relative frequency':
+                             self.log_ratios(reference)[i, top],
+                             'log likelihood': g2[top]},
+                            columns=['word', 'occurrences', 'frequency',
+                                     'log relative frequency',
+                                     'log likelihood'])
+
+
+def compare_corpora(corpora, background_dict=None, words=None, min_count=1):
+    """ Build CorpusComparison of corpora.
+
+    corpora: dictionary of name to corpus, or list of (name, corpus) tuples,
+             where each corpus is a Twords object, FreqDist, SketchFreqDist,
+             dictionary of word counts or Series of counts indexed by word
+    background_dict (dictionary): background rates, as in
+                                  Twords.background_dict, to compare against
+    words (list): vocabulary to compare; defaults to all words of corpora
+    min_count (int): leave out words with fewer occurrences over all corpora
+                     (ignored if words is given)
+    """
+    if isinstance(corpora, dict):
+        corpora = sorted(corpora.items())
+    names = [name for name, corpus in corpora]
+    all_words = []
+    all_counts = []
+    rows = []
+    for i, (name, corpus) in enumerate(corpora):
+        corpus_words, corpus_counts = _corpus_counts(corpus)
+        all_words.extend(corpus_words)
+        all_counts.append(np.asarray(corpus_counts, dtype=np.int64))
+        rows.append(np.repeat(i, len(corpus_words)))
+    all_counts = np.concatenate(all_counts) if all_counts else \
+        np.zeros(0, dtype=np.int64)
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+
+    # word ids over the shared vocabulary; each word appears at most once per
+    # corpus, so counts can be scattered straight into the matrix. Only the
+    # columns of words that are kept are allocated, never the full union of
+    # the vocabularies
+    word_ids, vocabulary = pd.factorize(pd.Series(all_words, dtype=object))
+    totals = np.bincount(rows, weights=all_counts,
+                         minlength=len(names)).astype(np.int64)
+    if words is not None:
+        words = [x.decode("utf-8") if type(x) == str else x for x in words]
+        positions = vocabulary.get_indexer(words)
+        kept_ids = np.unique(positions[positions != -1])
+    else:
+        word_totals = np.bincount(word_ids, weights=all_counts,
+                                  minlength=len(vocabulary))
+        kept_ids = np.flatnonzero(word_totals >= min_count)
+    column_of_id = np.full(len(vocabulary), -1, dtype=np.int64)
+    column_of_id[kept_ids] = np.arange(len(kept_ids))
+    columns = column_of_id[word_ids]
+    in_matrix = columns != -1
+    counts = np.zeros((len(names), len(kept_ids)), dtype=np.int64)
+    counts[rows[in_matrix], columns[in_matrix]] = all_counts[in_matrix]
+
+    if words is not None:
+        # columns in the order of words; words in no corpus (position -1)
+        # get an extra column of zeros
+        counts = np.hstack([counts, np.zeros((len(names), 1),
+                                             dtype=np.int64)])
+        counts = counts[:, np.append(column_of_id, len(kept_ids))[positions]]
+        vocabulary = np.array(words, dtype=object)
+    else:
+        vocabulary = np.asarray(vocabulary, dtype=object)[kept_ids]
+
+    background_counts = None
+    background_total = None
+    if background_dict:
+        background_words = list(background_dict.keys())
+        frequency = np.array([background_dict[word][0] for word in
+                              background_words], dtype=np.float64)
+        occurrences = np.array([background_dict[word][1] for word in
+                                background_words], dtype=np.float64)
+        # background_dict holds frequency = occurrences/total for each word
+        background_total = occurrences.sum()/frequency.sum()
+        background_counts = pd.Series(occurrences, index=pd.Index(
+                                      background_words, dtype=object)) \
+            .reindex(pd.Index(vocabulary, dtype=object)).fillna(0).values
+
+    return CorpusComparison(names, vocabulary, counts, totals,
+                            background_counts, background_total)
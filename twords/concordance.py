@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Keyword-in-context concordances from a positional token index.
+
+A TokenIndex tokenizes every tweet once and stores
+
+- codes: the vocabulary id of every token, tweet after tweet
+- token_offsets: where each tweet's tokens start in codes
+- an inverted index: the positions in codes of each vocabulary id, as one
+  array of positions grouped by id plus the offset of each id's group
+
+so the occurrences of a word are a slice of the inverted index, and their
+contexts are gathered from codes with numpy fancy indexing - a lookup never
+rescans the text, and its cost depends on the number of occurrences of the
+word, not the size of the corpus.
+
+Tokens are those of TextStore.tokenize - words, hashtags, mentions and
+single punctuation characters (a regular expression split, much faster than
+nltk tokenizing); words that nltk splits differently (e.g. u"don't") are
+looked up as the regular expression splits them.
+"""
+
+import numpy as np
+import pandas as pd
+
+# text is decoded and tokenized this many bytes at a time
+CHUNK_BYTES = 2**24
+
+
+class TokenIndex(object):
+    """ Positions of every token of every tweet.
+
+    vocabulary (numpy object array): token of each id
+    codes (numpy int32 array): token id of each token, tweet after tweet
+    token_offsets (numpy int64 array): tokens of tweet i are
+                                       codes[token_offsets[i]:
+                                             token_offsets[i+1]]
+    """
+
+    def __init__(self, text_store):
+        """ text_store (TextStore): texts of the tweets (see
+        Twords.text_store)
+        """
+        vocabulary = pd.Index([], dtype=object)
+        codes_list = [np.zeros(0, dtype=np.int32)]
+        tokens_per_row = np.zeros(len(text_store), dtype=np.int64)
+        num_chunks = max(1, int(np.ceil(text_store.nbytes /
+                                        float(CHUNK_BYTES))))
+        for start, stop in text_store.chunks(num_chunks):
+            codes, uniques, rows = text_store.tokenize(start, stop)
+            tokens_per_row[start:stop] = np.bincount(rows - start,
+                                                     minlength=stop - start)
+            # give chunk tokens their ids in the vocabulary of all chunks
+            ids = vocabulary.get_indexer(uniques)
+            new = ids == -1
+            ids[new] = len(vocabulary) + np.arange(new.sum())
+            vocabulary = vocabulary.append(uniques[new])
+            codes_list.append(ids[codes].astype(np.int32))
+
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+        self._index = pd.Index(self.vocabulary, dtype=object)
+        self.codes = np.concatenate(codes_list)
+        self.token_offsets = np.zeros(len(text_store) + 1, dtype=np.int64)
+        np.cumsum(tokens_per_row, out=self.token_offsets[1:])
+        # inverted index: positions of each id, in order of position -
+        # sorting (id, position) keys is several times faster than a
+        # stable argsort of the ids
+        keys = self.codes.astype(np.int64)*len(self.codes) + \
+            np.arange(len(self.codes), dtype=np.int64)
+        keys.sort()
+        self._positions = keys % max(len(self.codes), 1)
+        del keys
+        self._id_offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.codes, minlength=len(self.vocabulary)),
+                  out=self._id_offsets[1:])
+
+    def __repr__(self):
+        return "TokenIndex of %d tokens in %d tweets" % \
+            (len(self.codes), len(self.token_offsets) - 1)
+
+    def positions(self, word):
+        """ Return array of positions in codes of the occurrences of word,
+        in order of position.
+        """
+        if type(word) == str:
+            word = word.decode("utf-8")
+        word_id = self._index.get_indexer([word])[0]
+        if word_id == -1:
+            return np.zeros(0, dtype=np.int64)
+        return self._positions[self._id_offsets[word_id]:
+                               self._id_offsets[word_id + 1]]
+
+    def contexts(self, positions, left, right):
+        """ Return (rows, left_ids, right_ids): the tweet of each position,
+        and matrices of the ids of the left tokens before and right tokens
+        after it (-1 past the start or end of its tweet).
+        """
+        rows = np.searchsorted(self.token_offsets, positions,
+                               side='right') - 1
+        starts = self.token_offsets[rows]
+        ends = self.token_offsets[rows + 1]
+        left_positions = positions[:, np.newaxis] + np.arange(-left, 0)
+        right_positions = positions[:, np.newaxis] + np.arange(1, right + 1)
+        left_ids = np.where(left_positions >= starts[:, np.newaxis],
+                            self.codes[np.clip(left_positions, 0, None)], -1)
+        right_ids = np.where(right_positions < ends[:, np.newaxis],
+                             self.codes[np.clip(right_positions, None,
+                                                len(self.codes) - 1)], -1)
+        return rows, left_ids, right_ids
+
+    def _strings(self, ids):
+        """ Return list of the tokens of each row of matrix ids joined by
+        spaces (-1 ids left out).
+        """
+        tokens = np.append(self.vocabulary, u"")[ids]
+        return [u" ".join(token for token in row if token) for row in tokens]
+
+    def concordance(self, word, width=5, max_lines=None):
+        """ Return dataframe of the occurrences of word with width tokens of
+        context on each side: columns row (position of the tweet in
+        tweets_df), left, word and right.
+
+        max_lines (int): return only the first max_lines occurrences
+        """
+        positions = self.positions(word)[:max_lines]
+        rows, left_ids, right_ids = self.contexts(positions, width, width)
+        return pd.DataFrame({"row": rows,
+                             "left": self._strings(left_ids),
+                             "word": self.vocabulary[self.codes[positions]],
+                             "right": self._strings(right_ids)},
+                            columns=["row", "left", "word", "right"])
+
+    def patterns(self, word, left=1, right=1, n=20):
+        """ Return dataframe of the n most frequent contexts of word - the
+        left tokens before and right tokens after it - with columns left,
+        word, right, occurrences and example row (a tweet in which the
+        context occurs).
+        """
+        positions = self.positions(word)
+        rows, left_ids, right_ids = self.contexts(positions, left, right)
+        context_ids = np.hstack([left_ids, right_ids])
+        # number each distinct context in order of first occurrence, one
+        # column at a time so the combined numbers stay small
+        context = np.zeros(len(positions), dtype=np.int64)
+        for column in context_ids.T:
+            codes, uniques = pd.factorize(column)
+            context, uniques = pd.factorize(context*len(uniques) + codes)
+        is_first = context > np.maximum.accumulate(
+                        np.concatenate([[-1], context[:-1]]))
+        first_occurrence = np.flatnonzero(is_first)
+        occurrences = np.bincount(context)
+        top = np.argsort(-occurrences, kind='mergesort')[:n]
+        ids = context_ids[first_occurrence[top]]
+        return pd.DataFrame({"left": self._strings(ids[:, :left]),
+                             "word": self.vocabulary[self.codes[positions[0]]]
+                             if len(positions) else word,
+                             "right": self._strings(ids[:, left:]),
+                             "occurrences": occurrences[top],
+                             "example row": rows[first_occurrence[top]]},
+                            columns=["left", "word", "right", "occurrences",
+                                     "example row"])
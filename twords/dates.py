@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Tweet dates as datetime64 values, and a sorted date index of tweets_df.
+
+The java csv files give dates as strings like u"2016/06/25". A corpus of
+millions of tweets only has a few hundred distinct dates, so normalize_dates
+parses each distinct string once and spreads the results over the rows with
+a single take, instead of converting every row in python.
+
+When tweets_df is sorted by date, the tweets of any date range are one
+contiguous block of rows. A DateIndex finds the bounds of that block with
+two binary searches, so the range can be passed on as a slice (for example
+to TextStore.joined, which then decodes just those texts) without copying
+any of tweets_df.
+"""
+
+import numpy as np
+import pandas as pd
+
+# integer key of missing dates: larger than every real date, so tweets
+# without a date are sorted last and fall outside every date range
+_NAT_KEY = np.iinfo(np.int64).max
+
+
+def normalize_dates(values):
+    """ Return numpy datetime64[ns] array of dates (strings of form
+    "yyyy/mm/dd" or "yyyy-mm-dd", optionally followed by a time, or values
+    that are already dates). Missing or unparseable dates are NaT.
+
+    values (sequence): dates, e.g. tweets_df["date"].values
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]")
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object).map(
+                            lambda x: x.replace("/", "-")
+                            if type(x) in (str, unicode) else x),
+                            errors="coerce").values
+    dates = parsed.take(np.maximum(codes, 0))
+    dates[codes == -1] = np.datetime64("NaT")
+    return dates
+
+
+def date_keys(dates):
+    """ Return int64 sort keys of datetime64 array dates, missing dates last.
+    """
+    keys = dates.astype("datetime64[ns]").view(np.int64).copy()
+    keys[np.isnat(dates)] = _NAT_KEY
+    return keys
+
+
+def _day_key(date):
+    """ Return int64 key of the start of the day of date (string, datetime
+    or Timestamp).
+    """
+    return pd.Timestamp(date).normalize().value
+
+
+class DateIndex(object):
+    """ Binary-searchable dates of a tweets_df sorted by date.
+
+    keys (numpy int64 array): date of each row in nanoseconds, missing dates
+                              as the largest int64 (they are sorted last)
+    """
+
+    def __init__(self, dates):
+        """ dates (numpy datetime64 array): dates of the rows, sorted with
+        missing dates last
+        """
+        self.keys = date_keys(dates)
+        if len(self.keys) and (np.diff(self.keys) < 0).any():
+            raise Exception("Dates are not sorted - call sort_tweets_by_date")
+
+    def __repr__(self):
+        return "DateIndex of %d tweets" % len(self)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rows(self, start=None, end=None):
+        """ Return slice of the rows of tweets on dates from start up to and
+        including end (whole days). A bound left as None is open, but tweets
+        without a date are never included.
+
+        start, end (string or datetime): dates, e.g. "2016-06-20"
+        """
+        lower = 0 if start is None else \
+            np.searchsorted(self.keys, _day_key(start), side="left")
+        if end is None:
+            upper = np.searchsorted(self.keys, _NAT_KEY, side="left")
+        else:
+            next_day = _day_key(end) + pd.Timedelta(days=1).value
+            upper = np.searchsorted(self.keys, next_day, side="left")
+        return slice(int(lower), int(max(upper, lower)))
+
+    def first_date(self):
+        """ Return Timestamp of the earliest date (NaT if none). """
+        return self._date_at(0)
+
+    def last_date(self):
+        """ Return Timestamp of the latest date (NaT if none). """
+        stop = self.rows().stop
+        return self._date_at(stop - 1) if stop else pd.NaT
+
+    def _date_at(self, row):
+        if not len(self.keys) or self.keys[row] == _NAT_KEY:
+            return pd.NaT
+        return pd.Timestamp(self.keys[row])
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Hashtag and mention analytics for tweets_df.
+
+The mentions and hashtags columns of tweets_df hold space separated entities
+(e.g. u"#brexit #voteleave"). An EntityIndex splits a whole column in bulk
+into two flat arrays - the row of tweets_df and the interned id of each
+entity - without building a python list per tweet, so frequencies,
+per-period counts and co-occurrences are all computed with numpy on the
+flat arrays.
+
+Co-occurrence matrices are sparse: they are stored as dataframes of the
+entity pairs that occur together in at least one tweet, with the number of
+tweets they occur together in.
+"""
+
+import numpy as np
+import pandas as pd
+
+ENTITY_COLUMNS = ("hashtags", "mentions")
+
+
+class EntityIndex(object):
+    """ Interned entities of a space separated column of tweets_df.
+
+    vocabulary (numpy object array): entity of each id
+    rows (numpy int64 array): row position in tweets_df of each occurrence
+    ids (numpy int64 array): entity id of each occurrence
+
+    Each (row, id) pair appears once, so an entity repeated in a tweet
+    counts once.
+    """
+
+    def __init__(self, column):
+        """ column (pandas Series): space separated entities of each tweet;
+        nulls are tweets without entities.
+        """
+        values = column.where(column.notnull(), u"")
+        values = values.map(lambda value: value if type(value) == unicode
+                            else value.decode("utf-8") if type(value) == str
+                            else unicode(value))
+        # one flat split of all rows joined together, with a newline token
+        # marking the start of each new row
+        tokens = u" \n ".join(values.tolist()).split(u" ")
+        ids, vocabulary = pd.factorize(pd.Series(tokens, dtype=object))
+        newline, empty = vocabulary.get_indexer([u"\n", u""])
+        rows = np.cumsum(ids == newline)
+        # drop the row markers and the empty tokens of empty rows and
+        # repeated spaces, and renumber the remaining ids
+        dropped = [i for i in (newline, empty) if i != -1]
+        kept = ~np.in1d(ids, dropped)
+        new_ids = np.cumsum(~np.in1d(np.arange(len(vocabulary)), dropped)) - 1
+        ids = new_ids[ids[kept]].astype(np.int64)
+        rows = rows[kept]
+        vocabulary = vocabulary.delete(dropped)
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+        self._index = pd.Index(self.vocabulary, dtype=object)
+        # count each entity once per tweet
+        pairs = np.unique(rows*len(self.vocabulary) + ids) if len(ids) else \
+            np.zeros(0, dtype=np.int64)
+        size = max(len(self.vocabulary), 1)
+        self.rows = pairs//size
+        self.ids = pairs % size
+
+    def __repr__(self):
+        return "EntityIndex of %d entities in %d tweets" % \
+            (len(self.vocabulary), len(np.unique(self.rows)))
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def id_of(self, entity):
+        """ Return id of entity, or -1 if it never occurs. """
+        if type(entity) == str:
+            entity = entity.decode("utf-8")
+        return self._index.get_indexer([entity])[0]
+
+    def counts(self):
+        """ Return array of number of tweets each entity id occurs in. """
+        return np.bincount(self.ids, minlength=len(self.vocabulary))
+
+    def most_common(self, n=None):
+        """ Return dataframe of the n entities occurring in most tweets. """
+        counts = self.counts()
+        top = np.argsort(-counts, kind='mergesort')[:n]
+        return pd.DataFrame({"entity": self.vocabulary[top],
+                             "tweets": counts[top]},
+                            columns=["entity", "tweets"])
+
+
+def _pairs(first, second, same):
+    """ Return (first_ids, second_ids) of every pair of entities from
+    EntityIndex first and second that occur in the same tweet. If same
+    (first and second are the same index), each unordered pair is returned
+    once with first id < second id.
+    """
+    left = pd.DataFrame({"row": first.rows, "first": first.ids})
+    right = pd.DataFrame({"row": second.rows, "second": second.ids})
+    pairs = left.merge(right, on="row")
+    if same:
+        pairs = pairs[pairs["first"].values < pairs["second"].values]
+    return pairs["first"].values, pairs["second"].values
+
+
+class EntityAnalytics(object):
+    """ Hashtag and mention frequencies and co-occurrences of tweets_df.
+
+    hashtags (EntityIndex): index of the hashtags column (if present)
+    mentions (EntityIndex): index of the mentions column (if present)
+    """
+
+    def __init__(self, tweets_df):
+        self.tweets_df = tweets_df
+        self.indexes = {}
+        for column in ENTITY_COLUMNS:
+            if column in tweets_df.columns:
+                self.indexes[column] = EntityIndex(tweets_df[column])
+        self._cooccurrences = {}
+
+    def __repr__(self):
+        return "EntityAnalytics of " + str(len(self.tweets_df)) + " tweets"
+
+    @property
+    def hashtags(self):
+        return self._index("hashtags")
+
+    @property
+    def mentions(self):
+        return self._index("mentions")
+
+    def _index(self, kind):
+        if kind not in self.indexes:
+            raise Exception("tweets_df has no " + str(kind) + " column")
+        return self.indexes[kind]
+
+    def most_common(self, kind="hashtags", n=20):
+        """ Return dataframe of the n most common hashtags or mentions, with
+        the number of tweets each occurs in.
+
+        kind (string): "hashtags" or "mentions"
+        """
+        return self._index(kind).most_common(n)
+
+    def counts_by_period(self, kind="hashtags", freq="M", n=20):
+        """ Return dataframe of the number of tweets in each period (rows)
+        containing each of the n most common hashtags or mentions (columns).
+
+        kind (string): "hashtags" or "mentions"
+        freq (string): pandas period frequency, e.g. "D", "W" or "M"
+        n (int): number of entities
+        """
+        index = self._index(kind)
+        top = np.argsort(-index.counts(), kind='mergesort')[:n]
+        rank = np.full(len(index), -1, dtype=np.int64)
+        rank[top] = np.arange(len(top))
+        periods = pd.to_datetime(pd.Series(self.tweets_df["date"].values),
+                                 errors='coerce').dt.to_period(freq)
+        period_ids, period_labels = pd.factorize(periods, sort=True)
+        period_of_occurrence = period_ids[index.rows]
+        kept = (rank[index.ids] != -1) & (period_of_occurrence != -1)
+        counts = np.bincount(period_of_occurrence[kept]*len(top) +
+                             rank[index.ids[kept]],
+                             minlength=len(period_labels)*len(top))
+        return pd.DataFrame(counts.reshape(len(period_labels), len(top)),
+                            index=period_labels,
+                            columns=index.vocabulary[top])
+
+    def cooccurrence(self, kind="hashtags", other="hashtags"):
+        """ Return sparse co-occurrence matrix of kind and other entities, as
+        dataframe with columns kind, other and tweets (number of tweets the
+        two occur in together), most frequent pairs first. For hashtag-hashtag
+        co-occurrence each pair appears once.
+
+        kind, other (string): "hashtags" or "mentions"
+        """
+        key = (kind, other)
+        if key not in self._cooccurrences:
+            first = self._index(kind)
+            second = self._index(other)
+            first_ids, second_ids = _pairs(first, second, kind == other)
+            size = max(len(second), 1)
+            pair_keys, tweets = np.unique(first_ids*size + second_ids,
+                                          return_counts=True)
+            order = np.argsort(-tweets, kind='mergesort')
+            pair_keys = pair_keys[order]
+            first_column = "first " + kind if kind == other else kind
+            second_column = "second " + other if kind == other else other
+            self._cooccurrences[key] = pd.DataFrame(
+                {first_column: first.vocabulary[pair_keys//size],
+                 second_column: second.vocabulary[pair_keys % size],
+                 "tweets": tweets[order]},
+                columns=[first_column, second_column, "tweets"])
+        return self._cooccurrences[key]
+
+    def top_neighbours(self, entity, k=10, kind="hashtags", other="hashtags"):
+        """ Return dataframe of the k other entities occurring in most tweets
+        together with entity, with the number of such tweets.
+
+        entity (string): hashtag or mention, e.g. u"#brexit"
+        kind (string): whether entity is one of "hashtags" or "mentions"
+        other (string): neighbours are "hashtags" or "mentions"
+        """
+        if type(entity) == str:
+            entity = entity.decode("utf-8")
+        if kind == other:
+            pairs = self.cooccurrence(kind, other)
+            first, second = pairs.columns[0], pairs.columns[1]
+            is_first = (pairs[first] == entity).values
+            is_second = (pairs[second] == entity).values
+            neighbours = np.concatenate([pairs[second].values[is_first],
+                                         pairs[first].values[is_second]])
+            tweets = np.concatenate([pairs["tweets"].values[is_first],
+                                     pairs["tweets"].values[is_second]])
+        else:
+            pairs = self.cooccurrence(kind, other)
+            matches = (pairs[kind] == entity).values
+            neighbours = pairs[other].values[matches]
+            tweets = pairs["tweets"].values[matches]
+        order = np.argsort(-tweets, kind='mergesort')[:k]
+        return pd.DataFrame({"entity": neighbours[order],
+                             "tweets": tweets[order]},
+                            columns=["entity", "tweets"])
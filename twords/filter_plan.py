@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Deferred filtering of tweets_df.
+
+A FilterPlan collects the drop/keep operations of the Twords pruning methods
+as predicates instead of applying each one to tweets_df right away. When the
+plan is executed it is first optimized:
+
+- term lists of all drop predicates of the same kind are merged into a single
+  regular expression, so e.g. twenty calls to drop_by_term_in_tweet become a
+  single scan of the text column
+- predicates are ordered cheapest first, so expensive text scans only look at
+  the tweets that survived the cheap ones
+
+and then evaluated into one boolean mask that is applied to tweets_df once.
+The number of tweets each predicate dropped is reported.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .tweet_class import class_bits
+
+# Predicate kinds, with their relative cost used to order them. Duplicates
+# must be last since which tweet counts as the first instance of a text
+# depends on which tweets survive the other predicates.
+PREDICATE_COSTS = {"unicode_text": 0,
+                   "drop_classes": 0,
+                   "drop_usernames": 1,
+                   "drop_name_terms": 1,
+                   "keep_text_terms": 2,
+                   "drop_text_terms": 2,
+                   "drop_duplicates": 3}
+
+# Predicates whose term lists can be merged into one (dropping on term1 and
+# then on term2 is the same as dropping on either of them)
+MERGEABLE_KINDS = ("drop_classes", "drop_usernames", "drop_name_terms",
+                   "drop_text_terms")
+
+
+def _terms_pattern(terms):
+    """ Combine list of terms (each used as a regular expression by
+    str.contains) into a single regular expression matching any of them.
+    """
+    if len(terms) == 1:
+        return terms[0]
+    return "|".join(["(?:" + term + ")" for term in terms])
+
+
+def _contains(values, terms):
+    """ Return boolean numpy array of which values (numpy object array)
+    contain any of terms. Values that are not strings give False.
+    """
+    contains = pd.Series(values, dtype=object).str.contains(
+                                                    _terms_pattern(terms))
+    return (contains == True).values
+
+
+class FilterPlan(object):
+    """ Ordered list of pending filters on tweets_df.
+
+    Each predicate is a tuple (kind, terms) where kind is one of the keys of
+    PREDICATE_COSTS and terms is a list of strings (or None).
+    """
+
+    def __init__(self):
+        self.predicates = []
+
+    def __repr__(self):
+        return "FilterPlan with " + str(len(self.predicates)) + " predicates"
+
+    def __len__(self):
+        return len(self.predicates)
+
+    def add(self, kind, terms=None):
+        """ Append predicate to plan. """
+        assert kind in PREDICATE_COSTS
+        if terms is not None:
+            terms = list(terms)
+        self.predicates.append((kind, terms))
+
+    def optimize(self):
+        """ Return list of predicates with mergeable term lists merged,
+        repeated predicates removed and cheapest predicates first.
+        """
+        merged = []
+        positions = {}
+        for kind, terms in self.predicates:
+            if kind in MERGEABLE_KINDS or kind in ("unicode_text",
+                                                   "drop_duplicates"):
+                if kind in positions:
+                    if terms:
+                        merged_terms = merged[positions[kind]][1]
+                        merged_terms.extend([term for term in terms
+                                             if term not in merged_terms])
+                    continue
+                positions[kind] = len(merged)
+                merged.append((kind, list(terms) if terms else terms))
+            else:
+                # keep predicates can't be merged - keeping tweets with
+                # term1 and then tweets with term2 keeps tweets with both
+                merged.append((kind, terms))
+        # sort is stable, so predicates of equal cost keep their order
+        return sorted(merged, key=lambda predicate:
+                      PREDICATE_COSTS[predicate[0]])
+
+    def _evaluate(self, kind, terms, tweets_df, rows):
+        """ Return boolean array over rows (positions in tweets_df) of which
+        rows the predicate keeps.
+        """
+        column_names = list(tweets_df.columns.values)
+        if kind == "unicode_text":
+            text = tweets_df["text"].values[rows]
+            return np.array([type(value) == unicode for value in text],
+                            dtype=bool)
+        if kind == "drop_classes":
+            # a mask on the tweet_class bit-field (see tweet_class.py)
+            if "tweet_class" not in column_names:
+                raise Exception("tweets_df has no tweet_class column - "
+                                "call classify_tweets first")
+            return (tweets_df["tweet_class"].values[rows] &
+                    class_bits(terms)) == 0
+        if kind == "drop_usernames":
+            usernames = tweets_df["username"].values[rows]
+            return ~pd.Series(usernames, dtype=object).isin(terms).values
+        if kind == "drop_name_terms":
+            keep = np.ones(len(rows), dtype=bool)
+            for column in ("mentions", "username"):
+                if column in column_names:
+                    keep &= ~_contains(tweets_df[column].values[rows], terms)
+            return keep
+        if kind == "drop_text_terms":
+            return ~_contains(tweets_df["text"].values[rows], terms)
+        if kind == "keep_text_terms":
+            return _contains(tweets_df["text"].values[rows], terms)
+        if kind == "drop_duplicates":
+            return ~pd.Series(tweets_df["text"].values[rows]).duplicated().values
+        raise Exception("Unknown filter kind " + str(kind))
+
+    def execute(self, tweets_df):
+        """ Evaluate the optimized plan on tweets_df.
+
+        Returns (keep, report): keep is boolean numpy array of the rows of
+        tweets_df that pass every predicate, and report is a dataframe with
+        the number of tweets dropped by each predicate (in the order they
+        were evaluated, each counting only tweets not already dropped).
+        """
+        keep = np.ones(len(tweets_df), dtype=bool)
+        report = []
+        for kind, terms in self.optimize():
+            rows = np.flatnonzero(keep)
+            rows_kept = self._evaluate(kind, terms, tweets_df, rows)
+            keep[rows[~rows_kept]] = False
+            report.append((kind, ", ".join(terms) if terms else "",
+                           int((~rows_kept).sum())))
+        report = pd.DataFrame(report, columns=["filter", "terms",
+                                               "tweets dropped"])
+        return keep, report
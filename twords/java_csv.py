@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Parser for the semicolon separated csv files written by the java
+GetOldTweets jar.
+
+Each line of these files has the form
+
+    username;date;retweets;favorites;"text";geo;mentions;hashtags;"id";permalink
+
+and the text is written as is, so a tweet containing semicolons has more than
+ten fields. Rather than reading the file with a generic csv reader (which
+gets the number of fields wrong for those tweets and drops them), lines with
+exactly ten fields and no quotes inside the text are read in bulk by the
+pandas C parser, and the few other lines are split on their first four and
+last five semicolons: everything in between is the text, semicolons and
+quotes included.
+"""
+
+import mmap
+from io import BytesIO
+from os.path import getsize
+
+import numpy as np
+import pandas as pd
+
+# columns of csv files written by the java GetOldTweets jar, and the columns
+# of them kept in tweets_df
+JAVA_CSV_COLUMNS = ["username", "date", "retweets", "favorites", "text", "geo",
+                    "mentions", "hashtags", "id", "permalink"]
+TWEETS_DF_COLUMNS = ["username", "date", "retweets", "favorites", "text",
+                     "mentions", "hashtags", "id", "permalink"]
+
+# columns stored as integers; all other columns are unicode strings (NaN when
+# empty)
+INTEGER_COLUMNS = ("retweets", "favorites", "id")
+
+_HEADER_START = "username;date;"
+
+
+def _line_bounds(buf):
+    """ Return (starts, ends) arrays of byte offsets of the lines in buf
+    (numpy uint8 array), not counting the newline characters.
+    """
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(buf) and buf[-1] != ord('\n'):
+        ends = np.append(ends, len(buf))
+    starts = np.zeros(len(ends), dtype=np.int64)
+    starts[1:] = ends[:-1] + 1
+    return starts, ends
+
+
+def _parse_regular_lines(data, columns):
+    """ Parse bytes holding lines with exactly ten fields and no quotes
+    inside the text using the pandas C parser, reading only the needed
+    columns. Returns None if some integer field isn't an integer.
+    """
+    dtypes = dict((column, np.int64 if column in INTEGER_COLUMNS else object)
+                  for column in columns)
+    try:
+        return pd.read_csv(BytesIO(data), sep=";", header=None,
+                           names=JAVA_CSV_COLUMNS, usecols=columns,
+                           dtype=dtypes, keep_default_na=False,
+                           na_values=[""], encoding='utf-8')
+    except (ValueError, OverflowError):
+        return None
+
+
+def _strip_quotes(value):
+    if len(value) >= 2 and value[0] == u'"' and value[-1] == u'"':
+        return value[1:-1]
+    return value
+
+
+def _parse_irregular_lines(lines, columns):
+    """ Parse lines with more than ten fields, or with quotes inside the
+    text, by anchoring on the four leading and five trailing fields -
+    everything in between is the text. Returns (tweets, bad) where bad is
+    boolean array of lines with fields that couldn't be parsed.
+    """
+    records = []
+    for line in lines:
+        head = line.decode('utf-8', 'replace').split(u';', 4)
+        records.append(head[:4] + head[4].rsplit(u';', 5))
+    fields = dict(zip(JAVA_CSV_COLUMNS, zip(*records)))
+    bad = np.zeros(len(records), dtype=bool)
+    data = {}
+    for column in columns:
+        values = [_strip_quotes(value) for value in fields[column]]
+        if column in INTEGER_COLUMNS:
+            bad |= [not value.isdigit() for value in values]
+            values = [int(value) if value.isdigit() else 0
+                      for value in values]
+            data[column] = np.array(values, dtype=np.int64)
+        else:
+            values = np.array(values, dtype=object)
+            values[values == u""] = np.nan
+            data[column] = values
+    return pd.DataFrame(data, columns=columns), bad
+
+
+def parse_java_csv_bytes(data, columns=None):
+    """ Parse bytes of (part of) a java tweet csv file into a dataframe.
+    Returns (tweets, num_malformed), where num_malformed is the number of
+    non-empty lines that could not be parsed and were skipped.
+
+    A header line, if present, is skipped. Integer columns (retweets,
+    favorites, id) are returned as int64 and the quotes around text and id
+    are removed.
+
+    data (bytes): complete lines of a java csv file
+    columns (list of strings): columns to return, from JAVA_CSV_COLUMNS;
+                               defaults to TWEETS_DF_COLUMNS
+    """
+    if columns is None:
+        columns = TWEETS_DF_COLUMNS
+    if data.startswith(_HEADER_START):
+        data = data[data.find('\n') + 1:] if '\n' in data else ""
+
+    # count semicolons and quotes in each line without splitting the lines
+    buf = np.frombuffer(data, dtype=np.uint8) if data else \
+        np.zeros(0, dtype=np.uint8)
+    starts, ends = _line_bounds(buf)
+    semicolons = np.bincount(np.searchsorted(ends,
+                                             np.flatnonzero(buf == ord(';'))),
+                             minlength=len(ends))[:len(ends)]
+    quotes = np.bincount(np.searchsorted(ends,
+                                         np.flatnonzero(buf == ord('"'))),
+                         minlength=len(ends))[:len(ends)]
+    nonblank = ends > starts
+    # regular lines have ten fields and only the quotes around text and id
+    regular = nonblank & (semicolons == 9) & (quotes == 4)
+    irregular = nonblank & ~regular & (semicolons >= 9)
+    num_malformed = int((nonblank & (semicolons < 9)).sum())
+
+    # the regular lines (nearly all of them) go through the C parser in bulk
+    tweets = None
+    if regular.any():
+        if regular.all():
+            regular_data = data
+        else:
+            # join the runs of consecutive regular lines
+            changes = np.flatnonzero(np.diff(np.concatenate([[False], regular,
+                                                             [False]])))
+            run_starts = starts[changes[0::2]]
+            run_ends = ends[changes[1::2] - 1] + 1
+            regular_data = "".join([data[start:end] for start, end in
+                                    zip(run_starts, run_ends)])
+        tweets = _parse_regular_lines(regular_data, columns)
+        if tweets is None:
+            # some integer field is broken - parse every line the slow way
+            irregular = nonblank & (semicolons >= 9)
+            regular[:] = False
+    if tweets is None:
+        tweets = pd.DataFrame(dict((column, np.zeros(0, dtype=np.int64 if
+                                    column in INTEGER_COLUMNS else object))
+                                   for column in columns), columns=columns)
+
+    # the others are parsed separately and put back in their place in the
+    # file
+    if irregular.any():
+        irregular_tweets, bad = _parse_irregular_lines(
+                            [data[start:end] for start, end in
+                             zip(starts[irregular], ends[irregular])],
+                            columns)
+        num_malformed += int(bad.sum())
+        line_numbers = np.concatenate([np.flatnonzero(regular),
+                                       np.flatnonzero(irregular)[~bad]])
+        tweets = pd.concat([tweets, irregular_tweets[~bad]],
+                           ignore_index=True)
+        tweets = tweets.take(np.argsort(line_numbers, kind='mergesort'))
+        tweets.index = range(len(tweets))
+    return tweets, num_malformed
+
+
+def read_java_csv(path, columns=None, start=0, complete_lines_only=False):
+    """ Read java tweet csv file at path, starting at byte offset start.
+    Returns (tweets, end, num_malformed): tweets is dataframe of the parsed
+    tweets, end is the byte offset just past the last line read, and
+    num_malformed is the number of lines skipped.
+
+    The file is memory-mapped, so only the bytes from start on are read.
+
+    columns (list of strings): columns to return, from JAVA_CSV_COLUMNS;
+                               defaults to TWEETS_DF_COLUMNS
+    start (int): byte offset to start reading from
+    complete_lines_only (bool): stop at the last newline, leaving a
+                                partially written last line unread (for
+                                files that are still being written)
+    """
+    size = getsize(path)
+    data = ""
+    if size > start:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                end = size
+                if complete_lines_only:
+                    end = mapped.rfind('\n', start) + 1
+                if end > start:
+                    data = mapped[start:end]
+            finally:
+                mapped.close()
+    tweets, num_malformed = parse_java_csv_bytes(data, columns)
+    return tweets, start + len(data), num_malformed
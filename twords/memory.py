@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Memory accounting of a Twords object and estimates of the memory each
+heavy stage needs.
+
+A Twords object can hold tweets_df, a copy of the original tweets, word_bag,
+freq_dist, background_dict, word_freq_df and several caches at once, and the
+heavy stages add large temporaries on top: create_word_bag holds the joined
+words_string and the full token list while it builds word_bag, a cleaning
+step holds the old and the new text column, and loading csv files holds the
+parsed frames and their concatenation.
+
+deep_size measures what an object holds, including the strings inside
+lists, dictionaries and object columns. Containers and object columns or
+arrays of more than sample_size items are measured on an evenly spaced
+sample of their items, so measuring a
+word bag of millions of tokens takes milliseconds; items shared between
+containers (e.g. the strings of word_bag and of freq_dist) are counted in
+each, so sizes are upper bounds.
+
+The stage estimates are made from the current data before the stage runs:
+create_word_bag and ingestion tokenize or parse a sample of the tweets and
+scale up, cleaning uses the size of the column being rewritten. Twords uses
+them to check a memory_budget up front.
+"""
+
+import sys
+from collections import OrderedDict
+from math import ceil, e, log
+
+import numpy as np
+import pandas as pd
+
+from .java_csv import parse_java_csv_bytes
+from .textstore import TextStore
+
+# containers with more items than this are measured on a sample
+SAMPLE_SIZE = 10000
+
+# number of tweets tokenized to estimate create_word_bag temporaries
+SAMPLE_TWEETS = 2000
+
+# bytes read from the start of each csv file to estimate ingestion
+SAMPLE_CSV_BYTES = 2**20
+
+# bytes of a list or array entry pointing to an object
+POINTER_BYTES = np.dtype(np.intp).itemsize
+
+_UNICODE_CHAR_BYTES = sys.getsizeof(u"ab") - sys.getsizeof(u"a")
+
+MEGABYTE = 2.**20
+
+
+def megabytes(num_bytes):
+    return round(num_bytes/MEGABYTE, 1)
+
+
+def _sample(items, sample_size):
+    """ Return (evenly spaced sample of sequence items, scale from sample to
+    all items).
+    """
+    if len(items) <= sample_size:
+        return items, 1.
+    step = len(items)/float(sample_size)
+    return [items[int(i*step)] for i in range(sample_size)], step
+
+
+def array_size(values, sample_size=SAMPLE_SIZE):
+    """ Return approximate number of bytes held by numpy array values (e.g.
+    a column of a dataframe), including the objects of an object array,
+    measured on a sample of sample_size of them.
+    """
+    values = np.asarray(values)
+    if values.dtype != object:
+        return int(values.nbytes)
+    items, scale = _sample(values.ravel(), sample_size)
+    return int(values.nbytes +
+               scale*sum(sys.getsizeof(item) for item in items))
+
+
+def column_size(values, sample_size=SAMPLE_SIZE):
+    """ Return approximate number of bytes held by pandas Series (without
+    its index) or Index values, measuring the objects of object columns on
+    a sample of sample_size of them.
+    """
+    if values.dtype == object:
+        return array_size(values.values, sample_size)
+    if isinstance(values, pd.Index):
+        return int(values.memory_usage(deep=True))
+    return int(values.memory_usage(deep=True, index=False))
+
+
+def deep_size(obj, sample_size=SAMPLE_SIZE, seen=None):
+    """ Return approximate number of bytes held by obj and the objects it
+    refers to (strings of lists, keys and values of dictionaries, columns of
+    dataframes, arrays of TextStores and other objects). Memory-mapped
+    arrays count their full size.
+
+    sample_size (int): measure containers of more items on a sample
+    """
+    if obj is None:
+        return 0
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return column_size(obj.index, sample_size) + \
+            sum(column_size(obj.iloc[:, i], sample_size)
+                for i in range(obj.shape[1]))
+    if isinstance(obj, pd.Series):
+        return column_size(obj.index, sample_size) + \
+            column_size(obj, sample_size)
+    if isinstance(obj, pd.Index):
+        return column_size(obj, sample_size)
+    if isinstance(obj, np.ndarray):
+        return array_size(obj, sample_size)
+    if isinstance(obj, TextStore):
+        return int(obj.data.nbytes + obj.offsets.nbytes + obj.null.nbytes)
+    if isinstance(obj, (str, unicode, int, long, float, bool)):
+        return sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items, scale = _sample(list(obj) if isinstance(obj, (set, frozenset))
+                               else obj, sample_size)
+        return size + int(scale*sum(deep_size(item, sample_size, seen)
+                                    for item in items))
+    if isinstance(obj, dict):
+        keys, scale = _sample(list(obj.keys()), sample_size)
+        return size + int(scale*sum(deep_size(key, sample_size, seen) +
+                                    deep_size(obj[key], sample_size, seen)
+                                    for key in keys))
+    if hasattr(obj, "__dict__"):
+        return size + deep_size(obj.__dict__, sample_size, seen)
+    return size
+
+
+def attribute_sizes(twords, sample_size=SAMPLE_SIZE):
+    """ Return ordered dictionary of the bytes held by each part of twords
+    (Twords): tweets_df (without the original tweets), original tweets (the
+    original_tweets column or original_text_store), word_bag, freq_dist,
+    background_dict, word_freq_df and the cached results of earlier calls.
+    """
+    tweets_df = twords.tweets_df
+    sizes = OrderedDict()
+    if "original_tweets" in tweets_df.columns:
+        original = column_size(tweets_df["original_tweets"], sample_size)
+        sizes["tweets_df"] = deep_size(tweets_df, sample_size) - original
+    else:
+        original = deep_size(twords.original_text_store, sample_size)
+        sizes["tweets_df"] = deep_size(tweets_df, sample_size)
+    sizes["original tweets"] = original
+    for name in ["word_bag", "freq_dist", "background_dict",
+                 "word_freq_df"]:
+        sizes[name] = deep_size(getattr(twords, name), sample_size)
+    for name in ["_text_store_cache", "_token_index_cache",
+                 "_date_index_cache", "_user_index_cache",
+                 "_word_freq_cache", "_background_cache", "_entity_cache"]:
+        # caches are tuples of their keys and the cached result; the keys
+        # are held elsewhere (e.g. the text column the text store is of)
+        cache = getattr(twords, name, None)
+        sizes[name.strip("_").replace("_", " ")] = \
+            deep_size(cache[-1] if cache else None, sample_size)
+    return sizes
+
+
+def word_bag_estimates(text_store, rows=None, stop_words=(),
+                       chunk_size=100000, sample_tweets=SAMPLE_TWEETS):
+    """ Return ordered dictionary of estimated bytes of what create_word_bag
+    holds when building the word bag of rows (slice) of text_store:
+    words_string (the joined texts), tokens (the token list and its strings)
+    and word_bag (the kept tokens), and words_string and tokens when
+    tokenizing chunk_size tweets at a time.
+    """
+    if rows is None:
+        rows = slice(0, len(text_store))
+    num_rows = rows.stop - rows.start
+    estimates = OrderedDict([("words_string", 0), ("tokens", 0),
+                             ("word_bag", 0), ("chunk words_string", 0),
+                             ("chunk tokens", 0)])
+    if num_rows <= 0:
+        return estimates
+    sample_rows = np.unique(np.linspace(rows.start, rows.stop - 1,
+                                        min(num_rows, sample_tweets))
+                            .astype(np.int64))
+    sample = text_store.take(sample_rows)
+    scale = (text_store.offsets[rows.stop] -
+             text_store.offsets[rows.start])/float(max(sample.nbytes, 1))
+    # tokens about as nltk.word_tokenize splits them
+    codes, uniques = sample.tokenize()[:2]
+    sizes = np.array([sys.getsizeof(token) for token in uniques],
+                     dtype=np.int64)[codes]
+    kept = ~uniques.isin(list(stop_words))[codes]
+
+    chunk_fraction = min(1., chunk_size/float(num_rows))
+    estimates["words_string"] = int(scale*len(sample.joined()) *
+                                    _UNICODE_CHAR_BYTES)
+    estimates["tokens"] = int(scale*(len(codes)*POINTER_BYTES +
+                                     sizes.sum()))
+    estimates["word_bag"] = int(scale*(kept.sum()*POINTER_BYTES +
+                                       sizes[kept].sum()))
+    estimates["chunk words_string"] = int(chunk_fraction *
+                                          estimates["words_string"])
+    estimates["chunk tokens"] = int(chunk_fraction*estimates["tokens"])
+    return estimates
+
+
+def sketch_size(epsilon=1e-5, delta=0.01, num_heavy_hitters=10000):
+    """ Return estimated bytes held by a SketchFreqDist: its count-min table
+    plus its heavy hitter counts.
+    """
+    width = int(ceil(e/epsilon))
+    depth = int(ceil(log(1./delta)))
+    # a heavy hitter is a word in two series indexes plus two int64 counts
+    return depth*width*8 + num_heavy_hitters*(2*POINTER_BYTES + 16 +
+                                              sys.getsizeof(u"word"*2))
+
+
+def ingestion_estimates(paths, sample_bytes=SAMPLE_CSV_BYTES):
+    """ Return ordered dictionary of estimated tweets (number of tweets) and
+    bytes of tweets_df and of the text store of loading java csv files
+    paths, from parsing the first sample_bytes of each file.
+    """
+    total_bytes = 0.
+    parsed_bytes = 0.
+    parsed_tweets = 0
+    frame_bytes = 0
+    store_bytes = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read(sample_bytes)
+            f.seek(0, 2)
+            total_bytes += f.tell()
+        if len(data) == sample_bytes:
+            data = data[:data.rfind("\n") + 1]
+        if not data:
+            continue
+        tweets, num_malformed = parse_java_csv_bytes(data)
+        parsed_bytes += len(data)
+        parsed_tweets += len(tweets)
+        frame_bytes += int(tweets.memory_usage(deep=True).sum())
+        store_bytes += TextStore.from_texts(tweets["text"].values).nbytes
+    scale = total_bytes/parsed_bytes if parsed_bytes else 0.
+    return OrderedDict([("tweets", int(scale*parsed_tweets)),
+                        ("tweets_df", int(scale*frame_bytes)),
+                        ("text store", int(scale*store_bytes))])
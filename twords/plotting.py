@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Headless rendering of word frequency bar charts to image files.
+
+plot_word_frequencies draws on the interactive pyplot state machine, which is
+fine in a notebook but not for batch jobs that need hundreds of charts (per
+search term, per month). The functions here build each chart with the object
+oriented matplotlib API on an Agg canvas - no pyplot, no global figure state,
+no display needed - so charts can be rendered in parallel worker processes
+straight to image files.
+
+Long word lists are split into pages of words_per_page words, so a 2000 word
+table gives 40 readable images instead of one 1000 inch tall figure.
+"""
+
+import multiprocessing
+import time
+from os.path import splitext
+
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+WORDS_PER_PAGE = 50
+
+
+def _page_paths(path, num_pages):
+    """ Return list of file paths for the pages of a chart: path itself for
+    a single page, otherwise path with _page1, _page2, ... before the
+    extension.
+    """
+    if num_pages == 1:
+        return [path]
+    root, extension = splitext(path)
+    return [root + "_page" + str(i + 1) + extension for i in range(num_pages)]
+
+
+def render_word_frequency_chart(dataframe, plot_string, path, title=None,
+                                words_per_page=WORDS_PER_PAGE, max_words=None,
+                                dpi=72):
+    """ Render horizontal bar chart of column plot_string of dataframe (of
+    the same form as word_freq_df) to image file(s) at path, in the style of
+    plot_word_frequencies. Returns list of files written.
+
+    plot_string (string): column of dataframe to plot, e.g. "occurrences" or
+                          "log relative frequency"
+    path (string): image file to write; the format is taken from the
+                   extension (e.g. .png, .pdf, .svg)
+    title (string): chart title; defaults to plot_string
+    words_per_page (int): maximum number of words in one image; longer
+                          tables are split into several pages
+    max_words (int): only plot the first max_words words of dataframe
+    dpi (int): resolution of raster images
+    """
+    if plot_string not in dataframe.columns:
+        raise Exception("Input string must be column name of word_freq_df")
+    if title is None:
+        title = plot_string
+    if max_words is not None:
+        dataframe = dataframe[:max_words]
+    words = dataframe["word"].tolist()
+    values = dataframe[plot_string].values
+    num_pages = max(1, -(-len(words)//words_per_page))
+    paths = _page_paths(path, num_pages)
+    for page, page_path in enumerate(paths):
+        page_words = words[page*words_per_page:(page + 1)*words_per_page]
+        page_values = values[page*words_per_page:(page + 1)*words_per_page]
+        positions = range(len(page_words))
+        figure = Figure(figsize=(20, max(len(page_words)/2., 4)))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot(111)
+        ax.barh(positions, page_values, color="c")
+        ax.set_yticks(positions)
+        ax.set_yticklabels(page_words, fontsize=30)
+        ax.tick_params(axis="x", labelsize=30)
+        ax.set_ylim(-0.5, len(page_words) - 0.5)
+        ax.xaxis.grid(linewidth=4)
+        if num_pages > 1:
+            ax.set_title(title + " (" + str(page + 1) + "/" +
+                         str(num_pages) + ")", fontsize=30)
+        else:
+            ax.set_title(title, fontsize=30)
+        figure.savefig(page_path, dpi=dpi, bbox_inches="tight")
+    return paths
+
+
+def _render_job(job):
+    """ Render one chart job (dictionary of keyword arguments of
+    render_word_frequency_chart) and return (path, files, seconds). Runs in
+    a worker process.
+    """
+    start_time = time.time()
+    files = render_word_frequency_chart(**job)
+    return job["path"], files, time.time() - start_time
+
+
+def render_word_frequency_charts(jobs, processes=None):
+    """ Render many word frequency charts in parallel worker processes.
+    Returns dataframe with one row per chart giving its path, number of
+    files (pages) written and render time in seconds.
+
+    jobs (list): each job is a dictionary of keyword arguments of
+                 render_word_frequency_chart, e.g.
+                 {"dataframe": twit.word_freq_df,
+                  "plot_string": "log relative frequency",
+                  "path": "charts/brexit_june.png"}
+    processes (int): number of worker processes; defaults to the number of
+                     cpus, and 1 renders in this process
+    """
+    start_time = time.time()
+    if processes == 1:
+        results = [_render_job(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_render_job, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    report = pd.DataFrame([(path, len(files), seconds) for path, files,
+                           seconds in results],
+                          columns=["chart", "pages", "seconds"])
+    print "Time to render", len(jobs), "charts: ", \
+          round((time.time() - start_time)/60., 3), "minutes"
+    return report
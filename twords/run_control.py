@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Adaptive sizing of the java collector runs.
+
+The GetOldTweets jars scrape twitter's web search by scrolling, so a run
+asking for too many tweets breaks partway (it returns fewer tweets than
+asked for, or none at all), while many small runs waste time starting the
+jar and searching overlapping dates. The best run size depends on the query
+and on the day, so instead of a fixed tweets_per_run a RunController learns
+it from the runs themselves:
+
+- a complete run (returning nearly maxtweets tweets) grows maxtweets by a
+  fixed fraction, as long as tweets per minute don't fall below those of
+  the best run so far - if they do, maxtweets goes back to the best size
+- a short or failed run is taken as the scraper's failure point: maxtweets
+  is cut by a fraction and growth is capped below that size (the cap is
+  raised again after a number of complete runs in a row, in case the
+  failure was transient)
+- each failed run in a row after the first doubles the number of days the
+  search window steps back, so stretches of days without tweets are crossed
+  quickly
+
+A run has no window size of its own: the jars search back from until and
+stop after maxtweets tweets, so the days a successful run covers ("days
+advanced" in the log) follow from maxtweets and the tweet rate of the
+query, and tuning maxtweets for tweets per minute tunes the window with it.
+The next run starts where the last one stopped, so stepping over days
+after a successful run would only lose tweets; the step is only for
+failed runs, which return no date to start from.
+
+Each run's parameters and throughput are appended to run_log.txt (csv,
+named .txt so it isn't loaded with the tweet files) in the output folder.
+"""
+
+import time
+from os.path import join as pathjoin, exists
+
+import pandas as pd
+
+RUN_LOG_FILE = "run_log.txt"
+RUN_LOG_COLUMNS = ["time", "run", "until", "maxtweets", "tweets", "seconds",
+                   "days advanced", "tweets per minute", "outcome",
+                   "next maxtweets", "step days"]
+
+
+def count_run_tweets(path):
+    """ Return number of tweets (non-empty lines after the header) in java
+    csv file at path, or 0 if there is no file.
+    """
+    if not exists(path):
+        return 0
+    num_lines = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                num_lines += 1
+    return max(num_lines - 1, 0)
+
+
+class RunController(object):
+    """ Chooses maxtweets and search window step of each collector run.
+
+    tweets_per_run (int): maxtweets of the first run
+    output_folder (string): folder run_log.txt is written to (no log if None)
+    adaptive (bool): if False maxtweets and the step stay fixed, and runs
+                     are only logged
+    min_tweets_per_run, max_tweets_per_run (int): bounds of maxtweets
+    increase (float): fraction maxtweets grows by after a complete run
+    decrease (float): factor maxtweets is multiplied by after a short or
+                      failed run
+    complete_fraction (float): a run returning at least this fraction of
+                               maxtweets tweets is complete
+    ceiling_margin (float): after a failure at maxtweets n, maxtweets stays
+                            below ceiling_margin*n
+    ceiling_patience (int): number of complete runs in a row after which the
+                            ceiling is raised by increase
+    max_step_days (int): largest number of days a failed run steps back
+    """
+
+    def __init__(self, tweets_per_run, output_folder=None, adaptive=True,
+                 min_tweets_per_run=100, max_tweets_per_run=50000,
+                 increase=0.25, decrease=0.5, complete_fraction=0.95,
+                 ceiling_margin=0.9, ceiling_patience=5, max_step_days=32):
+        self.tweets_per_run = int(tweets_per_run)
+        self.adaptive = adaptive
+        self.min_tweets_per_run = min_tweets_per_run
+        self.max_tweets_per_run = max_tweets_per_run
+        self.increase = increase
+        self.decrease = decrease
+        self.complete_fraction = complete_fraction
+        self.ceiling_margin = ceiling_margin
+        self.ceiling_patience = ceiling_patience
+        self.max_step_days = max_step_days
+        self.log_path = None if output_folder is None else \
+            pathjoin(output_folder, RUN_LOG_FILE)
+
+        self.ceiling = None
+        self.step_days = 1
+        self.best_rate = 0.
+        self.best_size = self.tweets_per_run
+        self.runs = 0
+        self.complete_in_a_row = 0
+        self.failed_in_a_row = 0
+
+    def __repr__(self):
+        return "RunController at " + str(self.tweets_per_run) + \
+            " tweets per run"
+
+    def _bounded(self, size):
+        size = min(max(int(size), self.min_tweets_per_run),
+                   self.max_tweets_per_run)
+        if self.ceiling is not None:
+            size = min(size, max(int(self.ceiling*self.ceiling_margin),
+                                 self.min_tweets_per_run))
+        return size
+
+    def record(self, until, maxtweets, tweets, seconds, days_advanced,
+               failed=False):
+        """ Record the outcome of a run and choose the next maxtweets and
+        step. Returns the outcome: "complete", "short" or "failed".
+
+        until (string): until date of the run
+        maxtweets (int): maxtweets the run asked for
+        tweets (int): number of tweets it returned
+        seconds (float): time it took
+        days_advanced (int): days between until and the last tweet's date
+                             (None if the run failed)
+        failed (bool): whether the run returned no usable last date
+        """
+        self.runs += 1
+        rate = tweets/(seconds/60.) if seconds > 0 else 0.
+        if failed or tweets == 0:
+            outcome = "failed"
+        elif tweets >= self.complete_fraction*maxtweets:
+            outcome = "complete"
+        else:
+            outcome = "short"
+
+        if self.adaptive:
+            self.failed_in_a_row = self.failed_in_a_row + 1 \
+                if outcome == "failed" else 0
+            self.step_days = min(2**max(self.failed_in_a_row - 1, 0),
+                                 self.max_step_days)
+            if outcome == "complete":
+                self.complete_in_a_row += 1
+                if self.ceiling is not None and \
+                        self.complete_in_a_row >= self.ceiling_patience:
+                    self.ceiling = int(self.ceiling*(1 + self.increase))
+                    self.complete_in_a_row = 0
+                # a run at the best size so far re-measures its rate
+                if rate >= self.best_rate or maxtweets <= self.best_size:
+                    self.best_rate = rate
+                    self.best_size = maxtweets
+                    next_size = maxtweets*(1 + self.increase)
+                else:
+                    # bigger runs stopped paying off
+                    next_size = self.best_size
+            else:
+                self.complete_in_a_row = 0
+                self.ceiling = maxtweets if self.ceiling is None else \
+                    min(self.ceiling, maxtweets)
+                self.best_size = min(self.best_size, maxtweets)
+                next_size = maxtweets*self.decrease
+            self.tweets_per_run = self._bounded(next_size)
+
+        if self.log_path is not None:
+            row = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "run": self.runs, "until": until, "maxtweets": maxtweets,
+                   "tweets": tweets, "seconds": round(seconds, 1),
+                   "days advanced": days_advanced,
+                   "tweets per minute": round(rate, 1), "outcome": outcome,
+                   "next maxtweets": self.tweets_per_run,
+                   "step days": self.step_days}
+            pd.DataFrame([row], columns=RUN_LOG_COLUMNS).to_csv(
+                self.log_path, mode="a", header=not exists(self.log_path),
+                index=False)
+        return outcome
+
+
+def read_run_log(folder):
+    """ Return dataframe of the runs logged in folder (empty if none). """
+    log_path = pathjoin(folder, RUN_LOG_FILE)
+    if not exists(log_path):
+        return pd.DataFrame(columns=RUN_LOG_COLUMNS)
+    return pd.read_csv(log_path)
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Sampling of tweets for fast exploratory analysis of huge corpora.
+
+ReservoirSampler keeps a uniform random sample of a fixed number of tweets
+while batches of tweets (e.g. one csv file at a time) stream past, so a
+sample of a corpus too big for memory can be loaded. Each tweet gets a random
+key and the sample is the tweets with the smallest keys seen so far; a batch
+only has its tweets with keys below the current largest sample key merged
+in, so once the sample is full nearly every batch is discarded with one
+comparison.
+
+stratified_sample_positions samples a fraction of tweets_df separately
+within each date or user, so every day (or user) keeps its share of tweets.
+
+Counts from a sample are scaled by the sample fraction to estimate counts in
+the full corpus; see word_count_intervals for their confidence intervals.
+"""
+
+import numpy as np
+import pandas as pd
+
+# z value of 95% confidence intervals
+Z_95 = 1.959964
+
+
+class ReservoirSampler(object):
+    """ Uniform random sample of sample_size tweets from a stream of
+    tweets_df batches.
+
+    sample_size (int): number of tweets to keep
+    seed (int): seed of the random number generator
+    """
+
+    def __init__(self, sample_size, seed=0):
+        assert sample_size > 0
+        self.sample_size = sample_size
+        self.random_state = np.random.RandomState(seed)
+        self.num_seen = 0
+        self._sample = None
+        self._keys = np.zeros(0)
+        self._order = np.zeros(0, dtype=np.int64)
+
+    def __repr__(self):
+        return "ReservoirSampler with %d of %d tweets seen" % \
+            (len(self._keys), self.num_seen)
+
+    def add(self, tweets):
+        """ Offer dataframe of tweets (the next batch of the stream) to the
+        sample.
+        """
+        keys = self.random_state.random_sample(len(tweets))
+        order = self.num_seen + np.arange(len(tweets), dtype=np.int64)
+        self.num_seen += len(tweets)
+        if len(self._keys) == self.sample_size:
+            candidates = keys < self._keys.max()
+            keys = keys[candidates]
+            order = order[candidates]
+            tweets = tweets[candidates]
+        if not len(keys):
+            return
+        if self._sample is None:
+            sample = tweets
+        else:
+            sample = pd.concat([self._sample, tweets], ignore_index=True)
+        keys = np.concatenate([self._keys, keys])
+        order = np.concatenate([self._order, order])
+        if len(keys) > self.sample_size:
+            kept = np.argpartition(keys, self.sample_size - 1)[
+                                                    :self.sample_size]
+            sample = sample.take(kept)
+            keys = keys[kept]
+            order = order[kept]
+        self._sample = sample.reset_index(drop=True)
+        self._keys = keys
+        self._order = order
+
+    def sample_fraction(self):
+        """ Return fraction of the tweets seen that are in the sample. """
+        if not self.num_seen:
+            return 1.
+        return len(self._keys)/float(self.num_seen)
+
+    def sample(self):
+        """ Return dataframe of the sampled tweets, in the order they were
+        seen.
+        """
+        if self._sample is None:
+            return pd.DataFrame()
+        order = np.argsort(self._order, kind='mergesort')
+        return self._sample.take(order).reset_index(drop=True)
+
+
+def stratified_sample_positions(tweets_df, fraction, by=None, seed=0):
+    """ Return sorted array of row positions of a random sample of fraction
+    of the tweets in tweets_df. If by is a column name (e.g. "date" or
+    "username") each value of that column is sampled separately, keeping
+    fraction of its tweets (rounded up or down at random, so the expected
+    number kept is exact); tweets with a null value are sampled together
+    as one more stratum.
+
+    fraction (float): fraction of tweets to keep, between 0 and 1
+    by (string): column of tweets_df to stratify by
+    seed (int): seed of the random number generator
+    """
+    assert 0 < fraction <= 1
+    random_state = np.random.RandomState(seed)
+    keys = random_state.random_sample(len(tweets_df))
+    if by is None:
+        num_kept = int(np.floor(fraction*len(tweets_df) +
+                                random_state.random_sample()))
+        return np.sort(np.argsort(keys, kind='mergesort')[:num_kept])
+    strata, labels = pd.factorize(tweets_df[by])
+    # tweets with a null value (e.g. no date) are a stratum of their own
+    strata[strata == -1] = len(labels)
+    num_strata = len(labels) + 1
+    # rank of each tweet's key within its stratum
+    order = np.lexsort((keys, strata))
+    sizes = np.bincount(strata, minlength=num_strata)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    ranks = np.zeros(len(tweets_df), dtype=np.int64)
+    ranks[order] = np.arange(len(tweets_df)) - starts[strata[order]]
+    num_kept = np.floor(fraction*sizes + random_state.random_sample(
+                            num_strata)).astype(np.int64)
+    return np.flatnonzero(ranks < num_kept[strata])
+
+
+def word_count_intervals(occurrences, total, sample_fraction, z=Z_95):
+    """ Return (estimate, lower, upper, frequency_lower, frequency_upper)
+    arrays estimating the occurrences of words in the full corpus from their
+    occurrences in a sample of sample_fraction of its tweets, with z
+    confidence intervals (95% by default) of the counts and of the
+    frequencies.
+
+    Occurrences of a word in the sample are treated as binomial draws from
+    its occurrences in the full corpus, with the finite population
+    correction (1 - sample_fraction), so intervals shrink to the counts
+    themselves when the sample is the whole corpus.
+
+    occurrences (array): occurrences of each word in the sample
+    total (int): number of words in the sample
+    sample_fraction (float): fraction of the corpus sampled
+    """
+    occurrences = np.asarray(occurrences, dtype=np.float64)
+    estimate = occurrences/sample_fraction
+    spread = z*np.sqrt(occurrences*(1 - sample_fraction))/sample_fraction
+    frequency = occurrences/max(total, 1)
+    frequency_spread = z*np.sqrt(frequency*(1 - frequency)/max(total, 1) *
+                                 (1 - sample_fraction))
+    return estimate, np.maximum(estimate - spread, occurrences), \
+        estimate + spread, np.maximum(frequency - frequency_spread, 0), \
+        np.minimum(frequency + frequency_spread, 1)
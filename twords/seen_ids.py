@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Suppress duplicate tweets while collecting them.
+
+The collectors deliberately overlap their date windows (get_all_user_tweets
+steps back only to one day after the last tweet found, and
+create_java_tweets may search the same dates again after a failed run), so
+consecutive runs return many of the same tweets.
+
+Each output folder keeps a sorted array of the ids of all tweets already
+saved in it (.seen_ids.npy). When a run's output_got.csv is moved into the
+folder only the lines of tweets with new ids are written, and a line per run
+is added to overlap_log.txt in the folder giving how many of the tweets were
+already seen - a high overlap means the date windows could be wider. The
+log is csv, but named .txt so loading the folder's *.csv files (e.g. with
+get_java_tweets_from_csv_list) doesn't read it as tweets.
+"""
+
+import os
+import time
+from os.path import join as pathjoin, exists
+
+import numpy as np
+import pandas as pd
+
+from .java_csv import _HEADER_START
+
+SEEN_IDS_FILE = ".seen_ids.npy"
+OVERLAP_LOG_FILE = "overlap_log.txt"
+OVERLAP_LOG_COLUMNS = ["time", "file", "tweets", "new tweets", "duplicates",
+                       "overlap"]
+
+
+class SeenIds(object):
+    """ Sorted array of the tweet ids already saved in an output folder.
+
+    folder (string): output folder the ids are stored in
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = pathjoin(folder, SEEN_IDS_FILE)
+        if exists(self.path):
+            self.ids = np.load(self.path)
+        else:
+            self.ids = np.zeros(0, dtype=np.int64)
+
+    def __repr__(self):
+        return "SeenIds with %d ids in %s" % (len(self.ids), self.folder)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def contains(self, ids):
+        """ Return boolean array of which of ids (int64 array) were seen. """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.ids, ids),
+                               len(self.ids) - 1)
+        return self.ids[positions] == ids
+
+    def add(self, ids):
+        """ Add ids to the seen ids and save them. """
+        self.ids = np.union1d(self.ids, np.asarray(ids, dtype=np.int64))
+        # write under a temporary name and rename, so an interrupted save
+        # leaves the previous ids intact
+        temp_path = self.path + ".tmp.npy"
+        np.save(temp_path, self.ids)
+        os.rename(temp_path, self.path)
+
+
+def _line_id(line):
+    """ Return tweet id of a java csv line, or -1 if it can't be parsed. """
+    fields = line.rsplit(";", 2)
+    if len(fields) < 3:
+        return -1
+    tweet_id = fields[1].strip('"')
+    return int(tweet_id) if tweet_id.isdigit() else -1
+
+
+def move_new_tweets(source_path, destination_path, seen_ids):
+    """ Move java csv file at source_path (a run's output_got.csv) to
+    destination_path, keeping only the lines of tweets whose ids are not in
+    seen_ids (and the first line of ids repeated within the file), then add
+    the new ids to seen_ids and log the run's overlap in the folder of
+    seen_ids. Lines without a readable id are kept.
+
+    Returns dictionary of the run's overlap statistics, or None if there is
+    no file at source_path.
+
+    seen_ids (SeenIds): ids already saved in the destination folder
+    """
+    if not exists(source_path):
+        return None
+    with open(source_path, "rb") as f:
+        lines = f.read().splitlines(True)
+    header = []
+    if lines and lines[0].startswith(_HEADER_START):
+        header = lines[:1]
+        lines = lines[1:]
+    lines = [line for line in lines if line.strip()]
+    ids = np.array([_line_id(line) for line in lines], dtype=np.int64)
+    readable = ids != -1
+    new = ~seen_ids.contains(ids)
+    # only the first line of an id repeated within the run is new
+    new[readable] &= ~pd.Series(ids[readable]).duplicated().values
+    kept = new | ~readable
+
+    with open(destination_path, "wb") as f:
+        f.writelines(header + [line if line.endswith("\n") else line + "\n"
+                               for line, keep in zip(lines, kept) if keep])
+    os.remove(source_path)
+    seen_ids.add(ids[readable & new])
+
+    num_duplicates = int((~kept).sum())
+    stats = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+             "file": os.path.basename(destination_path),
+             "tweets": len(lines),
+             "new tweets": int(kept.sum()),
+             "duplicates": num_duplicates,
+             "overlap": round(num_duplicates/float(len(lines)), 4)
+             if lines else 0.}
+    log_path = pathjoin(seen_ids.folder, OVERLAP_LOG_FILE)
+    pd.DataFrame([stats], columns=OVERLAP_LOG_COLUMNS).to_csv(
+        log_path, mode="a", header=not exists(log_path), index=False)
+    return stats
+
+
+def read_overlap_log(folder):
+    """ Return dataframe of the overlap statistics of the runs saved in
+    folder (empty if there are none).
+    """
+    log_path = pathjoin(folder, OVERLAP_LOG_FILE)
+    if not exists(log_path):
+        return pd.DataFrame(columns=OVERLAP_LOG_COLUMNS)
+    return pd.read_csv(log_path)
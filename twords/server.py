@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Serve a loaded Twords corpus to many analysts over localhost HTTP.
+
+Loading a multi-GB corpus and building its word counts takes minutes and a
+lot of memory, so instead of every analyst doing it in their own notebook one
+process loads the corpus and serves read-only queries:
+
+    twit.serve_corpus(port=8765)                  # in the server process
+
+    client = TwordsClient(port=8765)              # in each notebook
+    client.word_freq_df(100)
+    client.tweets_by("some_user")
+
+Requests are handled in separate threads. Query results are cached (least
+recently used first out) against the data_version of the corpus, so repeated
+queries are answered without touching the corpus. Results are sent as JSON
+and the client turns them back into dataframes.
+
+Endpoints (GET, parameters in the query string):
+
+    /info                               number of tweets, words and version
+    /tweets_containing?term=...         as Twords.tweets_containing
+    /tweets_by?username=...             as Twords.tweets_by
+    /word_freq?n=...                    as word_freq_df after
+                                        create_word_freq_df(n)
+    /custom_word_freq?words=[...]       as custom_word_frequency_dataframe,
+                                        words is a JSON list
+    /tweet_counts?freq=D&term=...       as Twords.tweet_counts
+
+Unknown paths and missing or malformed parameters are answered with status
+400, errors raised while answering a query with status 500.
+"""
+
+import json
+import threading
+import urllib
+import urllib2
+import urlparse
+from collections import OrderedDict
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import pandas as pd
+
+DEFAULT_PORT = 8765
+
+
+class BadQuery(Exception):
+    """ Query with an unknown path or missing or malformed parameters,
+    answered with status 400 (other errors are answered with 500).
+    """
+    pass
+
+
+def _param(params, name):
+    """ Return parameter name of params, raising BadQuery if missing. """
+    if name not in params:
+        raise BadQuery("missing parameter " + name)
+    return params[name]
+
+
+def _frame_to_json(dataframe):
+    # non-ascii characters are escaped, so the result is ascii bytes
+    return dataframe.to_json(orient="split", date_format="iso")
+
+
+def _frame_from_json(text):
+    return pd.read_json(text, orient="split", dtype=False,
+                        convert_dates=False)
+
+
+class QueryCache(object):
+    """ Thread safe least recently used cache of query results.
+
+    size (int): maximum number of results kept
+    """
+
+    def __init__(self, size=128):
+        self.size = size
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.results:
+                self.misses += 1
+                return None
+            self.hits += 1
+            result = self.results.pop(key)
+            self.results[key] = result
+            return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.results.pop(key, None)
+            self.results[key] = result
+            while len(self.results) > self.size:
+                self.results.popitem(last=False)
+
+
+class TwordsServer(ThreadingMixIn, HTTPServer):
+    """ Threaded HTTP server answering queries on a Twords object.
+
+    twords (Twords): corpus to serve; it must not be changed while served
+    cache_size (int): number of query results cached
+    """
+
+    daemon_threads = True
+
+    def __init__(self, twords, host="127.0.0.1", port=DEFAULT_PORT,
+                 cache_size=128):
+        HTTPServer.__init__(self, (host, port), TwordsRequestHandler)
+        self.twords = twords
+        self.cache = QueryCache(cache_size)
+        # lookups that build cached indexes in the Twords object (word
+        # frequency table, user index) run one at a time
+        self.twords_lock = threading.Lock()
+
+    def query(self, path, params):
+        """ Return JSON bytes answering query path with params (dictionary
+        of strings), from the cache when possible.
+        """
+        if path == "/info":
+            return self._run_query(path, params)
+        key = (self.twords.data_version, path, tuple(sorted(params.items())))
+        result = self.cache.get(key)
+        if result is None:
+            result = self._run_query(path, params)
+            self.cache.put(key, result)
+        return result
+
+    def _run_query(self, path, params):
+        twords = self.twords
+        if path == "/info":
+            return json.dumps({"tweets": len(twords.tweets_df),
+                               "words": twords.freq_dist.N(),
+                               "data_version": twords.data_version,
+                               "cache_hits": self.cache.hits,
+                               "cache_misses": self.cache.misses})
+        if path == "/tweets_containing":
+            term = _param(params, "term")
+            return _frame_to_json(twords.tweets_containing(term))
+        if path == "/tweets_by":
+            with self.twords_lock:
+                result = twords.tweets_by(_param(params, "username"))
+            return _frame_to_json(result)
+        if path == "/word_freq":
+            try:
+                n = int(_param(params, "n"))
+            except ValueError:
+                raise BadQuery("n must be an integer")
+            with self.twords_lock:
+                table = twords._word_freq_table()[:n]
+            table = table[~table["word"].isin(twords.search_terms)]
+            return _frame_to_json(table.reset_index(drop=True))
+        if path == "/custom_word_freq":
+            try:
+                words = json.loads(_param(params, "words"))
+            except ValueError:
+                raise BadQuery("words must be a JSON list")
+            with self.twords_lock:
+                result = twords.custom_word_frequency_dataframe(words)
+            return _frame_to_json(result)
+        if path == "/tweet_counts":
+            counts = twords.tweet_counts(freq=params.get("freq", "D"),
+                                         term=params.get("term"))
+            counts = pd.DataFrame({"period": counts.index.astype(str),
+                                   "tweets": counts.values},
+                                  columns=["period", "tweets"])
+            return _frame_to_json(counts)
+        raise BadQuery("unknown query " + path)
+
+
+class TwordsRequestHandler(BaseHTTPRequestHandler):
+    """ Answers GET requests with the JSON result of TwordsServer.query. """
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        params = dict((key, value.decode("utf-8")) for key, value in
+                      urlparse.parse_qsl(url.query))
+        try:
+            result = self.server.query(url.path, params)
+            status = 200
+        except BadQuery as e:
+            result = json.dumps({"error": "Bad query: " + str(e)})
+            status = 400
+        except Exception as e:
+            result = json.dumps({"error": repr(e)})
+            status = 500
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def log_message(self, format, *args):
+        # keep notebook output of the server process readable
+        pass
+
+
+class TwordsClient(object):
+    """ Client of a TwordsServer; query methods return dataframes.
+
+    host (string): host the server runs on
+    port (int): port the server listens on
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=600):
+        self.url = "http://%s:%d" % (host, port)
+        self.timeout = timeout
+
+    def __repr__(self):
+        return "TwordsClient of " + self.url
+
+    def _get(self, path, **params):
+        params = dict((key, value.encode("utf-8") if type(value) == unicode
+                       else value) for key, value in params.items()
+                      if value is not None)
+        url = self.url + path
+        if params:
+            url += "?" + urllib.urlencode(params)
+        try:
+            response = urllib2.urlopen(url, timeout=self.timeout)
+        except urllib2.HTTPError as e:
+            raise Exception("Server error: " +
+                            json.loads(e.read()).get("error", ""))
+        return response.read().decode("utf-8")
+
+    def info(self):
+        """ Return dictionary with number of tweets and words served. """
+        return json.loads(self._get("/info"))
+
+    def tweets_containing(self, term):
+        return _frame_from_json(self._get("/tweets_containing", term=term))
+
+    def tweets_by(self, username):
+        return _frame_from_json(self._get("/tweets_by", username=username))
+
+    def word_freq_df(self, top_n_words):
+        """ Return word_freq_df of the top_n_words most common words (see
+        Twords.create_word_freq_df).
+        """
+        return _frame_from_json(self._get("/word_freq", n=top_n_words))
+
+    def custom_word_frequency_dataframe(self, words):
+        words = [x.decode("utf-8") if type(x) == str else x for x in words]
+        return _frame_from_json(self._get("/custom_word_freq",
+                                          words=json.dumps(words)))
+
+    def tweet_counts(self, freq="D", term=None):
+        """ Return dataframe of number of tweets (containing term, if given)
+        in each period (see Twords.tweet_counts).
+        """
+        return _frame_from_json(self._get("/tweet_counts", freq=freq,
+                                          term=term))
+
+
+def serve(twords, host="127.0.0.1", port=DEFAULT_PORT, cache_size=128):
+    """ Serve twords until interrupted. """
+    server = TwordsServer(twords, host=host, port=port,
+                          cache_size=cache_size)
+    print "Serving", len(twords.tweets_df), "tweets at http://%s:%d" % \
+        server.server_address
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,308 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Shared-memory handoff of tweets and word counts to worker processes.
+
+Handing a process pool its share of tweets_df["text"] means pickling every
+tweet into the task, and handing back a Counter or FreqDist means pickling
+every distinct word with its count - for cheap per-tweet work this can take
+as long as the work itself. Instead:
+
+- a SharedArrays folder (in /dev/shm when there is one, so the files live
+  in memory) holds named arrays - the text store, column arrays, the shared
+  vocabulary - that workers open read-only by name as memory maps, so
+  nothing is copied into the workers
+- a task is only (folder, start, stop): the range of tweets to work on
+- workers count words into an integer array indexed by the shared
+  vocabulary, write it to the folder and return its name; the parent merges
+  the counts by array addition. Only words missing from the vocabulary go
+  back as a (small) dictionary
+
+benchmark_shared_counting compares the time spent pickling and copying
+data with the time spent working, for plain pickled tasks and for this
+shared handoff.
+"""
+
+import cPickle
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+from os.path import join as pathjoin, isdir
+
+import nltk
+import numpy as np
+import pandas as pd
+
+from .snapshot import encode_strings, decode_strings
+from .textstore import TextStore
+
+SHARED_MEMORY_FOLDER = "/dev/shm"
+
+# tokenizers workers can use: nltk's, as in create_word_bag, or a much
+# faster split into words, hashtags and mentions
+_WORD_PATTERN = re.compile(u"[#@]?\\w+", re.UNICODE)
+TOKENIZERS = {"nltk": nltk.word_tokenize,
+              "regex": _WORD_PATTERN.findall}
+
+
+class SharedArrays(object):
+    """ Folder of named arrays shared between processes as memory-mapped
+    files. Created without a folder it makes a new one (removed by close,
+    or on leaving a with block); workers open the same folder by its path.
+
+    folder (string): path of the folder
+    """
+
+    def __init__(self, folder=None):
+        self.owner = folder is None
+        if folder is None:
+            base = SHARED_MEMORY_FOLDER if isdir(SHARED_MEMORY_FOLDER) and \
+                os.access(SHARED_MEMORY_FOLDER, os.W_OK) else None
+            folder = tempfile.mkdtemp(prefix="twords_", dir=base)
+        self.folder = folder
+
+    def __repr__(self):
+        return "SharedArrays in " + self.folder
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Remove the folder, if this object created it. """
+        if self.owner and isdir(self.folder):
+            shutil.rmtree(self.folder)
+
+    def path(self, name):
+        return pathjoin(self.folder, name)
+
+    def put(self, name, array):
+        """ Store numpy array under name. """
+        # written under a temporary name and renamed, so readers never see
+        # a partial file
+        temp_path = self.path(name + ".tmp.npy")
+        np.save(temp_path, array)
+        os.rename(temp_path, self.path(name + ".npy"))
+
+    def get(self, name):
+        """ Return read-only memory-mapped view of the array stored under
+        name.
+        """
+        return np.load(self.path(name + ".npy"), mmap_mode='r')
+
+    def remove(self, name):
+        os.remove(self.path(name + ".npy"))
+
+    def put_strings(self, name, values):
+        """ Store list of strings under name. """
+        data, offsets, null = encode_strings(values)
+        self.put(name + ".data", data)
+        self.put(name + ".offsets", offsets)
+
+    def get_strings(self, name):
+        """ Return list of unicode strings stored under name. """
+        return decode_strings(self.get(name + ".data"),
+                              self.get(name + ".offsets"))
+
+    def put_text_store(self, name, text_store):
+        """ Store TextStore under name. """
+        text_store.save(self.path(name))
+
+    def get_text_store(self, name):
+        """ Return memory-mapped TextStore stored under name. """
+        return TextStore.load(self.path(name), mmap=True)
+
+
+# vocabulary index of each shared folder, built once per worker process
+_vocabulary_indexes = {}
+
+
+def _vocabulary_index(shared):
+    if shared.folder not in _vocabulary_indexes:
+        _vocabulary_indexes.clear()
+        _vocabulary_indexes[shared.folder] = pd.Index(
+                        shared.get_strings("vocabulary"), dtype=object)
+    return _vocabulary_indexes[shared.folder]
+
+
+def _count_shared_chunk(task):
+    """ Count words of tweets start to stop of the text store in a
+    SharedArrays folder into an array indexed by the shared vocabulary.
+    Returns (name of counts array, dictionary of counts of words not in
+    the vocabulary, timings).
+
+    Runs in a worker process, so task is a single tuple
+    (folder, start, stop, tokenizer).
+    """
+    folder, start, stop, tokenizer = task
+    start_time = time.time()
+    shared = SharedArrays(folder)
+    text_store = shared.get_text_store("texts")
+    vocabulary = _vocabulary_index(shared)
+    stop_words = set(shared.get_strings("stop_words"))
+    setup_time = time.time()
+
+    words = [word for word in TOKENIZERS[tokenizer](
+             text_store.joined(start, stop)) if word not in stop_words]
+    ids = vocabulary.get_indexer(words) if words else \
+        np.zeros(0, dtype=np.int64)
+    counts = np.bincount(ids[ids != -1], minlength=len(vocabulary))
+    missing = ids == -1
+    other_counts = dict(Counter([word for word, is_missing in
+                                 zip(words, missing) if is_missing])) \
+        if missing.any() else {}
+    work_time = time.time()
+
+    name = "counts_%d" % start
+    shared.put(name, counts)
+    end_time = time.time()
+    return name, other_counts, {"setup": setup_time - start_time,
+                                "work": work_time - setup_time,
+                                "handoff": end_time - work_time}
+
+
+def _map(function, tasks, processes):
+    if processes == 1:
+        return [function(task) for task in tasks]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(function, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def shared_word_counts(text_store, vocabulary, stop_words=(), processes=None,
+                       num_chunks=None, tokenizer="nltk"):
+    """ Count words of all texts of text_store with a process pool, handing
+    texts and counts over through shared memory. Returns (words, counts,
+    report): words is list of words (the vocabulary, then words found that
+    were not in it), counts the int64 array of their occurrences, and report
+    a dataframe of the seconds each task spent setting up (opening the
+    shared arrays), working and handing its counts back, plus its share of
+    the seconds spent copying the texts, vocabulary and stop words into
+    shared memory and merging the counts.
+
+    vocabulary (list of strings): words to count into arrays - the closer to
+                                  the corpus vocabulary, the less is handed
+                                  back as dictionaries
+    stop_words (list of strings): words not counted
+    processes (int): number of worker processes (default: number of cpus)
+    num_chunks (int): number of tasks (default: 4 per process)
+    tokenizer (string): "nltk" (as create_word_bag) or "regex"
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if num_chunks is None:
+        num_chunks = 4*processes
+    vocabulary = [word.decode("utf-8") if type(word) == str else word
+                  for word in vocabulary]
+    with SharedArrays() as shared:
+        copy_start_time = time.time()
+        shared.put_text_store("texts", text_store)
+        shared.put_strings("vocabulary", vocabulary)
+        shared.put_strings("stop_words", list(stop_words))
+        copy_time = time.time() - copy_start_time
+        tasks = [(shared.folder, start, stop, tokenizer)
+                 for start, stop in text_store.chunks(num_chunks)]
+        results = _map(_count_shared_chunk, tasks, processes)
+
+        merge_start_time = time.time()
+        counts = np.zeros(len(vocabulary), dtype=np.int64)
+        other_counts = Counter()
+        for name, other, timings in results:
+            counts += shared.get(name)
+            other_counts.update(other)
+            shared.remove(name)
+        merge_time = time.time() - merge_start_time
+
+    other_words = list(other_counts.keys())
+    words = vocabulary + other_words
+    counts = np.concatenate([counts, np.array([other_counts[word] for word in
+                                               other_words], dtype=np.int64)])
+    report = pd.DataFrame([timings for name, other, timings in results],
+                          columns=["setup", "work", "handoff"])
+    report["copy"] = copy_time/max(len(results), 1)
+    report["merge"] = merge_time/max(len(results), 1)
+    return words, counts, report
+
+
+def _count_pickled_chunk(task):
+    """ Count words of list of texts into a Counter - the plain pickled
+    task used by benchmark_shared_counting for comparison. Returns (Counter,
+    seconds spent counting).
+    """
+    texts, stop_words, tokenizer = task
+    start_time = time.time()
+    stop_words = set(stop_words)
+    counts = Counter(word for word in
+                     TOKENIZERS[tokenizer](u"\n".join(texts))
+                     if word not in stop_words)
+    return counts, time.time() - start_time
+
+
+def benchmark_shared_counting(text_store, vocabulary, stop_words=(),
+                              processes=None, num_chunks=None,
+                              tokenizer="nltk"):
+    """ Count words of text_store with pickled tasks and with the shared
+    memory handoff, and return dataframe comparing them: total seconds,
+    bytes pickled to and from workers, seconds spent serializing and
+    copying data, seconds spent working, and serialization as a fraction of
+    work.
+
+    Arguments as in shared_word_counts.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if num_chunks is None:
+        num_chunks = 4*processes
+    chunks = text_store.chunks(num_chunks)
+    rows = []
+
+    # pickled: texts go to the workers, Counters come back
+    start_time = time.time()
+    tasks = [([text_store[i] or u"" for i in range(start, stop)],
+              list(stop_words), tokenizer) for start, stop in chunks]
+    results = _map(_count_pickled_chunk, tasks, processes)
+    merged = Counter()
+    for counts, seconds in results:
+        merged.update(counts)
+    total_time = time.time() - start_time
+    # pool.map pickles each task and result once and unpickles it once;
+    # repeat that here to time it
+    pickle_start_time = time.time()
+    pickled = [cPickle.dumps(item, 2) for item in
+               tasks + [counts for counts, seconds in results]]
+    for data in pickled:
+        cPickle.loads(data)
+    serialization_time = time.time() - pickle_start_time
+    rows.append(("pickled", total_time, sum(len(data) for data in pickled),
+                 serialization_time,
+                 sum(seconds for counts, seconds in results)))
+
+    # shared: tasks are ranges, counts come back as arrays in shared memory
+    start_time = time.time()
+    words, counts, report = shared_word_counts(
+                        text_store, vocabulary, stop_words, processes,
+                        num_chunks, tokenizer)
+    total_time = time.time() - start_time
+    shared_tasks = [("/dev/shm/twords_xxxxxx", start, stop, tokenizer)
+                    for start, stop in chunks]
+    rows.append(("shared", total_time,
+                 sum(len(cPickle.dumps(task, 2)) for task in shared_tasks),
+                 report[["copy", "setup", "handoff", "merge"]].values.sum(),
+                 report["work"].sum()))
+
+    benchmark = pd.DataFrame(rows, columns=["method", "seconds",
+                                            "bytes pickled",
+                                            "serialization seconds",
+                                            "work seconds"])
+    benchmark["serialization fraction"] = \
+        benchmark["serialization seconds"]/benchmark["work seconds"]
+    return benchmark.set_index("method")
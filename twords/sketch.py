@@ -0,0 +1,367 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Fixed-memory approximate word counting for corpora too large to hold an
+exact nltk.FreqDist in RAM.
+
+A SketchFreqDist combines two structures:
+
+Count-Min Sketch: a depth x width table of counters. Every word is hashed to
+one counter in each row, and its estimated count is the minimum over rows.
+Estimates never undercount, and with probability 1 - delta they overcount by
+at most epsilon * N, where N is the total number of words counted,
+epsilon = e/width and delta = exp(-depth).
+
+Space-Saving: the k most frequent words seen so far along with their counts
+and a maximum overcount error for each. This is what most_common(n) draws on,
+since a Count-Min Sketch can only answer questions about words it is asked
+about.
+
+Both structures can be merged, so sketches built by several workers or from
+several files can be added together into one sketch of the whole corpus.
+"""
+
+import zlib
+from math import e, log, ceil
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Mersenne prime used by the universal hash family; hash values are reduced
+# modulo this prime so the products below fit in a signed 64 bit integer
+_PRIME = 2**31 - 1
+
+
+def _hash_words(words):
+    """ Return numpy array of 31 bit hash values of words. Uses crc32 of the
+    utf-8 encoding so the values are the same in every process and on every
+    machine, which is required for merging sketches.
+    """
+    hashes = [zlib.crc32(word.encode('utf-8') if type(word) == unicode
+                         else word) & 0xffffffff for word in words]
+    return np.array(hashes, dtype=np.int64) % _PRIME
+
+
+class CountMinSketch(object):
+    """ Count-Min Sketch of word counts.
+
+    width (int): number of counters in each row
+    depth (int): number of rows (independent hash functions)
+    seed (int): seed for the hash functions - sketches can only be merged if
+                they share width, depth and seed
+    """
+
+    def __init__(self, width, depth, seed=0):
+        self.width = int(width)
+        self.depth = int(depth)
+        self.seed = seed
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=self.depth).astype(np.int64)
+        self._b = rng.randint(0, _PRIME, size=self.depth).astype(np.int64)
+
+    def __repr__(self):
+        return "CountMinSketch(width=%d, depth=%d, total=%d)" % \
+               (self.width, self.depth, self.total)
+
+    def _columns(self, hashes):
+        """ Return depth x len(hashes) array of counter positions. """
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None])
+                % _PRIME) % self.width
+
+    def update_counts(self, words, counts):
+        """ Add counts for a batch of distinct words.
+
+        words (list of strings): distinct words
+        counts (list or array of ints): number of occurrences of each word
+        """
+        if len(words) == 0:
+            return
+        counts = np.asarray(counts, dtype=np.int64)
+        columns = self._columns(_hash_words(words))
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+        self.total += int(counts.sum())
+
+    def estimate_many(self, words):
+        """ Return numpy array of estimated counts for a list of words. """
+        if len(words) == 0:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(_hash_words(words))
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def estimate(self, word):
+        """ Return estimated count of a single word. """
+        return int(self.estimate_many([word])[0])
+
+    def epsilon(self):
+        """ Relative error bound: estimates exceed true counts by at most
+        epsilon() * total with probability 1 - delta().
+        """
+        return e/self.width
+
+    def delta(self):
+        """ Probability that an estimate exceeds the epsilon bound. """
+        return np.exp(-self.depth)
+
+    def error_bound(self):
+        """ Maximum overcount (in occurrences) of any estimate, holding with
+        probability 1 - delta().
+        """
+        return self.epsilon()*self.total
+
+    def merge(self, other):
+        """ Add counts of other sketch into this one. Both sketches must have
+        been created with same width, depth and seed.
+        """
+        assert (self.width, self.depth, self.seed) == \
+               (other.width, other.depth, other.seed), \
+               "Can only merge sketches with same width, depth and seed"
+        self.table += other.table
+        self.total += other.total
+
+
+class SpaceSaving(object):
+    """ Space-Saving summary of the k most frequent words.
+
+    Each tracked word has a count that never undercounts its true count and
+    an error that bounds the overcount, so the true count lies in
+    [count - error, count]. The error of every word is at most N/k, where N
+    is the total number of words counted.
+
+    Updates are done in batches: each batch of exact counts is merged with the
+    current summary using the mergeable summary rule of Agarwal et al., which
+    is also how summaries from different workers are combined.
+
+    k (int): maximum number of words tracked
+    """
+
+    def __init__(self, k):
+        self.k = int(k)
+        self.counts = pd.Series([], dtype=np.int64)
+        self.errors = pd.Series([], dtype=np.int64)
+        self.total = 0
+
+    def __repr__(self):
+        return "SpaceSaving(k=%d, tracked=%d, total=%d)" % \
+               (self.k, len(self.counts), self.total)
+
+    def _min_count(self):
+        """ Count that any untracked word may have had - zero unless the
+        summary is full.
+        """
+        if len(self.counts) < self.k:
+            return 0
+        return int(self.counts.min())
+
+    def _combine(self, counts, errors, min_count, total):
+        """ Merge another summary (given by counts and errors Series, its
+        min_count and total) into this one and keep the top k words.
+        """
+        own_min = self._min_count()
+        words = self.counts.index.union(counts.index)
+        new_counts = self.counts.reindex(words, fill_value=own_min) + \
+                     counts.reindex(words, fill_value=min_count)
+        new_errors = self.errors.reindex(words, fill_value=own_min) + \
+                     errors.reindex(words, fill_value=min_count)
+        if len(new_counts) > self.k:
+            new_counts = new_counts.sort_values(ascending=False,
+                                                kind='mergesort')[:self.k]
+            new_errors = new_errors.reindex(new_counts.index)
+        self.counts = new_counts.astype(np.int64)
+        self.errors = new_errors.astype(np.int64)
+        self.total += total
+
+    def update_counts(self, words, counts):
+        """ Add exact counts for a batch of distinct words. """
+        if len(words) == 0:
+            return
+        counts = pd.Series(np.asarray(counts, dtype=np.int64), index=words)
+        errors = pd.Series(np.zeros(len(counts), dtype=np.int64), index=words)
+        self._combine(counts, errors, 0, int(counts.sum()))
+
+    def merge(self, other):
+        """ Merge another SpaceSaving summary into this one. """
+        assert self.k == other.k, "Can only merge summaries with same k"
+        self._combine(other.counts, other.errors, other._min_count(),
+                      other.total)
+
+    def error_bound(self):
+        """ Maximum overcount of any tracked word's count. """
+        return self.total/float(self.k)
+
+    def most_common(self, n=None):
+        """ Return list of (word, count) tuples of the n highest counts. """
+        ordered = self.counts.sort_values(ascending=False, kind='mergesort')
+        if n is not None:
+            ordered = ordered[:n]
+        return list(zip(ordered.index, ordered.values.tolist()))
+
+
+class SketchFreqDist(object):
+    """ Drop-in replacement for nltk.FreqDist in create_word_freq_df and
+    custom_word_frequency_dataframe that uses fixed memory no matter how
+    large the vocabulary gets.
+
+    The same methods used on the nltk object are available: most_common(n),
+    freq(word), N(), B() and indexing with freq_dist[word]. Counts are
+    estimates - see error_bound() and count_bounds(word).
+
+    epsilon (float): relative error of Count-Min estimates; the sketch uses
+                     ceil(e/epsilon) counters per row
+    delta (float): probability that an estimate exceeds its error bound; the
+                   sketch uses ceil(ln(1/delta)) rows
+    num_heavy_hitters (int): number of most common words tracked exactly
+                             enough to be returned by most_common
+    seed (int): hash seed - only sketches with the same seed can be merged
+    """
+
+    def __init__(self, epsilon=1e-5, delta=0.01, num_heavy_hitters=10000,
+                 seed=0):
+        width = int(ceil(e/epsilon))
+        depth = int(ceil(log(1./delta)))
+        self.sketch = CountMinSketch(width, depth, seed)
+        self.heavy_hitters = SpaceSaving(num_heavy_hitters)
+
+    def __repr__(self):
+        return "<SketchFreqDist with approximately %d outcomes, " \
+               "error bound %d occurrences>" % (self.N(),
+                                                round(self.error_bound()))
+
+    def __getitem__(self, word):
+        estimate = self.sketch.estimate(word)
+        if word in self.heavy_hitters.counts.index:
+            estimate = min(estimate, int(self.heavy_hitters.counts[word]))
+        return estimate
+
+    def __contains__(self, word):
+        return self[word] > 0
+
+    def __len__(self):
+        return self.B()
+
+    def update(self, words):
+        """ Count a batch of words (list of strings, like a word bag). """
+        counter = Counter(words)
+        self.update_counts(list(counter.keys()), list(counter.values()))
+
+    def update_counts(self, words, counts):
+        """ Add exact counts for a batch of distinct words. """
+        self.sketch.update_counts(words, counts)
+        self.heavy_hitters.update_counts(words, counts)
+
+    def merge(self, other):
+        """ Add the counts of another SketchFreqDist (e.g. built by another
+        worker or loaded from another file) into this one.
+        """
+        self.sketch.merge(other.sketch)
+        self.heavy_hitters.merge(other.heavy_hitters)
+
+    def N(self):
+        """ Total number of words counted. """
+        return self.sketch.total
+
+    def B(self):
+        """ Number of distinct words tracked as heavy hitters (the true
+        vocabulary size is not kept by the sketch).
+        """
+        return len(self.heavy_hitters.counts)
+
+    def freq(self, word):
+        """ Estimated frequency of word in corpus. """
+        if self.N() == 0:
+            return 0
+        return self[word]/float(self.N())
+
+    def keys(self):
+        return list(self.heavy_hitters.counts.index)
+
+    def most_common(self, n=None):
+        """ Return list of (word, estimated count) tuples for the n most
+        common words, most common first.
+        """
+        top = self.heavy_hitters.most_common()
+        words = [word for word, count in top]
+        estimates = np.minimum(self.sketch.estimate_many(words),
+                               [count for word, count in top])
+        ordered = pd.Series(estimates, index=words).sort_values(
+                                        ascending=False, kind='mergesort')
+        if n is not None:
+            ordered = ordered[:n]
+        return list(zip(ordered.index, ordered.values.tolist()))
+
+    def error_bound(self):
+        """ Bound on the overcount of any estimated count, holding with
+        probability 1 - delta.
+        """
+        return min(self.sketch.error_bound(),
+                   self.heavy_hitters.error_bound())
+
+    def count_bounds(self, word):
+        """ Return (lower, upper) bounds on the true count of word. The lower
+        bound is only informative for tracked heavy hitters.
+        """
+        upper = self[word]
+        lower = 0
+        if word in self.heavy_hitters.counts.index:
+            lower = int(self.heavy_hitters.counts[word] -
+                        self.heavy_hitters.errors[word])
+        return (max(lower, 0), upper)
+
+    def to_arrays(self):
+        """ Return dictionary of numpy arrays holding the full state of the
+        sketch (used by save and by session snapshots).
+        """
+        return {"table": self.sketch.table,
+                "params": np.array([self.sketch.width, self.sketch.depth,
+                                    self.sketch.seed, self.sketch.total,
+                                    self.heavy_hitters.k,
+                                    self.heavy_hitters.total],
+                                   dtype=np.int64),
+                "hh_words": np.array([word.encode('utf-8') for word in
+                                      self.heavy_hitters.counts.index]),
+                "hh_counts": self.heavy_hitters.counts.values,
+                "hh_errors": self.heavy_hitters.errors.values}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """ Create SketchFreqDist from dictionary created by to_arrays. """
+        width, depth, seed, total, k, hh_total = arrays["params"].tolist()
+        freq_dist = cls(num_heavy_hitters=k)
+        freq_dist.sketch = CountMinSketch(width, depth, seed)
+        freq_dist.sketch.table = arrays["table"]
+        freq_dist.sketch.total = total
+        words = [word.decode('utf-8') for word in arrays["hh_words"].tolist()]
+        freq_dist.heavy_hitters.counts = pd.Series(arrays["hh_counts"],
+                                                   index=words)
+        freq_dist.heavy_hitters.errors = pd.Series(arrays["hh_errors"],
+                                                   index=words)
+        freq_dist.heavy_hitters.total = hh_total
+        return freq_dist
+
+    def save(self, path):
+        """ Save sketch to numpy .npz file at path so it can be merged with
+        sketches from other runs using load and merge.
+        """
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        """ Load a SketchFreqDist saved with save. """
+        return cls.from_arrays(np.load(path))
+
+
+def merge_sketch_freq_dists(freq_dists):
+    """ Merge a list of SketchFreqDist objects (e.g. one per worker or per
+    file) into a single new SketchFreqDist.
+    """
+    assert len(freq_dists) > 0
+    first = freq_dists[0]
+    merged = SketchFreqDist(num_heavy_hitters=first.heavy_hitters.k)
+    merged.sketch = CountMinSketch(first.sketch.width, first.sketch.depth,
+                                   first.sketch.seed)
+    for freq_dist in freq_dists:
+        merged.merge(freq_dist)
+    return merged
@@ -0,0 +1,341 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Save and restore the full state of a Twords analysis session.
+
+A session file is a numpy .npz archive (a zip file of .npy arrays). Nothing in
+it is pickled:
+
+- a JSON header with the format version, the simple attributes (paths,
+  search_terms, stop_words, sample_fraction, prune_log, cleaning_steps,
+  ingested_offsets, memory_budget, word_bag_date_range) and a description
+  of the stored columns
+- tweets_df stored column-wise: numeric and date columns as plain arrays, text
+  columns as one utf-8 byte buffer plus an offsets array and a null mask
+- original_text_store (if any) as its buffer, offsets and null mask
+- word_bag as a vocabulary plus an array of integer word ids
+- freq_dist as a vocabulary plus an array of counts (or the arrays of a
+  SketchFreqDist)
+- background_dict as a vocabulary plus frequency and occurrence arrays
+- word_freq_df stored column-wise like tweets_df
+
+Each array is a separate member of the archive and is only read when it is
+accessed, so loading only some parts of a session (e.g. the counts without
+the tweet text) only reads those parts from disk.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import nltk
+
+from .sketch import SketchFreqDist
+from .textstore import TextStore
+
+FORMAT_NAME = "twords-session"
+# version 2 added sample_fraction, prune_log, cleaning_steps,
+# ingested_offsets, memory_budget, word_bag_date_range and
+# original_text_store
+FORMAT_VERSION = 2
+
+# parts of a session that can be loaded separately
+SESSION_PARTS = ("attributes", "tweets", "word_bag", "freq_dist",
+                 "background", "word_freq_df")
+
+
+def encode_strings(values):
+    """ Encode sequence of strings as (data, offsets, null) numpy arrays:
+    data is uint8 array of all strings utf-8 encoded back to back, string i is
+    data[offsets[i]:offsets[i+1]], and null marks values that were not strings
+    (e.g. NaN).
+    """
+    null = np.array([type(value) not in (str, unicode) for value in values],
+                    dtype=bool)
+    encoded = [value.encode('utf-8') if type(value) == unicode
+               else value if type(value) == str else ""
+               for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.zeros(offsets[-1], dtype=np.uint8)
+    if offsets[-1] > 0:
+        data[:] = np.frombuffer("".join(encoded), dtype=np.uint8)
+    return data, offsets, null
+
+
+def decode_strings(data, offsets, null=None):
+    """ Inverse of encode_strings: return list of unicode strings, with None
+    in place of null values.
+    """
+    buf = data.tobytes()
+    offsets = offsets.tolist()
+    values = [buf[offsets[i]:offsets[i+1]].decode('utf-8')
+              for i in range(len(offsets) - 1)]
+    if null is not None and null.any():
+        for i in np.flatnonzero(null).tolist():
+            values[i] = None
+    return values
+
+
+def _string_kind(column):
+    """ Return True if object column holds only strings (and nulls). """
+    return pd.api.types.infer_dtype(column, skipna=True) in \
+        ("string", "unicode", "empty", "bytes")
+
+
+def _encode_frame(df, prefix, arrays):
+    """ Add the columns of df to arrays (dictionary of numpy arrays) under
+    keys starting with prefix, and return list of column descriptions for the
+    header.
+    """
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        key = "%s__%d" % (prefix, i)
+        if pd.api.types.is_datetime64_any_dtype(column):
+            arrays[key + "__values"] = column.values.view(np.int64)
+            kind = "datetime"
+        elif column.dtype != object:
+            arrays[key + "__values"] = column.values
+            kind = "numeric"
+        else:
+            values = column.tolist()
+            if not _string_kind(column):
+                # mixed columns are stored as text
+                values = [value if type(value) in (str, unicode) or
+                          pd.isnull(value) else unicode(value)
+                          for value in values]
+            data, offsets, null = encode_strings(values)
+            arrays[key + "__data"] = data
+            arrays[key + "__offsets"] = offsets
+            arrays[key + "__null"] = null
+            kind = "string"
+        columns.append({"name": name, "kind": kind})
+    return columns
+
+
+def _decode_frame(archive, prefix, columns, names=None):
+    """ Rebuild dataframe stored by _encode_frame, reading only the columns
+    in names (all columns if names is None).
+    """
+    data = {}
+    kept_names = []
+    for i, column in enumerate(columns):
+        name = column["name"]
+        if names is not None and name not in names:
+            continue
+        key = "%s__%d" % (prefix, i)
+        if column["kind"] == "datetime":
+            data[name] = archive[key + "__values"].view("datetime64[ns]")
+        elif column["kind"] == "numeric":
+            data[name] = archive[key + "__values"]
+        else:
+            values = decode_strings(archive[key + "__data"],
+                                    archive[key + "__offsets"],
+                                    archive[key + "__null"])
+            data[name] = pd.Series(values, dtype=object).where(
+                                   ~archive[key + "__null"], np.nan)
+        kept_names.append(name)
+    return pd.DataFrame(data, columns=kept_names)
+
+
+def _encode_counts(words, counts, prefix, arrays):
+    """ Add a vocabulary and its counts to arrays. """
+    data, offsets, null = encode_strings(list(words))
+    arrays[prefix + "__words_data"] = data
+    arrays[prefix + "__words_offsets"] = offsets
+    arrays[prefix + "__counts"] = np.asarray(counts)
+
+
+def _decode_words(archive, prefix):
+    return decode_strings(archive[prefix + "__words_data"],
+                          archive[prefix + "__words_offsets"])
+
+
+def _encode_steps(steps):
+    """ Return cleaning or prune steps as JSON-serializable lists. """
+    return [step if type(step) in (str, unicode) else list(step)
+            for step in steps]
+
+
+def _decode_steps(steps):
+    """ Inverse of _encode_steps: steps with arguments become tuples again.
+    """
+    return [step if type(step) in (str, unicode) else tuple(step)
+            for step in steps]
+
+
+def _encode_date(date):
+    return date if date is None or type(date) in (str, unicode) \
+        else str(date)
+
+
+def save_session(twords, path, compress=False):
+    """ Save state of Twords object twords to session file at path.
+
+    compress (bool): compress the archive - makes file smaller but saving and
+                     loading slower
+    """
+    arrays = {}
+    header = {"format": FORMAT_NAME,
+              "version": FORMAT_VERSION,
+              "attributes": {"jar_folder_path": twords.jar_folder_path,
+                             "data_path": twords.data_path,
+                             "background_path": twords.background_path,
+                             "search_terms": twords.search_terms,
+                             "stop_words": twords.stop_words,
+                             "sample_fraction": twords.sample_fraction,
+                             "prune_log": _encode_steps(twords.prune_log),
+                             "cleaning_steps":
+                                 _encode_steps(twords.cleaning_steps),
+                             "ingested_offsets": twords.ingested_offsets,
+                             "memory_budget": twords.memory_budget,
+                             "word_bag_date_range":
+                                 None if twords.word_bag_date_range is None
+                                 else [_encode_date(date) for date in
+                                       twords.word_bag_date_range]}}
+
+    header["tweets_columns"] = _encode_frame(twords.tweets_df, "tweets",
+                                             arrays)
+    header["tweets_length"] = len(twords.tweets_df)
+    header["original_text_store"] = twords.original_text_store is not None
+    if twords.original_text_store is not None:
+        store = twords.original_text_store
+        arrays["original_text__data"] = np.asarray(store.raw())
+        arrays["original_text__offsets"] = np.asarray(store.offsets)
+        arrays["original_text__null"] = np.asarray(store.null)
+
+    # word bag as vocabulary plus word ids
+    word_ids, vocabulary = pd.factorize(pd.Series(twords.word_bag,
+                                                  dtype=object))
+    _encode_counts(vocabulary, word_ids.astype(np.int32), "word_bag", arrays)
+
+    if isinstance(twords.freq_dist, SketchFreqDist):
+        header["freq_dist_kind"] = "sketch"
+        for key, value in twords.freq_dist.to_arrays().items():
+            arrays["freq_dist__" + key] = value
+    else:
+        header["freq_dist_kind"] = "nltk"
+        _encode_counts(list(twords.freq_dist.keys()),
+                       np.array(list(twords.freq_dist.values()),
+                                dtype=np.int64),
+                       "freq_dist", arrays)
+
+    background_words = list(twords.background_dict.keys())
+    _encode_counts(background_words,
+                   np.array([twords.background_dict[word][1]
+                             for word in background_words], dtype=np.int64),
+                   "background", arrays)
+    arrays["background__frequency"] = np.array(
+                    [twords.background_dict[word][0]
+                     for word in background_words], dtype=np.float64)
+
+    header["word_freq_df_columns"] = _encode_frame(twords.word_freq_df,
+                                                   "word_freq_df", arrays)
+
+    arrays["header"] = np.frombuffer(json.dumps(header), dtype=np.uint8)
+    if compress:
+        np.savez_compressed(path, **arrays)
+    else:
+        np.savez(path, **arrays)
+
+
+def session_path(path):
+    """ Return path of the session file saved at path: numpy adds the
+    extension ".npz" when saving if it is missing.
+    """
+    return path if path.endswith(".npz") else path + ".npz"
+
+
+def read_session_header(path):
+    """ Return the header dictionary of session file at path. """
+    with np.load(session_path(path)) as archive:
+        return _read_header(archive)
+
+
+def _read_header(archive):
+    """ Return the header dictionary of open session archive. """
+    header = json.loads(archive["header"].tobytes())
+    if header.get("format") != FORMAT_NAME:
+        raise Exception("File is not a Twords session file")
+    if header["version"] > FORMAT_VERSION:
+        raise Exception("Session file has format version " +
+                        str(header["version"]) + " but this version of "
+                        "Twords only reads versions up to " +
+                        str(FORMAT_VERSION))
+    return header
+
+
+def load_session(twords, path, parts=None, tweets_columns=None):
+    """ Load parts of session file at path into Twords object twords.
+
+    parts (list of strings): which parts of the session to load, from
+                             SESSION_PARTS; all parts are loaded if None
+    tweets_columns (list of strings): which columns of tweets_df to load;
+                                      all columns are loaded if None
+    """
+    if parts is None:
+        parts = SESSION_PARTS
+    for part in parts:
+        assert part in SESSION_PARTS, "Unknown session part " + str(part)
+    with np.load(session_path(path)) as archive:
+        _load_parts(twords, archive, _read_header(archive), parts,
+                    tweets_columns)
+
+
+def _load_parts(twords, archive, header, parts, tweets_columns):
+    """ Load parts of open session archive with header into twords. """
+    if "attributes" in parts:
+        attributes = header["attributes"]
+        twords.jar_folder_path = attributes["jar_folder_path"]
+        twords.data_path = attributes["data_path"]
+        twords.background_path = attributes["background_path"]
+        twords.search_terms = attributes["search_terms"]
+        twords.stop_words = attributes["stop_words"]
+        # attributes not in version 1 sessions keep their defaults
+        twords.sample_fraction = attributes.get("sample_fraction", 1.)
+        twords.prune_log = _decode_steps(attributes.get("prune_log", []))
+        twords.cleaning_steps = _decode_steps(
+                                    attributes.get("cleaning_steps", []))
+        twords.ingested_offsets = attributes.get("ingested_offsets", {})
+        twords.memory_budget = attributes.get("memory_budget")
+        date_range = attributes.get("word_bag_date_range")
+        twords.word_bag_date_range = None if date_range is None \
+            else tuple(date_range)
+
+    if "tweets" in parts:
+        twords.tweets_df = _decode_frame(archive, "tweets",
+                                         header["tweets_columns"],
+                                         tweets_columns)
+        twords.original_text_store = None
+        if header.get("original_text_store"):
+            twords.original_text_store = TextStore(
+                                archive["original_text__data"],
+                                archive["original_text__offsets"],
+                                archive["original_text__null"])
+
+    if "word_bag" in parts:
+        vocabulary = np.array(_decode_words(archive, "word_bag"),
+                              dtype=object)
+        twords.word_bag = vocabulary[archive["word_bag__counts"]].tolist()
+
+    if "freq_dist" in parts:
+        if header["freq_dist_kind"] == "sketch":
+            arrays = dict((key, archive["freq_dist__" + key]) for key in
+                          ("table", "params", "hh_words", "hh_counts",
+                           "hh_errors"))
+            twords.freq_dist = SketchFreqDist.from_arrays(arrays)
+        else:
+            words = _decode_words(archive, "freq_dist")
+            counts = archive["freq_dist__counts"].tolist()
+            twords.freq_dist = nltk.FreqDist(dict(zip(words, counts)))
+
+    if "background" in parts:
+        words = _decode_words(archive, "background")
+        twords.background_dict = dict(zip(words, zip(
+                            archive["background__frequency"].tolist(),
+                            archive["background__counts"].tolist())))
+
+    if "word_freq_df" in parts:
+        twords.word_freq_df = _decode_frame(archive, "word_freq_df",
+                                            header["word_freq_df_columns"])
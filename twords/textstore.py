@@ -0,0 +1,250 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Contiguous storage of tweet texts.
+
+A TextStore keeps the texts of all tweets in one utf-8 byte buffer, each
+text followed by a newline, plus an array of the offset where each text
+starts. Compared with a column of python unicode objects this
+
+- uses a fraction of the memory (one byte per ascii character and no per
+  object overhead)
+- gives the texts of any range of tweets, already joined, as a view of the
+  buffer: tokenizing them needs no " ".join of millions of strings
+- can be saved to disk and memory-mapped, so worker processes open the same
+  file and read the slices they need instead of having texts pickled to
+  them
+
+Only the original tweets (Twords.keep_column_of_original_tweets with
+compact=True) are kept in a store instead of a column. The text column of
+tweets_df stays the text that cleaning rewrites, and Twords.text_store is a
+cache of it for tokenizing: it saves time, not memory - while it is held
+the texts take the store's buffer on top of the column.
+
+Tweets from the java csv files never contain newlines, but tweets set by
+hand or from other sources can, so a newline in the buffer does not always
+end a text. Texts are stored exactly as given; lines and tokenize read them
+with the newlines inside texts replaced by spaces, so there every newline
+ends a text - tokenizers treat it as whitespace, and a regular expression
+anchored with ^ and $ (MULTILINE) matches whole texts.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+SEPARATOR = "\n"
+
+# tokens of tokenize: words, hashtags, mentions and single punctuation
+# characters (about as nltk.word_tokenize splits them, much faster), and
+# the newline ending each text
+TOKEN_PATTERN = re.compile(u"[#@]?\\w+|[^\\w\\s]|\n", re.UNICODE)
+
+
+class TextStore(object):
+    """ Texts of tweets in one contiguous utf-8 buffer.
+
+    data (numpy uint8 array or memmap): all texts, each followed by a
+                                        newline
+    offsets (numpy int64 array): text i is data[offsets[i]:offsets[i+1]-1]
+    null (numpy bool array): texts that were missing (stored empty)
+    """
+
+    def __init__(self, data, offsets, null):
+        self.data = data
+        self.offsets = offsets
+        self.null = null
+
+    def __repr__(self):
+        return "TextStore of %d texts in %d bytes" % (len(self), self.nbytes)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return int(self.offsets[-1])
+
+    @classmethod
+    def from_texts(cls, texts):
+        """ Build store from sequence of texts (e.g. tweets_df["text"]);
+        values that are not strings are stored as missing.
+        """
+        texts = list(texts)
+        null = np.array([type(text) not in (str, unicode) for text in texts],
+                        dtype=bool)
+        encoded = [text.encode('utf-8') if type(text) == unicode
+                   else text if type(text) == str else ""
+                   for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) + 1 for text in encoded], out=offsets[1:])
+        data = np.frombuffer(SEPARATOR.join(encoded) + SEPARATOR
+                             if encoded else "", dtype=np.uint8)
+        return cls(data, offsets, null)
+
+    def __getitem__(self, i):
+        if self.null[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1] - 1] \
+            .tobytes().decode('utf-8')
+
+    def raw(self, start=0, stop=None):
+        """ Return view (no copy) of the bytes of texts start to stop, each
+        followed by a newline.
+        """
+        if stop is None:
+            stop = len(self)
+        return self.data[self.offsets[start]:self.offsets[stop]]
+
+    def joined(self, start=0, stop=None):
+        """ Return unicode string of texts start to stop joined by newlines,
+        ready to be tokenized as one string.
+        """
+        return self.raw(start, stop).tobytes().decode('utf-8')
+
+    def lines(self, start=0, stop=None):
+        """ Return unicode string of texts start to stop, each on one line:
+        as joined, but with newlines inside texts replaced by spaces.
+        """
+        if stop is None:
+            stop = len(self)
+        raw = self.raw(start, stop)
+        inside = raw == ord(SEPARATOR)
+        inside[self.offsets[start + 1:stop + 1] - self.offsets[start] - 1] = \
+            False
+        if inside.any():
+            raw = np.array(raw)
+            raw[inside] = ord(" ")
+        return raw.tobytes().decode('utf-8')
+
+    def tokenize(self, start=0, stop=None, lower=False):
+        """ Split texts start to stop into tokens (see TOKEN_PATTERN) in one
+        pass. Returns (codes, uniques, rows): uniques is pandas Index of the
+        distinct tokens, and codes and rows are int64 arrays giving each
+        token as a position in uniques and the text it is in.
+
+        lower (bool): lowercase texts first
+        """
+        if stop is None:
+            stop = len(self)
+        text = self.lines(start, stop)
+        if lower:
+            text = text.lower()
+        codes, uniques = pd.factorize(TOKEN_PATTERN.findall(text))
+        uniques = pd.Index(uniques, dtype=object)
+        is_newline = codes == uniques.get_indexer([SEPARATOR])[0]
+        rows = start + np.cumsum(is_newline) - is_newline
+        return codes[~is_newline].astype(np.int64), uniques, \
+            rows[~is_newline]
+
+    def to_series(self, index=None):
+        """ Return texts as pandas Series of unicode strings (NaN where
+        missing) - only build this when a column is really needed.
+        """
+        buf = self.raw().tobytes()
+        offsets = self.offsets.tolist()
+        texts = [buf[offsets[i]:offsets[i + 1] - 1].decode('utf-8')
+                 for i in range(len(self))]
+        series = pd.Series(texts, index=index, dtype=object)
+        if self.null.any():
+            series[self.null] = np.nan
+        return series
+
+    def take(self, rows):
+        """ Return new store of the texts at positions rows (integer array,
+        or boolean array of texts to keep).
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        rows = rows.astype(np.int64)
+        lengths = self.offsets[rows + 1] - self.offsets[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if not len(rows):
+            return TextStore(np.zeros(0, dtype=np.uint8), offsets,
+                             self.null[rows])
+        # copy each run of consecutive rows as one slice of the buffer,
+        # without an index entry per byte
+        breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+        run_starts = rows[np.concatenate([[0], breaks])]
+        run_stops = rows[np.concatenate([breaks - 1, [len(rows) - 1]])] + 1
+        data = np.concatenate([self.data[start:stop] for start, stop in
+                               zip(self.offsets[run_starts].tolist(),
+                                   self.offsets[run_stops].tolist())])
+        return TextStore(data, offsets, self.null[rows])
+
+    def char_offsets(self):
+        """ Return int64 array of the offsets of the texts in lines (or
+        joined) counted in characters rather than bytes.
+        """
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        if len(self):
+            # every byte but utf-8 continuation bytes starts a character
+            is_char = (np.asarray(self.raw()) & 0xC0) != 0x80
+            np.cumsum(np.add.reduceat(is_char, self.offsets[:-1],
+                                      dtype=np.int64), out=offsets[1:])
+        return offsets
+
+    def rows_containing(self, pattern, flags=0):
+        """ Return boolean array of which texts contain a match of regular
+        expression pattern, searched in one pass: a unicode pattern is
+        matched (with re.UNICODE) in the texts as unicode lines, so \\w
+        matches non-ascii letters, a str pattern in the utf-8 buffer.
+        Matches that span the newline between two texts are ignored.
+        """
+        if type(pattern) == unicode:
+            text = self.lines()
+            offsets = self.char_offsets()
+            flags |= re.UNICODE
+        else:
+            text = self.raw().tobytes()
+            offsets = self.offsets
+        contains = np.zeros(len(self), dtype=bool)
+        starts = []
+        ends = []
+        for match in re.finditer(pattern, text, flags):
+            starts.append(match.start())
+            ends.append(max(match.end() - 1, match.start()))
+        if starts:
+            start_rows = np.searchsorted(offsets, starts, side='right') - 1
+            end_rows = np.searchsorted(offsets, ends, side='right') - 1
+            contains[start_rows[start_rows == end_rows]] = True
+        return contains & ~self.null
+
+    def chunks(self, num_chunks):
+        """ Return list of (start, stop) ranges of texts splitting the store
+        into num_chunks parts of about the same number of bytes, e.g. to
+        hand to worker processes.
+        """
+        bounds = np.searchsorted(self.offsets, np.linspace(
+                                 0, self.nbytes, num_chunks + 1)[1:-1])
+        bounds = np.unique(np.concatenate([[0], bounds, [len(self)]]))
+        return zip(bounds[:-1].tolist(), bounds[1:].tolist())
+
+    def save(self, path):
+        """ Save store to files path + ".text" (the raw buffer),
+        path + ".offsets.npy" and path + ".null.npy".
+        """
+        with open(path + ".text", "wb") as f:
+            f.write(self.raw().tobytes())
+        np.save(path + ".offsets.npy", self.offsets)
+        np.save(path + ".null.npy", self.null)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """ Load store saved with save. If mmap is True the files are
+        memory-mapped rather than read, so opening a store costs nothing and
+        processes opening the same store share its pages.
+        """
+        offsets = np.load(path + ".offsets.npy",
+                          mmap_mode='r' if mmap else None)
+        null = np.load(path + ".null.npy")
+        if offsets[-1] == 0:
+            data = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            data = np.memmap(path + ".text", dtype=np.uint8, mode='r')
+        else:
+            data = np.fromfile(path + ".text", dtype=np.uint8)
+        return cls(data, offsets, null)
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Classification of tweets into retweets, replies and boilerplate.
+
+Every tweet gets a bit-field (uint8) of the classes it belongs to, computed
+once when tweets are loaded by a few regular expression passes over the
+text store's texts (as unicode, so hashtags and mentions may have
+non-ascii letters). Later filters and counts use a mask on the
+tweet_class column instead of scanning the text again.
+
+Classes (a tweet can be in several):
+
+- retweet: contains "rt @user" (any case)
+- reply: starts with "@user"
+- via: contains "via @user" (any case), the quote-style credit of a
+  shared link
+- url only: nothing but links
+- hashtag only: nothing but hashtags
+"""
+
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+RETWEET = 1
+REPLY = 2
+VIA = 4
+URL_ONLY = 8
+HASHTAG_ONLY = 16
+
+CLASS_BITS = OrderedDict([("retweet", RETWEET),
+                          ("reply", REPLY),
+                          ("via", VIA),
+                          ("url only", URL_ONLY),
+                          ("hashtag only", HASHTAG_ONLY)])
+
+# patterns searched in the text store lines, where each tweet is one line
+_URL = ur"(?:https?://|www\.|pic\.twitter\.com/)[^ \t\n]*"
+CLASS_PATTERNS = OrderedDict([
+    ("retweet", ur"(?<!\w)rt @\w"),
+    ("reply", ur"^[ \t]*@\w"),
+    ("via", ur"(?<!\w)via @\w"),
+    ("url only", ur"^[ \t]*(?:" + _URL + ur"[ \t]*)+$"),
+    ("hashtag only", ur"^[ \t]*(?:#\w+[ \t]*)+$")])
+
+
+def class_bits(classes):
+    """ Return bits of list of class names (or a single class name). """
+    if type(classes) in (str, unicode):
+        classes = [classes]
+    bits = 0
+    for name in classes:
+        if name not in CLASS_BITS:
+            raise Exception("Unknown tweet class " + repr(name) +
+                            " - classes are " + ", ".join(CLASS_BITS))
+        bits |= CLASS_BITS[name]
+    return bits
+
+
+def classify_texts(text_store):
+    """ Return uint8 array of the class bits of each text of text_store
+    (TextStore).
+    """
+    classes = np.zeros(len(text_store), dtype=np.uint8)
+    for name, pattern in CLASS_PATTERNS.items():
+        contains = text_store.rows_containing(pattern, re.IGNORECASE |
+                                              re.MULTILINE | re.UNICODE)
+        classes[contains] |= CLASS_BITS[name]
+    return classes
+
+
+def class_counts(tweet_class):
+    """ Return dictionary of the number of tweets in each class, given array
+    tweet_class of class bits.
+    """
+    return OrderedDict((name, int(((tweet_class & bit) != 0).sum()))
+                       for name, bit in CLASS_BITS.items())
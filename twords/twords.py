@@ -5,10 +5,11 @@ import time
 import datetime
 import string
 from os import listdir
-from os.path import join as pathjoin
-from math import log, ceil
+from os.path import join as pathjoin, getsize, exists, isdir
+from math import ceil
 import subprocess
 
+import numpy as np
 import pandas as pd
 import nltk
 from nltk.corpus import stopwords
@@ -16,6 +17,28 @@ import matplotlib.pyplot as plt
 import tailer
 from ttp import ttp
 
+from .sketch import SketchFreqDist
+from . import snapshot
+from .filter_plan import FilterPlan
+from .java_csv import read_java_csv, TWEETS_DF_COLUMNS
+from .background import read_background_npz
+from .plotting import render_word_frequency_chart
+from .entities import EntityAnalytics
+from .users import UserIndex
+from .server import serve as serve_twords
+from .textstore import TextStore
+from .seen_ids import SeenIds, move_new_tweets
+from .run_control import RunController, count_run_tweets
+from .dates import DateIndex, normalize_dates, date_keys
+from .word_vectors import build_word_vectors
+from .concordance import TokenIndex
+from .tweet_class import classify_texts, class_bits, class_counts
+from .shared import shared_word_counts
+from .memory import attribute_sizes, column_size, word_bag_estimates, \
+    ingestion_estimates, sketch_size, megabytes
+from .sampling import ReservoirSampler, stratified_sample_positions, \
+    word_count_intervals
+
 # use this if you want to include modules from a subfolder
 #cmd_subfolder = os.path.realpath(os.path.abspath(os.path.join(os.path.split(inspect.getfile( inspect.currentframe() ))[0],"GetOldTweets-python")))
 #if cmd_subfolder not in sys.path:
@@ -59,6 +82,10 @@ class Twords(object):
                                 in tweets_df, not including stop words (stop
                                 words are contained in self.stop_words)
 
+    word_bag_date_range (tuple): (start, end) dates the word bag and word
+                                 counts were built from, if create_word_bag
+                                 was given a date range; None otherwise
+
     stop_words (list of string): list of words that shouldn't be included when
                                  computing word bag for tweets. This includes
                                  standard English words like "the" as well as
@@ -66,7 +93,9 @@ class Twords(object):
 
     freq_dist (nltk object): nltk.FreqDist(self.word_bag); nltk object that
                              contains statistical properties of words in
-                             word_bag
+                             word_bag. If create_word_bag was run with
+                             use_sketch=True this is instead a fixed-memory
+                             SketchFreqDist with approximate counts.
 
     word_freq_df (pandas dataframe): pandas dataframe containing top n words
                                      in tweets data along with data like
@@ -75,6 +104,54 @@ class Twords(object):
                                      More info under function
                                      create_word_freq_df(self, n),
                                      which creates word_freq_df.
+
+    cleaning_steps (list): cleaning and dropping methods applied to newly
+                           ingested tweets by refresh_java_tweets. Each step
+                           is either a method name, e.g. "lower_tweets", or a
+                           tuple of method name and argument, e.g.
+                           ("drop_by_term_in_tweet", ["rt @"]).
+
+    ingested_offsets (dictionary): for follow mode, maps path of each csv
+                                   file in data_path to number of bytes of
+                                   it already loaded into tweets_df
+
+    tweets_version (int): counter increased by every method that changes
+                          tweets_df; used to know when results cached from
+                          tweets_df, such as the text store, token index and
+                          user index, must be recomputed
+
+    counts_version (int): counter increased by every method that changes the
+                          word counts, stop words, search terms or background
+                          rates; used to know when the full word frequency
+                          table must be recomputed
+
+    data_version (int): tweets_version plus counts_version - changes when
+                        either does
+
+    sample_fraction (float): fraction of the full corpus tweets_df holds - 1
+                             unless tweets_df is a sample (see
+                             get_java_tweets_sample and sample_tweets), in
+                             which case word frequency dataframes also give
+                             estimates for the full corpus
+
+    prune_log (list): cleaning, pruning and stop word methods called since
+                      the tweets were loaded, in the same form as
+                      cleaning_steps, so the pruning done on a sample can be
+                      replayed on the full corpus with replay_prune_log
+
+    original_text_store (TextStore): original tweets kept by
+                                     keep_column_of_original_tweets with
+                                     compact=True; None otherwise
+
+    filter_plan (FilterPlan): pending drop/keep operations on tweets_df when
+                              a filter plan has been started with
+                              start_filter_plan; None otherwise
+
+    memory_budget (int): bytes this object may hold, including the
+                         temporaries of a running stage; create_word_bag,
+                         loading csv files and cleaning steps check it up
+                         front and switch to chunked processing or raise
+                         MemoryError (see memory_report). None for no limit
     """
 
     def __init__(self):
@@ -83,11 +160,29 @@ class Twords(object):
         self.background_path = ''
         self.background_dict = {}
         self.search_terms = []
+        self.tweets_version = 0
+        self.counts_version = 0
         self.tweets_df = pd.DataFrame()
         self.word_bag = []
+        self.word_bag_date_range = None
         self.stop_words = []
         self.freq_dist = nltk.FreqDist(self.word_bag)
         self.word_freq_df = pd.DataFrame()
+        self.filter_plan = None
+        self.cleaning_steps = []
+        self.ingested_offsets = {}
+        self._ingested_texts = set()
+        self._word_freq_cache = None
+        self._background_cache = None
+        self._entity_cache = None
+        self.sample_fraction = 1.
+        self.prune_log = []
+        self._user_index_cache = None
+        self._text_store_cache = None
+        self._date_index_cache = None
+        self._token_index_cache = None
+        self.original_text_store = None
+        self.memory_budget = None
 
     def __repr__(self):
         return "Twitter word analysis object"
@@ -109,6 +204,7 @@ class Twords(object):
         unicode_list = [x.decode("utf-8") if type(x) == str
                         else x for x in search_terms]
         self.search_terms = unicode_list
+        self._bump_counts_version()
 
     def create_Background_dict(self):
         """ Create the dictionary of background word rates from file in the
@@ -118,10 +214,19 @@ class Twords(object):
                frequency is frequency of word in background data set, and
                occurrences is total number of occurrences in background data
                set
+
+        If background_path ends in .npz it is read as the binary background
+        file written by BackgroundBuilder (see twords/background.py), which
+        is much faster to load than the csv file.
         """
+        if self.background_path.endswith(".npz"):
+            self.background_dict = read_background_npz(self.background_path)
+            self._bump_counts_version()
+            return
         sample_rates = pd.read_csv(self.background_path, sep=",", encoding='utf-8')
         background_dict = dict(zip(sample_rates["word"], zip(sample_rates["frequency"],sample_rates["occurrences"])))
         self.background_dict = background_dict
+        self._bump_counts_version()
 
     def create_Stop_words(self):
         """ Create list of stop words used in create_word_bag function.
@@ -137,6 +242,62 @@ class Twords(object):
                [u'rt', u'RT', u'via', u'http', u"n't", u"'s", u"...", u"''",
                 u"'m", u"--", u"'ll", u"'ve", u"'re", u"//www"]
         self.stop_words = stop
+        self._bump_counts_version()
+
+    #############################################################
+    # Methods to save and restore an analysis session
+    #############################################################
+
+    def save_session(self, path, compress=False):
+        """ Save the full state of this Twords object (tweets_df, stop_words,
+        search_terms, background_dict, word_bag, freq_dist and word_freq_df,
+        as well as original_text_store, sample_fraction, prune_log,
+        cleaning_steps, ingested_offsets, memory_budget and
+        word_bag_date_range) to a single binary file, so an analysis can be
+        picked up again without re-collecting, re-cleaning and re-counting
+        tweets.
+
+        Counts are stored as numpy arrays and tweets_df is stored column-wise
+        (see twords/snapshot.py for the format). Filters pending in a filter
+        plan are applied first, so the saved tweets match prune_log.
+
+        path (string): path of session file; numpy adds the extension ".npz"
+                       if it is missing
+        compress (bool): compress the file - smaller, but slower to save and
+                         load
+        """
+        self._flush_filter_plan()
+        start_time = time.time()
+        snapshot.save_session(self, path, compress=compress)
+        print "Time to save session: ", round((time.time() - start_time)/60., 3), "minutes"
+
+    def load_session(self, path, parts=None, tweets_columns=None):
+        """ Load a session saved with save_session into this Twords object.
+        Only the parts asked for are read from disk, e.g.
+
+            twit.load_session("session.npz", parts=["freq_dist", "background"])
+
+        restores the word counts without reading any tweet text, and
+
+            twit.load_session("session.npz",
+                              tweets_columns=["username", "date"])
+
+        loads everything except the unlisted tweets_df columns.
+
+        path (string): path of session file; the extension ".npz" may be
+                       left out, as when saving
+        parts (list of strings): any of "attributes", "tweets", "word_bag",
+                                 "freq_dist", "background", "word_freq_df";
+                                 if None all parts are loaded
+        tweets_columns (list of strings): columns of tweets_df to load; if
+                                          None all columns are loaded
+        """
+        start_time = time.time()
+        snapshot.load_session(self, path, parts=parts,
+                              tweets_columns=tweets_columns)
+        self._bump_tweets_version()
+        self._bump_counts_version()
+        print "Time to load session: ", round((time.time() - start_time)/60., 3), "minutes"
 
     ##############################################################
     # Methods to gather tweets via keyword search with
@@ -145,7 +306,8 @@ class Twords(object):
 
     def create_java_tweets(self, total_num_tweets, tweets_per_run, querysearch,
                            final_until=None, output_folder="output",
-                           decay_factor=4, all_tweets=True):
+                           decay_factor=4, all_tweets=True,
+                           drop_seen_tweets=False, adaptive=False):
         """ Function that calls java program iteratively further and further
         back in time until the desired number of tweets are collected. The
         "until" parameter gives the most recent date tweets can be found from,
@@ -157,7 +319,9 @@ class Twords(object):
         total_num_tweets: (int) total number of tweets to collect
 
         tweets_per_run: (int) number of tweets in call to java program - should
-                        not be over 50,000, better to keep around 10,000
+                        not be over 50,000, better to keep around 10,000; if
+                        adaptive is True this is only the size of the first
+                        run
 
         querysearch: (string) string defining query for twitter search - see
                      Henrique code
@@ -182,6 +346,19 @@ class Twords(object):
 
         all_tweets: (bool) flag for which jar to use - True means use
                     all_tweets jar, False means use top_tweets jar
+
+        drop_seen_tweets: (bool) if True, tweets whose ids were already saved
+                          in output_folder (by earlier runs or searches) are
+                          dropped from each run's file, and the overlap of
+                          each run is logged in output_folder/overlap_log.txt;
+                          by default every run's file is kept as returned
+
+        adaptive: (bool) if True the number of tweets per run is adjusted
+                  after each run to maximise tweets collected per minute
+                  without breaking the scraper, and failed runs in a row
+                  step back further in time (see twords/run_control.py);
+                  by default every run asks for tweets_per_run tweets.
+                  Either way each run is logged in output_folder/run_log.txt
         """
 
         if final_until is None:
@@ -198,32 +375,44 @@ class Twords(object):
         run_counter = 1
         # create folder that tweets will be saved into
         subprocess.call(['mkdir', output_folder])
+        seen_ids = SeenIds(output_folder) if drop_seen_tweets else None
+        controller = RunController(tweets_per_run, output_folder,
+                                   adaptive=adaptive)
         until = final_until
 
         while tweets_searched < total_num_tweets:
             print "Collecting run", run_counter
             run_counter += 1
+            maxtweets = controller.tweets_per_run
+            run_start_time = time.time()
             # call java program and get date of last tweet found
             last_date = self._get_one_java_run_and_return_last_line_date(
-                                querysearch, until, tweets_per_run, all_tweets)
+                                querysearch, until, maxtweets, all_tweets)
+            num_tweets = count_run_tweets('output_got.csv')
+            run_seconds = time.time() - run_start_time
             # rename each output file and put into new folder - output file
             # is named by until date
             new_file_location = output_folder + '/' + querysearch + '_' + \
                                 until + '.csv'
-            subprocess.call(['mv', 'output_got.csv', new_file_location])
+            self._move_run_output(new_file_location, seen_ids)
             # if last_date is usual date proceed as normal - if not raise error
             # and stop search
             if self._validate_date(last_date):
+                controller.record(until, maxtweets, num_tweets, run_seconds,
+                                  self._days_between(last_date, until))
                 until = last_date
-                tweets_searched += tweets_per_run
+                tweets_searched += maxtweets
             else:
-                # set search date one day further in past
+                controller.record(until, maxtweets, num_tweets, run_seconds,
+                                  None, failed=True)
+                # set search date further in past (one day, more after
+                # several failed runs in a row)
                 new_until_date_object = datetime.datetime.strptime(until, '%Y-%m-%d') \
-                                        - datetime.timedelta(days=1)
+                                        - datetime.timedelta(days=controller.step_days)
                 until = str(new_until_date_object)[:10]
                 # consider this a few tweets searched so program doesn't run
                 # forever if it gathers no tweets
-                tweets_searched += (tweets_per_run)/float(decay_factor)
+                tweets_searched += (maxtweets)/float(decay_factor)
 
         self.data_path = output_folder
         self.search_terms = querysearch.split()
@@ -236,27 +425,22 @@ class Twords(object):
         information. Dataframe has columns for username, date, retweets,
         favorites, text, mentions, and hashtag. The dataframe is stored under
         the attribute tweets_pd.
-        """
-        # Read in csv file with many columns to account for people who put many
-        # semicolons in tweets, then keep only the rows that don't have
-        # semicolons in a tweet by dropping rows with too many columns.
-        # (Semicolons are the delimeter in the java twitter search library.)
-        tweets = pd.read_csv(self.data_path, sep=";",
-                             names=list('abcdefghijklmno'), encoding='utf-8')
-        tweets = tweets[tweets.k.isnull()]
-
-        # Rename the columns with correct labels and drop row that is just
-        # column names (this will index dataframe starting at 1).
-        tweets.columns = tweets.iloc[0]
-        tweets.drop(0, inplace=True)
 
-        # Drop the extra columns on the end
-        tweets = tweets[["username", "date", "retweets", "favorites", "text",
-                         "mentions", "hashtags", "id", "permalink"]]
+        Tweets containing semicolons (the delimiter in the java twitter search
+        library) are kept whole - see twords/java_csv.py.
 
-        # Reindex dataframe
-        tweets.index = range(len(tweets))
+        Raises MemoryError if the tweets would not fit in memory_budget.
+        """
+        self._check_ingestion_memory([self.data_path], concatenated=False)
+        tweets, end, num_malformed = read_java_csv(self.data_path)
+        if num_malformed:
+            print "Skipped", num_malformed, "malformed lines"
         self.tweets_df = tweets
+        self._normalize_dates(sort=True)
+        self.sample_fraction = 1.
+        self.prune_log = []
+        self._bump_tweets_version()
+        self.classify_tweets()
 
     def get_java_tweets_from_csv_list(self, list_of_csv_files=None):
         """ Create tweets_df from list of tweet csv files
@@ -265,25 +449,28 @@ class Twords(object):
                            files containing tweets - if list_of_csv_files is
                            None then the files contained inside self.data_path
                            are used
+
+        Raises MemoryError if the tweets would not fit in memory_budget.
         """
         if list_of_csv_files is None:
             list_of_csv_files = self._get_list_of_csv_files(self.data_path)
-        path_dict = {}
-        # create dictionary with paths for keys and corresponding tweets
-        # dataframe for values
+        self._check_ingestion_memory(list_of_csv_files, concatenated=True)
+        tweets_list = []
+        total_malformed = 0
         for path in list_of_csv_files:
-            tweets = pd.read_csv(path, sep=";", names=list('abcdefghijklmno'),
-                                 encoding='utf-8')
-            tweets = tweets[tweets.k.isnull()]
-            tweets.columns = tweets.iloc[0]
-            tweets.drop(0, inplace=True)
-            tweets = tweets[["username", "date", "retweets", "favorites",
-                            "text", "mentions", "hashtags", "id", "permalink"]]
-            tweets.index = range(len(tweets))
-            path_dict[path] = tweets
+            tweets, end, num_malformed = read_java_csv(path)
+            tweets_list.append(tweets)
+            total_malformed += num_malformed
+        if total_malformed:
+            print "Skipped", total_malformed, "malformed lines"
 
         # join all created dataframes together into final tweets_df dataframe
-        self.tweets_df = pd.concat(path_dict.values(), ignore_index=True)
+        self.tweets_df = pd.concat(tweets_list, ignore_index=True)
+        self._normalize_dates(sort=True)
+        self.sample_fraction = 1.
+        self.prune_log = []
+        self._bump_tweets_version()
+        self.classify_tweets()
 
     def _get_one_java_run_and_return_last_line_date(self, querysearch, until,
                                                     maxtweets, all_tweets=True,
@@ -340,6 +527,20 @@ class Twords(object):
         if return_line:
             return date_string
 
+    def _move_run_output(self, new_file_location, seen_ids=None):
+        """ Move output_got.csv of the last java run to new_file_location.
+        If seen_ids (SeenIds of the destination folder) is given, only
+        tweets not seen before are kept, and the run's overlap is printed.
+        """
+        if seen_ids is None:
+            subprocess.call(['mv', 'output_got.csv', new_file_location])
+            return
+        stats = move_new_tweets('output_got.csv', new_file_location, seen_ids)
+        if stats is not None:
+            print "Kept", stats["new tweets"], "new tweets of", \
+                  stats["tweets"], "- overlap with earlier runs:", \
+                  stats["overlap"]
+
     def _get_list_of_csv_files(self, directory_path):
         """ Return list of csv files inside a directory
 
@@ -349,6 +550,13 @@ class Twords(object):
         return [pathjoin(directory_path, f) for f in listdir(directory_path)
                 if f[-4:] == '.csv']
 
+    def _days_between(self, earlier, later):
+        """ Return number of days from date string earlier to date string
+        later (both of form '2015-06-29').
+        """
+        return (datetime.datetime.strptime(later, '%Y-%m-%d') -
+                datetime.datetime.strptime(earlier, '%Y-%m-%d')).days
+
     def _validate_date(self, date_text):
         """ Return true if date_text is string of form '2015-06-29',
         false otherwise.
@@ -361,6 +569,216 @@ class Twords(object):
         except ValueError:
             return False
 
+    ##############################################################
+    # Methods to sample tweets for fast exploratory analysis
+    ##############################################################
+    """ On a huge corpus every round of building the word bag, plotting,
+    inspecting and dropping tweets takes minutes. These methods make a small
+    random sample of the tweets to iterate on instead: word frequency
+    dataframes of a sample give estimates (with 95% confidence intervals) of
+    the occurrences and frequencies in the full corpus, and every cleaning
+    and pruning step applied to the sample is recorded in prune_log, so once
+    the analysis is settled the same steps can be replayed on the full
+    corpus with replay_prune_log.
+    """
+
+    def get_java_tweets_sample(self, sample_size, list_of_csv_files=None,
+                               seed=0):
+        """ Create tweets_df from a uniform random sample of sample_size
+        tweets from list of tweet csv files, reading one file at a time so
+        the full corpus never has to fit in memory.
+
+        sample_size (int): number of tweets to sample
+        list_of_csv_files: python list of paths to csv files containing
+                           tweets - if None then the files contained inside
+                           self.data_path are used
+        seed (int): seed of the random number generator
+        """
+        start_time = time.time()
+        if list_of_csv_files is None:
+            list_of_csv_files = self._get_list_of_csv_files(self.data_path)
+        sampler = ReservoirSampler(sample_size, seed=seed)
+        for path in list_of_csv_files:
+            tweets, end, num_malformed = read_java_csv(path)
+            sampler.add(tweets)
+        self.tweets_df = sampler.sample()
+        self._normalize_dates(sort=True)
+        self.sample_fraction = sampler.sample_fraction()
+        self.prune_log = []
+        self._bump_tweets_version()
+        self.classify_tweets()
+        print "Sampled", len(self.tweets_df), "of", sampler.num_seen, \
+              "tweets"
+        print "Time to sample tweets: ", \
+              round((time.time() - start_time)/60., 3), "minutes"
+
+    def sample_tweets(self, fraction, by=None, seed=0):
+        """ Return new Twords object holding a random sample of fraction of
+        the tweets in tweets_df, with the same search terms, stop words,
+        background rates and paths. If by is a column of tweets_df (e.g.
+        "date" or "username") each of its values keeps its share of tweets.
+
+        fraction (float): fraction of tweets to sample, between 0 and 1
+        by (string): column to stratify the sample by
+        seed (int): seed of the random number generator
+        """
+        positions = stratified_sample_positions(self.tweets_df, fraction,
+                                                by=by, seed=seed)
+        sample = Twords()
+        sample.jar_folder_path = self.jar_folder_path
+        sample.data_path = self.data_path
+        sample.background_path = self.background_path
+        sample.background_dict = self.background_dict
+        sample.search_terms = list(self.search_terms)
+        sample.stop_words = list(self.stop_words)
+        sample.tweets_df = self.tweets_df.take(positions)
+        sample.tweets_df.index = range(len(sample.tweets_df))
+        sample.sample_fraction = self.sample_fraction*fraction
+        return sample
+
+    def replay_prune_log(self, twords):
+        """ Apply the cleaning, pruning and stop word steps recorded in
+        self.prune_log to another Twords object, usually the full corpus
+        this object's tweets were sampled from.
+
+        Steps are replayed with the same arguments, so a threshold like the
+        max_num_occurrences of drop_by_username_with_n_tweets is not scaled
+        to the size of the full corpus.
+
+        twords (Twords): object to apply the steps to
+        """
+        start_time = time.time()
+        twords.apply_cleaning_steps(self.prune_log)
+        print "Time to replay", len(self.prune_log), "steps: ", \
+              round((time.time() - start_time)/60., 3), "minutes"
+
+    def _log_prune_step(self, method_name, argument=None):
+        """ Record call of cleaning or pruning method in prune_log. """
+        if argument is None:
+            self.prune_log.append(method_name)
+        else:
+            self.prune_log.append((method_name, argument))
+
+    ##############################################################
+    # Methods to incrementally load tweets from a data_path
+    # that collectors are still writing to
+    ##############################################################
+
+    def follow_java_tweets(self, cleaning_steps=None):
+        """ Start follow mode: load all tweets currently in the csv files in
+        self.data_path into tweets_df, passing them through cleaning_steps,
+        and remember how much of each file was read. Later calls to
+        refresh_java_tweets then read only new files and new lines appended
+        to files that are still growing.
+
+        If freq_dist already holds counts (from create_word_bag or
+        make_nltk_object_from_word_bag), they are kept up to date with the
+        new tweets as well.
+
+        cleaning_steps (list): methods applied to each batch of new tweets -
+                               see the cleaning_steps attribute. Only steps
+                               that act on each tweet separately make sense
+                               here (e.g. lower_tweets,
+                               remove_urls_from_tweets, drop_by_term_in_tweet);
+                               drop_duplicate_tweets also drops new tweets
+                               that duplicate tweets loaded earlier.
+        """
+        if cleaning_steps is not None:
+            self.cleaning_steps = cleaning_steps
+        self.tweets_df = pd.DataFrame(columns=TWEETS_DF_COLUMNS +
+                                      ["tweet_class"])
+        self.ingested_offsets = {}
+        self._ingested_texts = set()
+        return self.refresh_java_tweets()
+
+    def refresh_java_tweets(self):
+        """ Load tweets added to the csv files in self.data_path since the
+        last call to follow_java_tweets or refresh_java_tweets, clean them
+        with self.cleaning_steps, append them to tweets_df and add their words
+        to the running word counts. Returns number of new tweets.
+
+        Only the bytes past the recorded offset of each file are read, and a
+        partially written last line is left for the next refresh.
+        """
+        start_time = time.time()
+        new_tweets_list = []
+        bytes_read = 0
+        for path in sorted(self._get_list_of_csv_files(self.data_path)):
+            offset = self.ingested_offsets.get(path, 0)
+            if getsize(path) <= offset:
+                continue
+            # leave incomplete last line for next refresh
+            tweets, end, num_malformed = read_java_csv(
+                                path, start=offset, complete_lines_only=True)
+            self.ingested_offsets[path] = end
+            bytes_read += end - offset
+            if len(tweets):
+                new_tweets_list.append(tweets)
+
+        if not new_tweets_list:
+            print "No new tweets found"
+            return 0
+        new_tweets = pd.concat(new_tweets_list, ignore_index=True)
+        # classify before cleaning steps change the text
+        new_tweets["tweet_class"] = classify_texts(
+                                TextStore.from_texts(new_tweets["text"]))
+        new_tweets = self._clean_new_tweets(new_tweets)
+        self.tweets_df = pd.concat([self.tweets_df, new_tweets],
+                                   ignore_index=True)
+        self.tweets_df["tweet_class"] = \
+            self.tweets_df["tweet_class"].fillna(0).astype(np.uint8)
+        # new tweets are appended unsorted; date_index sorts when needed
+        self._normalize_dates(sort=False)
+        self._count_new_tweets(new_tweets)
+        self._bump_tweets_version()
+        self._bump_counts_version()
+        print "Loaded", len(new_tweets), "new tweets from", bytes_read, \
+              "new bytes in", round((time.time() - start_time)/60., 3), \
+              "minutes"
+        return len(new_tweets)
+
+    def apply_cleaning_steps(self, cleaning_steps=None):
+        """ Apply cleaning steps (see cleaning_steps attribute) to tweets_df.
+        If cleaning_steps is None, self.cleaning_steps is used.
+        """
+        if cleaning_steps is None:
+            cleaning_steps = self.cleaning_steps
+        for step in cleaning_steps:
+            if type(step) in (str, unicode):
+                getattr(self, step)()
+            else:
+                method_name, argument = step
+                getattr(self, method_name)(argument)
+
+    def _clean_new_tweets(self, new_tweets):
+        """ Return new_tweets dataframe passed through self.cleaning_steps,
+        with tweets duplicating earlier loaded tweets dropped if
+        drop_duplicate_tweets is one of the steps.
+        """
+        batch = Twords()
+        batch.search_terms = self.search_terms
+        batch.stop_words = self.stop_words
+        batch.tweets_df = new_tweets
+        batch.apply_cleaning_steps(self.cleaning_steps)
+        new_tweets = batch.tweets_df
+        if "drop_duplicate_tweets" in self.cleaning_steps:
+            seen = self._ingested_texts
+            new_tweets = new_tweets[~new_tweets["text"].map(
+                                            lambda text: text in seen).values]
+            seen.update(new_tweets["text"].tolist())
+        return new_tweets
+
+    def _count_new_tweets(self, new_tweets):
+        """ Add words of new_tweets to word_bag and freq_dist, if these
+        already hold counts.
+        """
+        if not self.word_bag and not self.freq_dist.N():
+            return
+        new_words = self._word_bag_from_tweets(new_tweets["text"].tolist())
+        if self.word_bag:
+            self.word_bag.extend(new_words)
+        self.freq_dist.update(new_words)
+
     ##############################################################
     # Methods to gather user timeline tweets with
     # Java GetOldTweets
@@ -431,7 +849,8 @@ class Twords(object):
         if return_line:
             return date_string
 
-    def get_all_user_tweets(self, user, tweets_per_run):
+    def get_all_user_tweets(self, user, tweets_per_run,
+                            drop_seen_tweets=False, adaptive=False):
         """ Return all tweets in a user's timeline. This is necessary
         to do in batches since one call to get_user_tweets does not return
         all of the tweets (too many in one run breaks the web-scrolling
@@ -442,9 +861,10 @@ class Twords(object):
         returned up to (but not including) the end_date in get_user_tweets
         function.
 
-        This function will return duplicates of some tweets to be sure all
-        tweets are obtained - these can be eliminated by simply dropping
-        duplicates in the text column of resulting pandas dataframe.
+        The java runs return duplicates of some tweets to be sure all
+        tweets are obtained - with drop_seen_tweets these are dropped as each
+        run's file is saved (otherwise they can be eliminated by dropping
+        duplicates in the text column of resulting pandas dataframe).
 
         Function typically fails to return every single tweet, but captures
         most (~87 percent for barackobama) - best performance when
@@ -453,7 +873,19 @@ class Twords(object):
         Creates: folder (named by username searched) of csv files
 
         user (string): twitter handle of user, e.g. "barackobama"
-        tweets_per_run (int): how many tweets to pull in each run
+        tweets_per_run (int): how many tweets to pull in each run (in the
+                              first run, if adaptive is True)
+        drop_seen_tweets (bool): if True, tweets whose ids were already saved
+                                 in the user's folder are dropped from each
+                                 run's file, and the overlap of each run is
+                                 logged in the folder's overlap_log.txt; by
+                                 default every run's file is kept as returned
+        adaptive (bool): if True the number of tweets per run is adjusted
+                         after each run to maximise tweets collected per
+                         minute without breaking the scraper (see
+                         twords/run_control.py); by default every run
+                         asks for tweets_per_run tweets. Either way each run
+                         is logged in the folder's run_log.txt
         """
         # increment the date one day forward from returned day when calling
         # get_user_tweets to be sure all tweets in overlapping
@@ -465,6 +897,8 @@ class Twords(object):
 
         # create folder that tweets will be saved into
         subprocess.call(['mkdir', user])
+        seen_ids = SeenIds(user) if drop_seen_tweets else None
+        controller = RunController(tweets_per_run, user, adaptive=adaptive)
 
         # set one day in future so that all tweets up to today are returned;
         # necessary because tweets are returned on dates up to but not
@@ -478,17 +912,23 @@ class Twords(object):
         while continue_search:
             print "Collecting run", run_counter
             run_counter += 1
+            maxtweets = controller.tweets_per_run
+            run_start_time = time.time()
             # call user function and get date of last tweet found
-            last_date = self.get_user_tweets(user, tweets_per_run,
+            last_date = self.get_user_tweets(user, maxtweets,
                                              end_date=until)
+            num_tweets = count_run_tweets('output_got.csv')
+            run_seconds = time.time() - run_start_time
             # rename each output file and put into new folder - output file
             # is named by until date
             new_file_location = user + '/' + until + '.csv'
-            subprocess.call(['mv', 'output_got.csv', new_file_location])
+            self._move_run_output(new_file_location, seen_ids)
 
             # if last_date is a date proceed as normal - if the last_date
             # hasn't changed, raise comment below
             if self._validate_date(last_date):
+                controller.record(until, maxtweets, num_tweets, run_seconds,
+                                  self._days_between(last_date, until))
                 until_minus_day_object = datetime.datetime.strptime(until, '%Y-%m-%d') \
                                         - datetime.timedelta(days=1)
                 until_minus_day = str(until_minus_day_object)[:10]
@@ -509,6 +949,8 @@ class Twords(object):
                                             + datetime.timedelta(days=1)
                     until = str(new_until_date_object)[:10]
             else:
+                controller.record(until, maxtweets, num_tweets, run_seconds,
+                                  None, failed=True)
                 continue_search = False
 
         # set data path to new output folder to read in new tweets easily
@@ -521,40 +963,55 @@ class Twords(object):
     # before visual inspection)
     #############################################################
 
-    def keep_column_of_original_tweets(self):
+    def keep_column_of_original_tweets(self, compact=False):
         """ Devote a column of self.tweets_df to the original, unaltered tweets.
         Can be useful for comparison after cleaning.
 
         This should be done before any cleaning functions are applied to the
         "text" column of self.tweets_df.
+
+        If compact is True the original tweets are instead kept in
+        original_text_store, one contiguous utf-8 buffer that takes a
+        fraction of the memory of a column of python strings, and are only
+        turned into a column when original_tweets is called.
+
+        compact (bool): keep original tweets in a TextStore instead of a
+                        column of tweets_df
         """
-        self.tweets_df["original_tweets"] = self.tweets_df["text"]
+        if compact:
+            self.original_text_store = TextStore.from_texts(
+                                            self.tweets_df["text"].values)
+        else:
+            self.tweets_df["original_tweets"] = self.tweets_df["text"]
+
+    def original_tweets(self):
+        """ Return series of the original tweets kept by
+        keep_column_of_original_tweets, aligned with tweets_df.
+        """
+        if self.original_text_store is not None:
+            return self.original_text_store.to_series(
+                                            index=self.tweets_df.index)
+        return self.tweets_df["original_tweets"]
 
     def lower_tweets(self):
         """ Lowers case of text in all the tweets, usernames, mentions and
         hashtags in the tweets_df dataframe, if the dataframe has those
         columns.
         """
+        self._log_prune_step("lower_tweets")
         column_names = list(self.tweets_df.columns.values)
-        if "username" in column_names:
-            self.tweets_df["username"] = self.tweets_df.username.str.lower()
-        if "text" in column_names:
-            self.tweets_df["text"] = self.tweets_df.text.str.lower()
-        if "mentions" in column_names:
-            self.tweets_df["mentions"] = self.tweets_df.mentions.str.lower()
-        if "hashtags" in column_names:
-            self.tweets_df["hashtags"] = self.tweets_df.hashtags.str.lower()
+        for column in ["username", "text", "mentions", "hashtags"]:
+            if column in column_names:
+                self._rewrite_column(column, lambda x: x.str.lower())
+        self._bump_tweets_version()
 
     def keep_only_unicode_tweet_text(self):
         """ Keeps only tweets where tweet text is unicode. This drops the
         occasional tweet that has a NaN value in dataset, which becomes a float
         when read into tweets_df.
         """
-        self.tweets_df["text_type"] = self.tweets_df["text"].map(lambda text: type(text))
-        self.tweets_df = self.tweets_df[self.tweets_df.text_type == unicode]
-        del self.tweets_df["text_type"]
-        # Reindex dataframe
-        self.tweets_df.index = range(len(self.tweets_df))
+        self._log_prune_step("keep_only_unicode_tweet_text")
+        self._apply_filter("unicode_text")
 
     def _remove_urls_from_single_tweet(self, tweet):
         """ Remove urls from text of a single tweet.
@@ -572,11 +1029,14 @@ class Twords(object):
     def remove_urls_from_tweets(self):
         """ Remove urls from all tweets in self.tweets_df
         """
+        self._log_prune_step("remove_urls_from_tweets")
         start_time = time.time()
         print "Removing urls from tweets..."
         print "This may take a minute - cleaning rate is about 400,000" \
                " tweets per minute"
-        self.tweets_df["text"] = self.tweets_df["text"].map(self._remove_urls_from_single_tweet)
+        self._rewrite_column("text", lambda x: x.map(
+                                self._remove_urls_from_single_tweet))
+        self._bump_tweets_version()
         minutes_to_complete = (time.time() - start_time)/60.
         print "Time to complete:", round(minutes_to_complete,3), \
               "minutes"
@@ -585,16 +1045,20 @@ class Twords(object):
     def remove_punctuation_from_tweets(self):
         """ Strip common punctuation from tweets in self.tweets_df
         """
-        self.tweets_df["text"] = self.tweets_df["text"].apply(lambda x:
-                                 ''.join([i for i in x if i not in
-                                 string.punctuation]))
+        self._log_prune_step("remove_punctuation_from_tweets")
+        self._rewrite_column("text", lambda texts: texts.apply(lambda x:
+                             ''.join([i for i in x if i not in
+                             string.punctuation])))
+        self._bump_tweets_version()
 
     def drop_non_ascii_characters_from_tweets(self):
         """ Remove all characters that are not standard ascii.
         """
-        self.tweets_df['text'] = self.tweets_df["text"].apply(lambda x:
-                                 ''.join([i if 32 <= ord(i) < 126 else
-                                 "" for i in x]))
+        self._log_prune_step("drop_non_ascii_characters_from_tweets")
+        self._rewrite_column("text", lambda texts: texts.apply(lambda x:
+                             ''.join([i if 32 <= ord(i) < 126 else
+                             "" for i in x])))
+        self._bump_tweets_version()
 
     def _convert_date_to_standard(self, date_text):
         """ Convert a date string of form u"yyyy/mm/dd" into form u"yyyy-mm-dd"
@@ -605,26 +1069,57 @@ class Twords(object):
         return date_text
 
     def convert_tweet_dates_to_standard(self):
-        """ Convert tweet dates from form "yyyy/mm/dd" to "yyyy-mm-dd" in
-        tweets_df dataframe.
+        """ Convert tweet dates from strings of form "yyyy/mm/dd" to
+        datetime64 values in tweets_df dataframe. The loading methods already
+        do this, so this is only needed for tweets_df set by hand.
         """
-        self.tweets_df["date"] = self.tweets_df["date"].map(self._convert_date_to_standard)
+        self._log_prune_step("convert_tweet_dates_to_standard")
+        self._normalize_dates(sort=False)
+        self._bump_tweets_version()
 
-    def sort_tweets_by_date(self):
-        """ Sort tweets by their date - useful for any sort of time series
-        analysis, e.g. analyzing sentiment changes over time.
+    def _normalize_dates(self, sort=True):
+        """ Convert date column of tweets_df to datetime64 values (see
+        twords/dates.py), and if sort is True sort tweets_df by date.
         """
-        self.tweets_df.sort_values("date", inplace=True)
+        if "date" not in self.tweets_df.columns:
+            return
+        if not pd.api.types.is_datetime64_any_dtype(self.tweets_df["date"]):
+            self.tweets_df["date"] = normalize_dates(
+                                        self.tweets_df["date"].values)
+        if sort:
+            self._sort_rows_by_date()
+
+    def _sort_rows_by_date(self):
+        """ Stably sort rows of tweets_df (and original_text_store) by
+        date, tweets without a date last, and reindex tweets_df.
+        """
+        keys = date_keys(normalize_dates(self.tweets_df["date"].values))
+        if len(keys) and (np.diff(keys) < 0).any():
+            order = np.argsort(keys, kind="mergesort")
+            self.tweets_df = self.tweets_df.take(order, is_copy=False)
+            if self.original_text_store is not None:
+                self.original_text_store = \
+                    self.original_text_store.take(order)
         # Reindex dataframe
         self.tweets_df.index = range(len(self.tweets_df))
 
+    def sort_tweets_by_date(self):
+        """ Sort tweets by their date - useful for any sort of time series
+        analysis, e.g. analyzing sentiment changes over time. Tweets are
+        kept in their current order within each date.
+
+        The loading methods already sort tweets by date, and dropping tweets
+        keeps them sorted.
+        """
+        self._sort_rows_by_date()
+        self._bump_tweets_version()
+
     def drop_duplicate_tweets(self):
         """ Drop duplicate tweets in tweets_df (except for the first instance
         of each tweet)
         """
-        self.tweets_df.drop_duplicates("text", inplace=True)
-        # Reindex dataframe
-        self.tweets_df.index = range(len(self.tweets_df))
+        self._log_prune_step("drop_duplicate_tweets")
+        self._apply_filter("drop_duplicates")
 
     def drop_by_search_in_name(self):
         """ Drop tweets that contain element from search_terms in either
@@ -641,19 +1136,10 @@ class Twords(object):
             assert type(term) in (str, unicode)
             assert term  # to make sure string isn't empty
 
+        self._log_prune_step("drop_by_search_in_name")
         # Drop the tweets that contain any of search terms in either a username
         # or a mention
-        column_names = list(self.tweets_df.columns.values)
-        for term in self.search_terms:
-            if "mentions" in column_names:
-                mentions_index = self.tweets_df[self.tweets_df.mentions.str.contains(term) == True].index
-                self.tweets_df.drop(mentions_index, inplace=True)
-            if "username" in column_names:
-                username_index = self.tweets_df[self.tweets_df.username.str.contains(term) == True].index
-                self.tweets_df.drop(username_index, inplace=True)
-
-        # Reindex dataframe
-        self.tweets_df.index = range(len(self.tweets_df))
+        self._apply_filter("drop_name_terms", self.search_terms)
 
     def keep_tweets_with_terms(self, term_list):
         """ Drops all the tweets in tweets_df that do NOT contain at least one
@@ -666,21 +1152,12 @@ class Twords(object):
 
         term_list (string or list of strings): collection of terms to drop on
         """
-        if type(term_list) == str:
-            assert len(term_list) > 0
-            keep_index = self.tweets_df[self.tweets_df.text.str.contains(term_list) == True].index
-            self.tweets_df = self.tweets_df.iloc[keep_index]
-
-        if type(term_list) == list:
-            keep_index = pd.core.index.Int64Index([], dtype='int64')
-            for term in term_list:
-                assert len(term) > 0
-                term_keep_index = self.tweets_df[self.tweets_df.text.str.contains(term) == True].index
-                keep_index = keep_index.append(term_keep_index)
-            keep_index = keep_index.drop_duplicates()
-            self.tweets_df = self.tweets_df.iloc[keep_index]
-        # Reindex dataframe
-        self.tweets_df.index = range(len(self.tweets_df))
+        if type(term_list) in (str, unicode):
+            term_list = [term_list]
+        for term in term_list:
+            assert len(term) > 0
+        self._log_prune_step("keep_tweets_with_terms", term_list)
+        self._apply_filter("keep_text_terms", term_list)
 
     #############################################################
     # Methods to prune tweets (probably used after visual
@@ -704,20 +1181,10 @@ class Twords(object):
             assert type(term) in (str, unicode)
             assert term
 
+        self._log_prune_step("drop_by_term_in_name", terms)
         # Drop the tweets that contain any of terms in either a username
         # or a mention
-        # don't need to set " == True", that is redundant
-        column_names = list(self.tweets_df.columns.values)
-        for term in terms:
-            if "mentions" in column_names:
-                mentions_index = self.tweets_df[self.tweets_df.mentions.str.contains(term) == True].index
-                self.tweets_df.drop(mentions_index, inplace=True)
-            if "username" in column_names:
-                username_index = self.tweets_df[self.tweets_df.username.str.contains(term) == True].index
-                self.tweets_df.drop(username_index, inplace=True)
-
-        # Reindex dataframe
-        self.tweets_df.index = range(len(self.tweets_df))
+        self._apply_filter("drop_name_terms", terms)
 
     def drop_by_term_in_tweet(self, terms):
         """ Drop tweets that contain element from terms in the tweet text.
@@ -727,62 +1194,157 @@ class Twords(object):
         This is most useful for getting rid of repetitive or spammy tweets that
         appear to be distorting data.
 
-        This is also useful for dropping retweets, which can be accomplished
-        by dropping tweets containing the string "rt @"
+        To drop retweets, replies and other classes of tweets it is faster
+        to use drop_tweet_classes, which needs no scan of the text.
 
         terms (string or python list of strings): terms that appear in tweets
                                                   we want to drop
         """
+        if type(terms) in (str, unicode) or type(terms) == list:
+            self._log_prune_step("drop_by_term_in_tweet", terms)
         if type(terms) in (str, unicode):
-            text_index = self.tweets_df[self.tweets_df.text.str.contains(terms) == True].index
-            self.tweets_df.drop(text_index, inplace=True)
+            self._apply_filter("drop_text_terms", [terms])
 
         elif type(terms) == list:
             for term in terms:
                 assert type(term) in (str, unicode)
                 assert len(term) > 0
-                text_index = self.tweets_df[self.tweets_df.text.str.contains(term) == True].index
-                self.tweets_df.drop(text_index, inplace=True)
+            self._apply_filter("drop_text_terms", terms)
 
         else:
             raise Exception("Input must be string or list of string.")
-        # Reindex dataframe
-        self.tweets_df.index = range(len(self.tweets_df))
+
+    def classify_tweets(self):
+        """ Set tweet_class column of tweets_df to bit-field of the classes
+        each tweet belongs to - retweet, reply, via, url only and hashtag
+        only (see twords/tweet_class.py). The loading methods do this, so it
+        is only needed for tweets_df set by hand or loaded from an older
+        session.
+        """
+        if not len(self.tweets_df) or "text" not in self.tweets_df.columns:
+            return
+        self.tweets_df["tweet_class"] = classify_texts(self.text_store())
+
+    def tweet_class_mask(self, classes):
+        """ Return boolean array of which tweets in tweets_df are in any of
+        classes.
+
+        classes (string or list of strings): e.g. ["retweet", "reply"]; see
+                                             tweet_class.CLASS_BITS
+        """
+        if "tweet_class" not in self.tweets_df.columns:
+            self.classify_tweets()
+        return (self.tweets_df["tweet_class"].values &
+                class_bits(classes)) != 0
+
+    def tweet_class_counts(self):
+        """ Return series of the number of tweets in tweets_df in each class.
+        """
+        if "tweet_class" not in self.tweets_df.columns:
+            self.classify_tweets()
+        counts = class_counts(self.tweets_df["tweet_class"].values)
+        return pd.Series(list(counts.values()), index=list(counts.keys()),
+                         name="tweets")
+
+    def drop_tweet_classes(self, classes):
+        """ Drop tweets in any of classes, e.g.
+
+        twit.drop_tweet_classes(["retweet", "via"])
+
+        using the tweet_class column set at load time, so no text is scanned.
+
+        classes (string or list of strings): classes to drop - "retweet",
+                                             "reply", "via", "url only" or
+                                             "hashtag only"
+        """
+        if type(classes) in (str, unicode):
+            classes = [classes]
+        class_bits(classes)
+        if "tweet_class" not in self.tweets_df.columns:
+            self.classify_tweets()
+        self._log_prune_step("drop_tweet_classes", classes)
+        self._apply_filter("drop_classes", classes)
 
     def drop_by_username_with_n_tweets(self, max_num_occurrences=1):
         """ Drops all tweets by usernames that appear more than
         max_num_occurrences times in tweets_df.
 
-        This function can be time consuming.
-
         Dropping all users with more than 1 tweet should be a safe way to
-        filter out a lot of the spam.
+        filter out a lot of the spam. To drop spam users by more features
+        than tweet count use drop_spam_users.
+
+        Tweets are counted after the filters pending in the filter plan (if
+        one has been started) are applied, so the result doesn't depend on
+        whether a plan is used.
         """
+        self._log_prune_step("drop_by_username_with_n_tweets",
+                             max_num_occurrences)
         start_time = time.time()
+        self._flush_filter_plan()
         print "Dropping tweets by repeated users..."
         # get list of usernames that occur too much
         repeat_user_counts = self.tweets_df["username"].value_counts()
-        for i in range(len(repeat_user_counts)):
-            if repeat_user_counts[i] <= max_num_occurrences:
-                break_index = i
-                break
-        repeated_usernames = list(repeat_user_counts[0:break_index].index)
+        repeated_usernames = list(repeat_user_counts[repeat_user_counts >
+                                                     max_num_occurrences].index)
         print "Found", len(repeated_usernames), "users with more than", \
               max_num_occurrences, "tweets in tweets_df"
-        # drop these usernames from tweets_df
-        percentile_num = len(repeated_usernames)//20
-        for i, twitter_username in enumerate(repeated_usernames):
-            if len(repeated_usernames) <= 100:
-                print "Dropping tweets from user", i
-            elif i%percentile_num == 0:
-                print "Finished", 5*i/percentile_num, "percent of user drops"
-            drop_index = self.tweets_df[self.tweets_df.username == twitter_username].index
-            self.tweets_df.drop(drop_index, inplace=True)
-        # Reindex dataframe
-        self.tweets_df.index = range(len(self.tweets_df))
+        # drop these usernames from tweets_df in one pass
+        if repeated_usernames:
+            self._apply_filter("drop_usernames", repeated_usernames)
         print "Took", round((time.time() - start_time)/60.,3), \
               "minutes to complete"
 
+    def drop_spam_users(self, max_tweets=None, max_tweets_per_day=None,
+                        min_duplicate_ratio=None, min_url_ratio=None,
+                        min_tweets=1, require_all=False):
+        """ Drop all tweets by users flagged as spam by their combined
+        features in the user index (see user_index): tweet count, tweets per
+        day, fraction of repeated tweets and fraction of tweets with urls.
+        Each threshold left as None is not used; users are flagged if they
+        fail any of the given tests, or all of them if require_all is True.
+
+        Returns list of dropped usernames.
+
+        max_tweets (int): drop users with more tweets than this
+        max_tweets_per_day (float): drop users averaging more tweets per day
+                                    active than this
+        min_duplicate_ratio (float): drop users with at least this fraction
+                                     of tweets repeating one of their
+                                     earlier tweets
+        min_url_ratio (float): drop users with at least this fraction of
+                               tweets containing urls
+        min_tweets (int): only users with at least this many tweets are
+                          dropped by the ratio and rate tests
+        require_all (bool): only drop users failing all the given tests
+
+        As in drop_by_username_with_n_tweets, user features are computed
+        after the filters pending in the filter plan are applied.
+        """
+        self._flush_filter_plan()
+        spam_usernames = self.user_index().spam_usernames(
+                            max_tweets=max_tweets,
+                            max_tweets_per_day=max_tweets_per_day,
+                            min_duplicate_ratio=min_duplicate_ratio,
+                            min_url_ratio=min_url_ratio,
+                            min_tweets=min_tweets, require_all=require_all)
+        print "Found", len(spam_usernames), "spam users"
+        if spam_usernames:
+            self._log_prune_step("drop_by_username", spam_usernames)
+            self._apply_filter("drop_usernames", spam_usernames)
+        return spam_usernames
+
+    def drop_by_username(self, usernames):
+        """ Drop all tweets by the users in usernames.
+
+        usernames (string or list of strings): usernames to drop
+        """
+        if type(usernames) in (str, unicode):
+            usernames = [usernames]
+        for username in usernames:
+            assert type(username) in (str, unicode)
+        self._log_prune_step("drop_by_username", usernames)
+        self._apply_filter("drop_usernames", usernames)
+
     def add_stop_words(self, stopwords_item):
         """ Add word or list of words to stop words used in create_word_bag.
         The word might be a url or spam tag. A common case is parts of urls
@@ -794,11 +1356,15 @@ class Twords(object):
 
         stopwords: (string or list of strings):
         """
+        if type(stopwords_item) in (str, unicode) or \
+                type(stopwords_item) == list:
+            self._log_prune_step("add_stop_words", stopwords_item)
         if type(stopwords_item) in (str, unicode):
             if type(stopwords_item) == str:
                 # convert string to unicode if not unicode already
                 stopwords_item = stopwords_item.decode('utf-8')
             self.stop_words = self.stop_words + [stopwords_item]
+            self._bump_counts_version()
 
         elif type(stopwords_item) == list:
             for term in stopwords_item:
@@ -808,10 +1374,136 @@ class Twords(object):
                                   else term.decode('utf-8')
                                   for term in stopwords_item]
             self.stop_words = self.stop_words + unicode_terms_list
+            self._bump_counts_version()
 
         else:
             raise Exception("Input must be string or list of strings.")
 
+    #############################################################
+    # Methods to batch drop/keep operations into one pass
+    #############################################################
+
+    def start_filter_plan(self):
+        """ Start collecting drop/keep operations instead of applying them.
+
+        After this is called, the methods keep_only_unicode_tweet_text,
+        drop_duplicate_tweets, drop_by_search_in_name, keep_tweets_with_terms,
+        drop_by_term_in_name, drop_by_term_in_tweet and drop_tweet_classes
+        only add a filter to self.filter_plan, and tweets_df is left
+        untouched until execute_filter_plan is called. The plan then merges the term lists,
+        runs the cheapest filters first and touches tweets_df only once.
+
+        Note that drop_duplicate_tweets is always evaluated last in a plan,
+        i.e. duplicates are found among the tweets that survive every other
+        filter.
+
+        Methods that rewrite the text of tweets (e.g. lower_tweets or
+        remove_urls_from_tweets) first apply the filters pending in the plan,
+        so these always see the text as it was when they were added, and so
+        do drop_by_username_with_n_tweets and drop_spam_users, so users'
+        tweets are counted among the tweets that survive the pending
+        filters.
+        """
+        self.filter_plan = FilterPlan()
+        print "Filter plan started - drop/keep operations will be applied " \
+              "when execute_filter_plan is called"
+
+    def execute_filter_plan(self):
+        """ Apply all filters collected since start_filter_plan to tweets_df
+        in a single pass, print and return a dataframe giving how many tweets
+        each filter dropped, and go back to applying filters immediately.
+        """
+        if self.filter_plan is None:
+            print "No filter plan started - use start_filter_plan first"
+            return
+        start_time = time.time()
+        plan = self.filter_plan
+        self.filter_plan = None
+        num_tweets = len(self.tweets_df)
+        keep, report = plan.execute(self.tweets_df)
+        self._keep_rows(keep)
+        print report
+        print "Dropped", num_tweets - len(self.tweets_df), "of", num_tweets, \
+              "tweets in", round((time.time() - start_time)/60., 3), "minutes"
+        return report
+
+    def _flush_filter_plan(self):
+        """ Apply the filters pending in the filter plan, if one has been
+        started, and collect later filters in a new plan.
+        """
+        if self.filter_plan is None or not len(self.filter_plan):
+            return
+        keep, report = self.filter_plan.execute(self.tweets_df)
+        self.filter_plan = FilterPlan()
+        self._keep_rows(keep)
+
+    def _apply_filter(self, kind, terms=None):
+        """ Add filter to the current filter plan, or apply it to tweets_df
+        right away if no filter plan has been started.
+
+        kind (string): kind of filter - see filter_plan.PREDICATE_COSTS
+        terms (list of strings): terms the filter matches on
+        """
+        if self.filter_plan is not None:
+            self.filter_plan.add(kind, terms)
+            return
+        plan = FilterPlan()
+        plan.add(kind, terms)
+        keep, report = plan.execute(self.tweets_df)
+        self._keep_rows(keep)
+
+    def _keep_rows(self, keep):
+        """ Keep only the rows of tweets_df where boolean array keep is True,
+        and reindex tweets_df.
+        """
+        if not keep.all():
+            user_index_current = self._user_index_cache is not None and \
+                self._user_index_cache[0] == self.tweets_version
+            # assigning tweets_df bumps tweets_version
+            self.tweets_df = self.tweets_df[keep].copy()
+            if self.original_text_store is not None:
+                self.original_text_store = self.original_text_store.take(keep)
+            if user_index_current:
+                # update the user index instead of rebuilding it
+                user_index = self._user_index_cache[1]
+                user_index.keep_rows(keep)
+                self._user_index_cache = (self.tweets_version, user_index)
+        # Reindex dataframe
+        self.tweets_df.index = range(len(self.tweets_df))
+
+    @property
+    def tweets_df(self):
+        """ Dataframe of the tweets. Assigning a new dataframe bumps
+        tweets_version, so the text store and the indexes of tweets_df are
+        rebuilt from it.
+        """
+        return self._tweets_df
+
+    @tweets_df.setter
+    def tweets_df(self, tweets_df):
+        self._tweets_df = tweets_df
+        self._bump_tweets_version()
+
+    @property
+    def data_version(self):
+        """ Counter increased whenever tweets_version or counts_version is.
+        """
+        return self.tweets_version + self.counts_version
+
+    def _bump_tweets_version(self):
+        """ Record that tweets_df changed (tweets loaded, dropped, rewritten
+        or reordered), so results cached against the old tweets_version,
+        such as the text store and the indexes of tweets_df, are recomputed.
+        """
+        self.tweets_version += 1
+
+    def _bump_counts_version(self):
+        """ Record that the word counts or the settings they depend on (stop
+        words, search terms, background rates) changed, so results cached
+        against the old counts_version are recomputed.
+        """
+        self.counts_version += 1
+
     #############################################################
     # Methods for investigating word frequencies
     #############################################################
@@ -829,7 +1521,9 @@ class Twords(object):
     a python dictionary for fast lookup.
     """
 
-    def create_word_bag(self):
+    def create_word_bag(self, use_sketch=False, epsilon=1e-5, delta=0.01,
+                        num_heavy_hitters=10000, chunk_size=100000,
+                        start_date=None, end_date=None, keep_positions=False):
         """ Takes tweet dataframe and outputs word_bag, which is a list of all
         words in all tweets, with punctuation and stop words removed. word_bag
         is contained inside the attribute self.word_bag.
@@ -837,13 +1531,123 @@ class Twords(object):
         This method will often be called repeatedly during data inspection, as
         it needs to be redone every time some tweets are dropped from
         tweets_df.
+
+        If use_sketch is True the word bag is never stored: tweets are
+        tokenized chunk_size tweets at a time and counted straight into a
+        fixed-memory SketchFreqDist (see twords/sketch.py), which is set as
+        self.freq_dist. There is then no need to call
+        make_nltk_object_from_word_bag. Use this when the vocabulary of the
+        corpus is too large for an exact nltk.FreqDist.
+
+        If start_date or end_date is given, only tweets on dates in that
+        range are used (see date_range_rows), e.g. for the word frequencies
+        of a single week. Tweets are sorted by date, so the range is one
+        block of the text store and nothing is copied to select it.
+
+        If keep_positions is True the positions of all tokens of all tweets
+        are indexed as well (see token_index), so concordance lookups don't
+        have to build the index later.
+
+        If memory_budget is set, the memory the word bag needs is estimated
+        first (see memory_report). When the joined words_string and the full
+        token list would not fit, tweets are tokenized chunk_size tweets at a
+        time into the same word bag; when the word bag itself would not fit,
+        words are counted in sketch mode; when neither fits, MemoryError is
+        raised before anything is built.
+
+        use_sketch (bool): count words approximately in fixed memory instead
+                           of building the full word bag
+        epsilon (float): relative error of sketch counts (sketch mode only)
+        delta (float): probability a sketch count exceeds its error bound
+                       (sketch mode only)
+        num_heavy_hitters (int): number of most common words the sketch can
+                                 return from most_common (sketch mode only)
+        chunk_size (int): number of tweets tokenized at a time (sketch mode,
+                          or when memory_budget requires chunks)
+        start_date (string): first date of tweets used, e.g. "2016-06-20"
+        end_date (string): last date of tweets used, e.g. "2016-06-26"
+        keep_positions (bool): also build token_index of all tweets
         """
-        start_time = time.time()
-        # Convert dataframe tweets column to python list of tweets, then join
-        # this list together into one long list of words
-        tweets_list = self.tweets_df["text"].tolist()
+        if start_date is None and end_date is None:
+            rows = slice(0, len(self.tweets_df))
+            self.word_bag_date_range = None
+        else:
+            rows = self.date_range_rows(start_date, end_date)
+            self.word_bag_date_range = (start_date, end_date)
+            print "Using", rows.stop - rows.start, "tweets in date range"
+
+        chunked = False
+        if self.memory_budget is not None:
+            # the text store is held while the word bag is built, so build
+            # it first to count it against the budget
+            self.text_store()
+        # the current word bag is replaced, so it doesn't count against the
+        # budget
+        available = self._memory_available(exclude=["word_bag"])
+        if available is not None and not use_sketch:
+            estimates = word_bag_estimates(self.text_store(), rows,
+                                           self.stop_words, chunk_size)
+            chunk_bytes = estimates["chunk words_string"] + \
+                estimates["chunk tokens"]
+            whole_bytes = estimates["words_string"] + estimates["tokens"] + \
+                estimates["word_bag"]
+            if whole_bytes > available:
+                if estimates["word_bag"] + chunk_bytes <= available:
+                    chunked = True
+                    print "Memory budget: tokenizing", chunk_size, \
+                          "tweets at a time"
+                elif sketch_size(epsilon, delta, num_heavy_hitters) + \
+                        chunk_bytes <= available:
+                    use_sketch = True
+                    print "Memory budget: word bag would need about", \
+                          megabytes(estimates["word_bag"]), "MB - " \
+                          "counting words in sketch mode instead"
+                else:
+                    raise MemoryError("Word bag needs about %s MB, but "
+                                      "only %s MB of memory_budget is free"
+                                      % (megabytes(estimates["word_bag"] +
+                                                   chunk_bytes),
+                                         megabytes(max(available, 0))))
+            self.word_bag = []
+
+        if use_sketch:
+            start_time = time.time()
+            freq_dist = SketchFreqDist(epsilon=epsilon, delta=delta,
+                                       num_heavy_hitters=num_heavy_hitters)
+            text_store = self.text_store()
+            for i in range(rows.start, rows.stop, chunk_size):
+                freq_dist.update(self._word_bag_from_string(
+                    text_store.joined(i, min(i + chunk_size, rows.stop))))
+            self.word_bag = []
+            self.freq_dist = freq_dist
+            self._bump_counts_version()
+            print "Time to compute word counts sketch: ", \
+                  round((time.time() - start_time)/60., 3), "minutes"
+            print "Counts overestimate by at most", \
+                  int(ceil(freq_dist.error_bound())), "occurrences"
+            if keep_positions:
+                self.token_index()
+            return
+
+        if chunked:
+            start_time = time.time()
+            text_store = self.text_store()
+            word_bag = []
+            for i in range(rows.start, rows.stop, chunk_size):
+                word_bag.extend(self._word_bag_from_string(
+                    text_store.joined(i, min(i + chunk_size, rows.stop))))
+            self.word_bag = word_bag
+            self._bump_counts_version()
+            print "Time to compute word bag: ", \
+                  round((time.time() - start_time)/60., 3), "minutes"
+            if keep_positions:
+                self.token_index()
+            return
 
-        words_string = " ".join(tweets_list)
+        start_time = time.time()
+        # The text store already holds all tweets joined together in one
+        # buffer, so this is a single decode instead of a join of every tweet
+        words_string = self.text_store().joined(rows.start, rows.stop)
         print "Time to make words_string: ", round((time.time() - start_time)/60., 3), "minutes"
 
         start_time = time.time()
@@ -853,8 +1657,47 @@ class Twords(object):
         print "Time to tokenize: ", round((time.time() - start_time)/60., 3), "minutes"
 
         start_time = time.time()
-        self.word_bag = [word for word in tokens if word not in self.stop_words]
+        stop_words = set(self.stop_words)
+        self.word_bag = [word for word in tokens if word not in stop_words]
+        self._bump_counts_version()
         print "Time to compute word bag: ", round((time.time() - start_time)/60., 3), "minutes"
+        if keep_positions:
+            self.token_index()
+
+    def _word_bag_from_tweets(self, tweets_list):
+        """ Return list of words in tweets_list (list of tweet strings), with
+        stop words removed, tokenized the same way as in create_word_bag.
+        """
+        return self._word_bag_from_string(" ".join(tweets_list))
+
+    def _word_bag_from_string(self, words_string):
+        """ Return list of words in words_string with stop words removed. """
+        tokens = nltk.word_tokenize(words_string)
+        stop_words = set(self.stop_words)
+        return [word for word in tokens if word not in stop_words]
+
+    def text_store(self):
+        """ Return TextStore (see twords/textstore.py) of the text column of
+        tweets_df: all tweet texts in one contiguous utf-8 buffer, which
+        create_word_bag tokenizes from directly. The store can be saved with
+        its save method and memory-mapped by worker processes with
+        TextStore.load.
+
+        The store is a copy of the text column kept to tokenize from, not a
+        replacement for it: it adds its buffer (about the size of the texts
+        in utf-8) to the memory held, and memory_report counts it as "text
+        store cache".
+
+        The store is built once and reused until tweets_version changes or
+        the text column is assigned (e.g. twit.tweets_df["text"] = ...).
+        """
+        texts = self.tweets_df["text"].values
+        if self._text_store_cache is None or \
+                self._text_store_cache[0] != self.tweets_version or \
+                self._text_store_cache[1] is not texts:
+            self._text_store_cache = (self.tweets_version, texts,
+                                      TextStore.from_texts(texts))
+        return self._text_store_cache[2]
 
     def make_nltk_object_from_word_bag(self, word_bag=None):
         """ Creates nltk word statistical object from the current word_bag
@@ -873,7 +1716,48 @@ class Twords(object):
         """
         if word_bag is None:
             word_bag = self.word_bag
-        self.freq_dist = nltk.FreqDist(self.word_bag)
+        if not word_bag and isinstance(self.freq_dist, SketchFreqDist):
+            print "freq_dist was already built by create_word_bag in " \
+                  "sketch mode - keeping it"
+            return
+        self.freq_dist = nltk.FreqDist(word_bag)
+        self._bump_counts_version()
+
+    def count_words_in_parallel(self, processes=None, vocabulary=None,
+                                tokenizer="nltk"):
+        """ Count words of all tweets with several processes and set
+        freq_dist, as create_word_bag followed by
+        make_nltk_object_from_word_bag would, without building word_bag.
+
+        The text store and a shared vocabulary are handed to the workers
+        through shared memory, and each worker hands its counts back as an
+        integer array over that vocabulary (see twords/shared.py), so
+        almost nothing is pickled between processes. The vocabulary is the
+        words of background_dict and of the current freq_dist; words found
+        that are not in it are still counted, just handed back less
+        efficiently.
+
+        processes (int): number of worker processes (default: number of cpus)
+        vocabulary (list of strings): words to count into shared arrays
+        tokenizer (string): "nltk" (as create_word_bag) or "regex" (faster
+                            split into words, hashtags and mentions)
+        """
+        start_time = time.time()
+        if vocabulary is None:
+            vocabulary = list(self.background_dict.keys())
+            if isinstance(self.freq_dist, nltk.FreqDist):
+                vocabulary += [word for word in self.freq_dist.keys()
+                               if word not in self.background_dict]
+        words, counts, report = shared_word_counts(
+                        self.text_store(), vocabulary, self.stop_words,
+                        processes=processes, tokenizer=tokenizer)
+        found = np.flatnonzero(counts)
+        self.freq_dist = nltk.FreqDist(dict(zip([words[i] for i in found],
+                                                counts[found].tolist())))
+        self.word_bag = []
+        self._bump_counts_version()
+        print "Time to count words in parallel: ", \
+              round((time.time() - start_time)/60., 3), "minutes"
 
     def create_word_freq_df(self, top_n_words):
         """ Creates pandas dataframe called word_freq_df of the most common n
@@ -885,6 +1769,12 @@ class Twords(object):
         log frequency ratio: log of the relative frequency to background rates
         background_occur: the number of times word appears in background corpus
 
+        If tweets_df is a sample of the corpus (sample_fraction below 1) there
+        are also columns estimating the occurrences and frequency of each word
+        in the full corpus: estimated occurrences, occurrences lower,
+        occurrences upper, frequency lower and frequency upper (bounds of 95%
+        confidence intervals).
+
         (The log is useful because, for example, a rate two times as high as
         background has log ratio of +x, and a rate two times lower than
         background rates has a log ratio of -x.)
@@ -899,40 +1789,17 @@ class Twords(object):
         The actual words that were searched to collect the corpus are omitted
         from this dataframe (as long as self.search_terms has been set).
 
+        The full sorted frequency table is computed on the first call and
+        reused by later calls (with any n) until counts_version changes.
+
         n (int): number of most frequent words we want to appear in dataframe
         """
         print "Creating word_freq_df..."
-        print "Takes about 1 minute per 1000 words"
         start_time = time.time()
-        # make dataframe we'll use in plotting
-        num_words = top_n_words
-        word_frequencies_list = []
-        for word, occurrences in self.freq_dist.most_common(num_words):
-            # determine whether word appears in background dict; if it does
-            # not, the frequency ratio is set to zero
-            if word in self.search_terms:
-                continue
-            if word in self.background_dict.keys():
-                freq_ratio = self.freq_dist.freq(word)/self.background_dict[word][0]
-                background_freq = self.background_dict[word][0]
-                log_freq_ratio = log(freq_ratio)
-                background_occur = self.background_dict[word][1]
-            else:
-                freq_ratio = 0
-                background_freq = 0
-                log_freq_ratio = 0
-                background_occur = 0
-
-            # faster to make list and then make dataframe in one line
-            # than to repeatedly append to an existing dataframe
-            word_frequencies_list.append((word, occurrences,
-                                          self.freq_dist.freq(word),
-                                          freq_ratio, log_freq_ratio,
-                                          background_occur))
-        word_freq_df = pd.DataFrame(word_frequencies_list,
-                                columns=['word', 'occurrences', 'frequency',
-                                'relative frequency', 'log relative frequency',
-                                'background occurrences'])
+        # the full sorted table is cached, so only slice it here
+        table = self._word_freq_table()[:top_n_words]
+        table = table[~table['word'].isin(self.search_terms)]
+        word_freq_df = table.reset_index(drop=True)
         print "Time to create word_freq_df: ", \
               round((time.time() - start_time)/60., 4), "minutes"
         self.word_freq_df = word_freq_df
@@ -950,43 +1817,144 @@ class Twords(object):
         politics one might choose words like "conservative", "liberal",
         "regulation" and "liberty" as a set of word axes, and then see how
         twitter-searched words like "taxes", "Obamacare", etc. appear as word
-        vectors along these axes.
+        vectors along these axes. To build the vectors of many such words at
+        once from the tweets containing each of them, use word_vectors.
 
         words: list of words to put in dataframe - each word is a string
         """
-
-        word_frequencies_list = []
         words = [x.decode("utf-8") if type(x) == str else x for x in words]
+        words = [word for word in words if word not in self.search_terms]
+
+        # look words up in the cached full table; words not in it (not in
+        # corpus, or below the heavy hitters of a sketch) are computed here
+        table = self._word_freq_table()
+        positions = pd.Index(table['word']).get_indexer(words)
+        missing = [word for word, position in zip(words, positions)
+                   if position == -1]
+        missing_table = self._word_freq_rows(
+                            missing, [self.freq_dist[word] for word in missing])
+        found = table.take(positions[positions != -1])
+        word_freq_df = pd.concat([found, missing_table], ignore_index=True)
+        # put rows back in order of words
+        order = np.concatenate([np.flatnonzero(positions != -1),
+                                np.flatnonzero(positions == -1)])
+        word_freq_df = word_freq_df.take(np.argsort(order, kind='mergesort'))
+        word_freq_df = word_freq_df.reset_index(drop=True)
+        word_freq_df = word_freq_df.rename(
+                    columns={'background occurrences': 'background_occur'})
+        return word_freq_df
 
-        for word in words:
-            # determine whether word appears in both background dict and corpus
-            # if it does not, the frequency ratio is set to zero
-            if word in self.search_terms:
-                continue
-            occurrences = self.freq_dist[word]
-            if word in self.background_dict.keys() and occurrences != 0:
-                freq_ratio = self.freq_dist.freq(word)/self.background_dict[word][0]
-                background_freq = self.background_dict[word][0]
-                log_freq_ratio = log(freq_ratio)
-                background_occur = self.background_dict[word][1]
-            else:
-                freq_ratio = 0
-                background_freq = 0
-                log_freq_ratio = 0
-                background_occur = 0
-
-            # faster to make list and then make dataframe in one line
-            # than to repeatedly append to an existing dataframe
-            word_frequencies_list.append((word, occurrences,
-                                          self.freq_dist.freq(word),
-                                          freq_ratio, log_freq_ratio,
-                                          background_occur))
-        word_freq_df = pd.DataFrame(word_frequencies_list,
-                                columns=['word', 'occurrences', 'frequency',
-                                'relative frequency', 'log relative frequency',
-                                'background_occur'])
+    def word_vectors(self, targets, axes, ignore_case=False):
+        """ Return WordVectors (see twords/word_vectors.py) of many target
+        terms along many axis words, computed together in about two passes
+        over the text store rather than one filtered corpus per target. For
+        each target the tweets containing it are found, and the frequency of
+        each axis word in those tweets (among the words that are not
+        stop_words or punctuation) is compared with its background
+        frequency. For example
+
+        vectors = twit.word_vectors(["taxes", "obamacare", "guns"],
+                                    ["conservative", "liberal",
+                                     "regulation", "liberty"])
+        vectors.to_frame()                  # targets by axes log ratios
+        vectors.most_similar("taxes")       # cosine similarity of targets
+
+        targets (list of strings): target terms, e.g. search terms of
+                                   interest
+        axes (list of strings): axis words
+        ignore_case (bool): match targets and axis words in any case
+        """
+        start_time = time.time()
+        vectors = build_word_vectors(self.text_store(), targets, axes,
+                                     self._background_frame(), ignore_case,
+                                     self.stop_words)
+        print "Time to compute word vectors: ", \
+              round((time.time() - start_time)/60., 3), "minutes"
+        return vectors
+
+    def _background_frame(self):
+        """ Return background_dict as dataframe indexed by word with columns
+        'background frequency' and 'background occurrences', cached until
+        background_dict is replaced.
+        """
+        key = (id(self.background_dict), len(self.background_dict))
+        if self._background_cache is None or \
+                self._background_cache[0] != key:
+            words = list(self.background_dict.keys())
+            values = [self.background_dict[word] for word in words]
+            background = pd.DataFrame(
+                {'background frequency': np.array([value[0] for value in
+                                                   values], dtype=np.float64),
+                 'background occurrences': np.array([value[1] for value in
+                                                     values], dtype=np.int64)},
+                index=pd.Index(words, dtype=object),
+                columns=['background frequency', 'background occurrences'])
+            self._background_cache = (key, background)
+        return self._background_cache[1]
+
+    def _word_freq_rows(self, words, occurrences):
+        """ Return word frequency dataframe (columns as in word_freq_df) for
+        list of words with given occurrences in corpus. Words that are not in
+        background_dict, or don't occur in corpus, get ratios of zero.
+        """
+        occurrences = np.asarray(occurrences, dtype=np.int64)
+        total = self.freq_dist.N()
+        frequency = occurrences/float(total) if total else \
+            np.zeros(len(occurrences))
+        background = self._background_frame().reindex(
+                                    pd.Index(words, dtype=object))
+        background_freq = background['background frequency'].fillna(0).values
+        in_background = (background_freq > 0) & (occurrences > 0)
+        freq_ratio = np.zeros(len(words))
+        freq_ratio[in_background] = frequency[in_background] / \
+            background_freq[in_background]
+        log_freq_ratio = np.zeros(len(words))
+        log_freq_ratio[in_background] = np.log(freq_ratio[in_background])
+        background_occur = np.where(
+                    in_background,
+                    background['background occurrences'].fillna(0).values,
+                    0).astype(np.int64)
+        word_freq_df = pd.DataFrame({'word': pd.Series(words, dtype=object),
+                                     'occurrences': occurrences,
+                                     'frequency': frequency,
+                                     'relative frequency': freq_ratio,
+                                     'log relative frequency': log_freq_ratio,
+                                     'background occurrences':
+                                     background_occur},
+                                    columns=['word', 'occurrences',
+                                             'frequency', 'relative frequency',
+                                             'log relative frequency',
+                                             'background occurrences'])
+        if self.sample_fraction < 1:
+            # tweets_df is a sample - add estimates for the full corpus
+            estimate, lower, upper, frequency_lower, frequency_upper = \
+                word_count_intervals(occurrences, total, self.sample_fraction)
+            word_freq_df['estimated occurrences'] = estimate
+            word_freq_df['occurrences lower'] = lower
+            word_freq_df['occurrences upper'] = upper
+            word_freq_df['frequency lower'] = frequency_lower
+            word_freq_df['frequency upper'] = frequency_upper
         return word_freq_df
 
+    def _word_freq_table(self):
+        """ Return word frequency dataframe of every word in freq_dist (or
+        every heavy hitter of a sketch freq_dist), most common first.
+
+        The table is cached against counts_version, so calling
+        create_word_freq_df with different n only sorts the vocabulary and
+        computes background ratios once until the data changes.
+        """
+        key = (self.counts_version, id(self.freq_dist),
+               id(self.background_dict), len(self.background_dict),
+               self.sample_fraction)
+        if self._word_freq_cache is None or self._word_freq_cache[0] != key:
+            most_common = self.freq_dist.most_common()
+            words = [word for word, occurrences in most_common]
+            table = self._word_freq_rows(words, [occurrences for word,
+                                                 occurrences in most_common])
+            self._word_freq_cache = (key, table)
+        return self._word_freq_cache[1]
+
     def plot_word_frequencies(self, plot_string, dataframe=None):
         """ Plots of given value about word, where plot_string is a string
         that gives quantity to be plotted. This is just an example function,
@@ -1046,6 +2014,55 @@ class Twords(object):
         ax.tick_params(axis='x', labelsize=20) # size of numerical labels
         """
 
+    def save_word_frequency_plot(self, plot_string, path, dataframe=None,
+                                 words_per_page=50, max_words=None):
+        """ Same plot as plot_word_frequencies, but rendered without pyplot
+        straight to image file(s) at path, split into pages of
+        words_per_page words. Returns list of files written. Use this in
+        scripts and batch jobs; to render many charts in parallel use
+        render_word_frequency_charts in twords/plotting.py.
+
+        plot_string (string): column of word_freq_df dataframe to plot
+        path (string): image file to write, e.g. "brexit.png"
+        dataframe (pandas dataframe): dataframe of the same form as
+                                      word_freq_df; if left empty then
+                                      self.word_freq_df is plotted
+        words_per_page (int): maximum number of words in one image
+        max_words (int): only plot the first max_words words
+        """
+        if dataframe is None:
+            dataframe = self.word_freq_df
+        start_time = time.time()
+        files = render_word_frequency_chart(dataframe, plot_string, path,
+                                            words_per_page=words_per_page,
+                                            max_words=max_words)
+        print "Time to render plot: ", \
+              round((time.time() - start_time)/60., 3), "minutes"
+        return files
+
+    #############################################################
+    # Methods for hashtag and mention analytics
+    #############################################################
+
+    def entity_analytics(self):
+        """ Return EntityAnalytics (see twords/entities.py) of the hashtags
+        and mentions columns of tweets_df, giving their frequencies over the
+        whole corpus and per time period, co-occurrence matrices and top
+        co-occurring neighbours, e.g.
+
+        twit.entity_analytics().top_neighbours(u"#brexit", k=10)
+
+        The analytics are built once and reused until tweets_version changes.
+        """
+        if self._entity_cache is None or \
+                self._entity_cache[0] != self.tweets_version:
+            start_time = time.time()
+            analytics = EntityAnalytics(self.tweets_df)
+            self._entity_cache = (self.tweets_version, analytics)
+            print "Time to index hashtags and mentions: ", \
+                  round((time.time() - start_time)/60., 3), "minutes"
+        return self._entity_cache[1]
+
     #############################################################
     # Methods to inspect tweets in tweets_df dataframe
     #############################################################
@@ -1082,6 +2099,53 @@ class Twords(object):
         print len(tweets_containing), "tweets contain this term"
         return tweets_containing[["username", "text"]]
 
+    def token_index(self):
+        """ Return TokenIndex (see twords/concordance.py) of the positions
+        of all tokens of all tweets in tweets_df, used by concordance and
+        concordance_patterns. It is built with one pass over the text store
+        (or by create_word_bag with keep_positions=True) and reused until
+        the text store is rebuilt.
+        """
+        text_store = self.text_store()
+        if self._token_index_cache is None or \
+                self._token_index_cache[0] is not text_store:
+            start_time = time.time()
+            token_index = TokenIndex(text_store)
+            self._token_index_cache = (text_store, token_index)
+            print "Time to index token positions: ", \
+                  round((time.time() - start_time)/60., 3), "minutes"
+        return self._token_index_cache[1]
+
+    def concordance(self, word, width=5, max_lines=1000):
+        """ Returns dataframe of occurrences of word in tweets_df with width
+        tokens of context on each side (keyword in context), with columns
+        row (position of the tweet in tweets_df), left, word and right.
+        Occurrences are looked up in token_index, so the tweets are not
+        searched again.
+
+        word (string): word of interest, e.g. a word from word_freq_df
+        width (int): number of tokens of context on each side
+        max_lines (int): maximum number of occurrences returned (None for
+                         all)
+        """
+        assert type(word) in (str, unicode)
+        return self.token_index().concordance(word, width, max_lines)
+
+    def concordance_patterns(self, word, left=1, right=1, n=20):
+        """ Returns dataframe of the n most frequent contexts of word in
+        tweets_df - its left tokens before and right tokens after - with the
+        number of occurrences of each and the row of a tweet it occurs in,
+        e.g. to see at a glance how a word in word_freq_df is used.
+
+        word (string): word of interest
+        left (int): number of tokens of context before word
+        right (int): number of tokens of context after word
+        n (int): number of contexts
+        """
+        assert type(word) in (str, unicode)
+        assert left + right > 0
+        return self.token_index().patterns(word, left, right, n)
+
     def tweets_by(self, username):
         """ Returns all tweets by username from tweets_df.
 
@@ -1093,5 +2157,226 @@ class Twords(object):
         assert type(username) in (str, unicode)
         assert username
 
-        tweets_by = self.tweets_df[self.tweets_df.username == username]
+        rows = self.user_index().rows_of(username)
+        tweets_by = self.tweets_df.take(rows)
         return tweets_by[["username", "text"]]
+
+    def tweet_counts(self, freq="D", term=None):
+        """ Returns series of number of tweets in tweets_df in each period
+        (e.g. each day), indexed by period. If term is given only tweets
+        containing term are counted.
+
+        freq (string): pandas period frequency, e.g. "D", "W" or "M"
+        term (string): term of interest
+        """
+        dates = pd.to_datetime(pd.Series(self.tweets_df["date"].values),
+                               errors='coerce')
+        if term is not None:
+            assert type(term) in (str, unicode)
+            contains = (self.tweets_df.text.str.contains(term) == True).values
+            dates = dates[contains]
+        counts = dates.dt.to_period(freq).value_counts().sort_index()
+        counts.name = "tweets"
+        return counts
+
+    def date_index(self):
+        """ Return DateIndex (see twords/dates.py) of the dates of
+        tweets_df, used to find the rows of a date range by binary search.
+
+        tweets_df must be sorted by date: the loading methods sort it, and
+        if it isn't (e.g. after refresh_java_tweets appended new tweets) it
+        is sorted here first. The index is reused until tweets_version
+        changes.
+        """
+        if self._date_index_cache is None or \
+                self._date_index_cache[0] != self.tweets_version:
+            dates = normalize_dates(self.tweets_df["date"].values)
+            keys = date_keys(dates)
+            if len(keys) and (np.diff(keys) < 0).any():
+                print "Sorting tweets by date"
+                self.sort_tweets_by_date()
+                dates = normalize_dates(self.tweets_df["date"].values)
+            self._date_index_cache = (self.tweets_version, DateIndex(dates))
+        return self._date_index_cache[1]
+
+    def date_range_rows(self, start_date=None, end_date=None):
+        """ Return slice of the rows of tweets_df with tweets on dates from
+        start_date up to and including end_date; a date left as None is
+        open. Found in O(log n) with date_index.
+
+        start_date (string): first date, e.g. "2016-06-20"
+        end_date (string): last date, e.g. "2016-06-26"
+        """
+        return self.date_index().rows(start_date, end_date)
+
+    def tweets_in_date_range(self, start_date=None, end_date=None):
+        """ Return the rows of tweets_df with tweets on dates from
+        start_date up to and including end_date, as a positional slice of
+        tweets_df rather than a filtered copy. For example
+
+        twit.tweets_in_date_range("2016-06-20", "2016-06-26")
+
+        start_date (string): first date, e.g. "2016-06-20"
+        end_date (string): last date, e.g. "2016-06-26"
+        """
+        return self.tweets_df.iloc[self.date_range_rows(start_date, end_date)]
+
+    def user_index(self):
+        """ Return UserIndex (see twords/users.py) of tweets_df, giving the
+        rows of each user's tweets and per-user features: tweet count, date
+        span, total retweets and favorites, and fraction of repeated tweets
+        and of tweets with urls. For example
+
+        twit.user_index().features().sort_values("tweets")
+
+        The index is built once and reused until tweets_version changes;
+        dropping tweets updates it in place rather than rebuilding it.
+        """
+        if self._user_index_cache is None or \
+                self._user_index_cache[0] != self.tweets_version:
+            self._user_index_cache = (self.tweets_version,
+                                      UserIndex(self.tweets_df))
+        return self._user_index_cache[1]
+
+    #############################################################
+    # Methods to serve the corpus to other processes
+    #############################################################
+
+    def serve_corpus(self, port=8765, host="127.0.0.1", cache_size=128):
+        """ Serve tweets_containing, tweets_by, word frequency dataframes
+        and tweet counts of this corpus over HTTP until interrupted, so many
+        analysts can query one loaded corpus instead of each loading their
+        own copy. Query it with TwordsClient (see twords/server.py), e.g.
+
+        TwordsClient(port=8765).word_freq_df(100)
+
+        Build the word bag and freq_dist before serving; the corpus must not
+        be changed while it is served.
+
+        port (int): port to listen on
+        host (string): address to listen on - the default only accepts
+                       connections from this machine
+        cache_size (int): number of query results cached
+        """
+        serve_twords(self, host=host, port=port, cache_size=cache_size)
+
+    #############################################################
+    # Methods to account for memory use
+    #############################################################
+
+    def memory_report(self):
+        """ Print total and return dataframe of the memory held by this
+        object and of the memory the heavy stages would need if run now,
+        with columns stage, item, bytes and megabytes. Stages are
+
+        held: each attribute (tweets_df, original tweets, word_bag,
+              freq_dist, background_dict, word_freq_df) and cache
+        create_word_bag: peak temporaries words_string and tokens, the
+                         resulting word_bag, and the temporaries of
+                         tokenizing chunk_size tweets at a time
+        cleaning: the new text column a cleaning step builds while the old
+                  one is still held
+        ingestion: tweets_df and text store of loading the csv files in
+                   data_path (if data_path is set)
+
+        Sizes of large containers and the stage temporaries are estimated
+        from samples (see twords/memory.py). memory_budget is checked
+        against the held bytes plus the temporaries of the stage.
+        """
+        rows = []
+        if "text" in self.tweets_df.columns:
+            rows += [("create_word_bag", name, size) for name, size in
+                     word_bag_estimates(self.text_store(),
+                                        stop_words=self.stop_words).items()]
+            rows.append(("cleaning", "text column copy",
+                         self._column_bytes("text")))
+        paths = self._data_path_files()
+        if paths:
+            rows += [("ingestion", name, size) for name, size in
+                     ingestion_estimates(paths).items() if name != "tweets"]
+        held = attribute_sizes(self)
+        rows = [("held", name, size) for name, size in held.items()] + rows
+        report = pd.DataFrame(rows, columns=["stage", "item", "bytes"])
+        report["megabytes"] = report["bytes"].map(megabytes)
+        print "Memory held:", megabytes(sum(held.values())), "MB"
+        if self.memory_budget is not None:
+            print "Memory budget:", megabytes(self.memory_budget), "MB"
+        return report
+
+    def _column_bytes(self, column):
+        """ Return bytes held by column of tweets_df (measured on a sample
+        of its strings).
+        """
+        return column_size(self.tweets_df[column])
+
+    def _data_path_files(self):
+        """ Return list of csv files at data_path (a file or a folder). """
+        if not self.data_path or not exists(self.data_path):
+            return []
+        if isdir(self.data_path):
+            return self._get_list_of_csv_files(self.data_path)
+        return [self.data_path]
+
+    def _memory_available(self, exclude=()):
+        """ Return bytes of memory_budget not held by this object, leaving
+        out the parts named in exclude (as in memory_report), or None if
+        there is no memory_budget.
+        """
+        if self.memory_budget is None:
+            return None
+        return self.memory_budget - sum(size for name, size in
+                                        attribute_sizes(self).items()
+                                        if name not in exclude)
+
+    def _check_ingestion_memory(self, paths, concatenated):
+        """ Raise MemoryError if loading csv files paths would exceed
+        memory_budget.
+
+        concatenated (bool): files are parsed into separate dataframes
+                             that are then concatenated, so tweets_df is
+                             held twice
+        """
+        available = self._memory_available()
+        if available is None:
+            return
+        estimates = ingestion_estimates(paths)
+        needed = estimates["tweets_df"]*(2 if concatenated else 1) + \
+            estimates["text store"]
+        if needed > available:
+            tweet_bytes = (estimates["tweets_df"] + estimates["text store"]) \
+                / float(max(estimates["tweets"], 1))
+            raise MemoryError("Loading about %d tweets needs about %s MB, "
+                              "but only %s MB of memory_budget is free - "
+                              "load a sample of up to about %d tweets with "
+                              "get_java_tweets_sample instead" %
+                              (estimates["tweets"], megabytes(needed),
+                               megabytes(max(available, 0)),
+                               max(available, 0)/tweet_bytes))
+
+    def _rewrite_column(self, column, function):
+        """ Replace column of tweets_df by function(column), where function
+        maps a series to a series of the same length. Filters pending in the
+        filter plan are applied first, so they match the text as it was when
+        they were added.
+
+        The old and the new column are both held until the new one is
+        complete, so if that would exceed memory_budget the column is
+        instead rewritten in place, as many rows at a time as fit.
+        """
+        self._flush_filter_plan()
+        available = self._memory_available()
+        if available is None or self._column_bytes(column) <= available:
+            self.tweets_df[column] = function(self.tweets_df[column])
+            return
+        if available <= 0:
+            raise MemoryError("Rewriting column " + column + " needs more "
+                              "memory than memory_budget leaves free")
+        chunk_size = max(1, int(len(self.tweets_df)*available /
+                                float(self._column_bytes(column))))
+        print "Memory budget: rewriting", column, "in chunks of", \
+              chunk_size, "tweets"
+        values = self.tweets_df[column].values
+        for i in range(0, len(values), chunk_size):
+            values[i:i + chunk_size] = \
+                function(pd.Series(values[i:i + chunk_size])).values
+        self.tweets_df[column] = values
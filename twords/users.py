@@ -0,0 +1,235 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Per-user index of tweets_df.
+
+A UserIndex is built once from tweets_df and holds, for each user, the
+positions of their rows in tweets_df (as one array of row positions grouped
+by user, plus the offset of each user's group) and aggregate features used
+to spot spam accounts:
+
+- tweets: number of tweets
+- first date, last date and days active
+- total retweets and favorites
+- duplicate ratio: fraction of the user's tweets repeating the text of an
+  earlier tweet by the same user
+- url ratio: fraction of the user's tweets containing a url
+
+When rows are dropped from tweets_df the index is updated in place rather
+than rebuilt: counts and sums are decreased by those of the dropped rows, and
+only the date spans and duplicate flags of users who lost tweets are
+recomputed.
+"""
+
+import numpy as np
+import pandas as pd
+
+URL_PATTERN = "http|www\\."
+
+FEATURE_COLUMNS = ["tweets", "first date", "last date", "days active",
+                   "retweets", "favorites", "duplicate ratio", "url ratio"]
+
+
+def _column_or_zeros(tweets_df, column):
+    if column in tweets_df.columns:
+        return pd.to_numeric(tweets_df[column], errors='coerce') \
+            .fillna(0).values.astype(np.int64)
+    return np.zeros(len(tweets_df), dtype=np.int64)
+
+
+class UserIndex(object):
+    """ Index of the rows and aggregate features of each user of tweets_df.
+
+    usernames (numpy object array): username of each user id
+    user_ids (numpy int64 array): user id of each row of tweets_df
+    """
+
+    def __init__(self, tweets_df):
+        user_ids, usernames = pd.factorize(tweets_df["username"])
+        self.usernames = np.asarray(usernames, dtype=object)
+        self._positions = pd.Index(self.usernames, dtype=object)
+        self.user_ids = user_ids.astype(np.int64)
+        num_users = len(self.usernames)
+
+        # per-row features
+        texts = tweets_df["text"] if "text" in tweets_df.columns else \
+            pd.Series(np.nan, index=tweets_df.index)
+        self._texts = texts.values
+        self._dates = pd.to_datetime(pd.Series(tweets_df["date"].values)
+                                     if "date" in tweets_df.columns else
+                                     pd.Series([pd.NaT]*len(tweets_df)),
+                                     errors='coerce').values
+        self._retweets = _column_or_zeros(tweets_df, "retweets")
+        self._favorites = _column_or_zeros(tweets_df, "favorites")
+        self._has_url = (pd.Series(self._texts, dtype=object)
+                         .str.contains(URL_PATTERN) == True).values
+        self._duplicate = self._duplicated(np.arange(len(tweets_df)))
+
+        # rows grouped by user
+        self._order = np.argsort(self.user_ids, kind='mergesort')
+        self.tweets = np.bincount(self.user_ids[self.user_ids != -1],
+                                  minlength=num_users)
+        self._group_starts()
+        self._sum_features()
+        self.first_dates = np.full(num_users, np.datetime64('NaT'),
+                                   dtype='datetime64[ns]')
+        self.last_dates = self.first_dates.copy()
+        self._date_spans(np.arange(num_users))
+
+    def __repr__(self):
+        return "UserIndex of %d users" % len(self.usernames)
+
+    def __len__(self):
+        return len(self.usernames)
+
+    def _duplicated(self, rows):
+        """ Return boolean array over rows of whether each row's text repeats
+        an earlier row's text by the same user.
+        """
+        pairs = pd.DataFrame({"user": self.user_ids[rows],
+                              "text": self._texts[rows]})
+        return pairs.duplicated().values & pd.notnull(pairs["text"]).values
+
+    def _user_sums(self, values, rows=None):
+        """ Return per-user sums of per-row values (over rows, or all rows).
+        """
+        user_ids = self.user_ids if rows is None else self.user_ids[rows]
+        values = values if rows is None else values[rows]
+        valid = user_ids != -1
+        return np.bincount(user_ids[valid], weights=values[valid],
+                           minlength=len(self.usernames)).astype(np.int64)
+
+    def _group_starts(self):
+        """ Set offset of each user's group of rows in _order (rows with a
+        null username are sorted first).
+        """
+        num_null = int((self.user_ids == -1).sum())
+        self._starts = num_null + np.concatenate([[0],
+                                                  np.cumsum(self.tweets)[:-1]])
+
+    def _sum_features(self):
+        self.retweets = self._user_sums(self._retweets)
+        self.favorites = self._user_sums(self._favorites)
+        self.duplicates = self._user_sums(self._duplicate)
+        self.url_tweets = self._user_sums(self._has_url)
+
+    def _date_spans(self, users):
+        """ Recompute first and last dates of users (array of user ids). """
+        rows = np.flatnonzero(np.in1d(self.user_ids, users))
+        self.first_dates[users] = np.datetime64('NaT')
+        self.last_dates[users] = np.datetime64('NaT')
+        spans = pd.Series(self._dates[rows]).groupby(
+                                self.user_ids[rows]).agg(["min", "max"])
+        spans = spans[spans.index != -1]
+        self.first_dates[spans.index.values] = spans["min"].values
+        self.last_dates[spans.index.values] = spans["max"].values
+
+    def rows_of(self, username):
+        """ Return array of row positions in tweets_df of the tweets by
+        username (empty if there are none).
+        """
+        if type(username) == str:
+            username = username.decode("utf-8")
+        user = self._positions.get_indexer([username])[0]
+        if user == -1:
+            return np.zeros(0, dtype=np.int64)
+        start = self._starts[user]
+        return self._order[start:start + self.tweets[user]]
+
+    def features(self):
+        """ Return dataframe of the aggregate features of each user (that
+        still has tweets), indexed by username.
+        """
+        has_tweets = self.tweets > 0
+        tweets = self.tweets[has_tweets]
+        days_active = pd.Series(self.last_dates[has_tweets] -
+                                self.first_dates[has_tweets]).dt.days + 1
+        return pd.DataFrame({"tweets": tweets,
+                             "first date": self.first_dates[has_tweets],
+                             "last date": self.last_dates[has_tweets],
+                             "days active": days_active.values,
+                             "retweets": self.retweets[has_tweets],
+                             "favorites": self.favorites[has_tweets],
+                             "duplicate ratio":
+                             self.duplicates[has_tweets]/tweets.astype(float),
+                             "url ratio":
+                             self.url_tweets[has_tweets]/tweets.astype(float)},
+                            index=pd.Index(self.usernames[has_tweets],
+                                           name="username"),
+                            columns=FEATURE_COLUMNS)
+
+    def spam_usernames(self, max_tweets=None, max_tweets_per_day=None,
+                       min_duplicate_ratio=None, min_url_ratio=None,
+                       min_tweets=1, require_all=False):
+        """ Return list of usernames flagged as spam by combined user
+        features, in one vectorized pass over all users. Each threshold left
+        as None is not used.
+
+        max_tweets (int): flag users with more tweets than this
+        max_tweets_per_day (float): flag users averaging more tweets per day
+                                    active than this
+        min_duplicate_ratio (float): flag users with at least this fraction
+                                     of repeated tweets
+        min_url_ratio (float): flag users with at least this fraction of
+                               tweets containing urls
+        min_tweets (int): only users with at least this many tweets are
+                          flagged by the ratio and rate tests
+        require_all (bool): flag users failing all the given tests rather
+                            than any of them
+        """
+        features = self.features()
+        tweets = features["tweets"].values
+        tests = []
+        if max_tweets is not None:
+            tests.append(tweets > max_tweets)
+        enough = tweets >= min_tweets
+        if max_tweets_per_day is not None:
+            tests.append(enough & (tweets/features["days active"].fillna(1)
+                                   .values > max_tweets_per_day))
+        if min_duplicate_ratio is not None:
+            tests.append(enough & (features["duplicate ratio"].values >=
+                                   min_duplicate_ratio))
+        if min_url_ratio is not None:
+            tests.append(enough & (features["url ratio"].values >=
+                                   min_url_ratio))
+        if not tests:
+            return []
+        flagged = np.logical_and.reduce(tests) if require_all else \
+            np.logical_or.reduce(tests)
+        return features.index[flagged].tolist()
+
+    def keep_rows(self, keep):
+        """ Update index for tweets_df keeping only the rows where boolean
+        array keep is True (and being reindexed).
+        """
+        dropped = np.flatnonzero(~keep)
+        if not len(dropped):
+            return
+        affected = np.unique(self.user_ids[dropped])
+        affected = affected[affected != -1]
+        self.tweets -= np.bincount(self.user_ids[dropped][
+                                   self.user_ids[dropped] != -1],
+                                   minlength=len(self.usernames))
+        self.retweets -= self._user_sums(self._retweets, dropped)
+        self.favorites -= self._user_sums(self._favorites, dropped)
+        self.url_tweets -= self._user_sums(self._has_url, dropped)
+
+        # keep row features, and rows grouped by user, in new positions
+        new_positions = np.cumsum(keep) - 1
+        self._order = new_positions[self._order[keep[self._order]]]
+        self.user_ids = self.user_ids[keep]
+        self._texts = self._texts[keep]
+        self._dates = self._dates[keep]
+        self._retweets = self._retweets[keep]
+        self._favorites = self._favorites[keep]
+        self._has_url = self._has_url[keep]
+        self._duplicate = self._duplicate[keep]
+        self._group_starts()
+
+        # which tweet of a user counts as the first copy of a text can
+        # change, so duplicates and date spans of affected users are redone
+        rows = np.flatnonzero(np.in1d(self.user_ids, affected))
+        self._duplicate[rows] = self._duplicated(rows)
+        self.duplicates[affected] = 0
+        self.duplicates += self._user_sums(self._duplicate, rows)
+        self._date_spans(affected)
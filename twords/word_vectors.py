@@ -0,0 +1,213 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Word vectors of many target terms along many axis words at once.
+
+The word vector of a target term (e.g. u"taxes") along axis words (e.g.
+u"conservative", u"liberal", u"regulation", u"liberty") is the frequency of
+each axis word in the tweets containing the target, compared with the
+background frequency of the axis word. Rather than filtering the corpus once
+per target and building a word frequency dataframe of each filtered corpus,
+build_word_vectors tokenizes the text store once, a large chunk at a time,
+looks up only the distinct tokens of each chunk among the targets and axis
+words, and matches the tweets of targets and axis words with numpy, so any
+number of targets and axis words costs one pass over the text.
+
+Tokens are those of TextStore.tokenize - words, hashtags, mentions and
+single punctuation characters (a regular expression split, much faster than
+nltk tokenizing) - so targets and axis words are single tokens such as
+u"taxes" or u"#brexit". Frequencies are relative to the number of words in
+the target's tweets, leaving out stop words and punctuation, so they are on
+the same basis as the frequencies of word_freq_df and the background
+frequencies they are compared with.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# text is decoded and tokenized this many bytes at a time
+CHUNK_BYTES = 2**24
+
+# tokens counted as words: not single punctuation characters
+_WORD_PATTERN = re.compile(u"[#@]?\\w", re.UNICODE)
+
+
+def _as_unicode(terms):
+    return [term.decode("utf-8") if type(term) == str else term
+            for term in terms]
+
+
+def _counted(uniques, stop_words):
+    """ Return boolean array of which tokens of index uniques count towards
+    the words of a tweet: those that are not stop words or punctuation.
+    """
+    is_word = np.array([_WORD_PATTERN.match(token) is not None
+                        for token in uniques], dtype=bool)
+    return is_word & ~uniques.isin(stop_words)
+
+
+def build_word_vectors(text_store, targets, axes, background_frame=None,
+                       ignore_case=False, stop_words=()):
+    """ Return WordVectors of targets along axes in the texts of text_store.
+
+    text_store (TextStore): texts of the corpus (see Twords.text_store)
+    targets (list of strings): target terms (words, hashtags or mentions)
+    axes (list of strings): axis words
+    background_frame (pandas dataframe): background frequency of words,
+                                         indexed by word, with column
+                                         'background frequency' (see
+                                         Twords._background_frame)
+    ignore_case (bool): match targets and axis words in any case
+    stop_words (list of strings): words left out of the number of words in
+                                  the tweets of each target (see
+                                  Twords.stop_words)
+    """
+    targets = _as_unicode(targets)
+    axes = _as_unicode(axes)
+    stop_words = _as_unicode(stop_words)
+    assert targets and axes
+    if ignore_case:
+        targets = [term.lower() for term in targets]
+        axes = [term.lower() for term in axes]
+        stop_words = [word.lower() for word in stop_words]
+    # keep first of repeated terms
+    targets = pd.unique(pd.Series(targets, dtype=object)).tolist()
+    axes = pd.unique(pd.Series(axes, dtype=object)).tolist()
+    target_index = pd.Index(targets, dtype=object)
+    axis_index = pd.Index(axes, dtype=object)
+
+    tokens = np.zeros(len(text_store), dtype=np.int64)
+    target_rows, target_ids, axis_rows, axis_ids = \
+        [[np.zeros(0, dtype=np.int64)] for i in range(4)]
+    num_chunks = max(1, int(np.ceil(text_store.nbytes/float(CHUNK_BYTES))))
+    for start, stop in text_store.chunks(num_chunks):
+        # one tokenization of the chunk, then only the distinct tokens are
+        # looked up among the targets and axes
+        codes, uniques, rows = text_store.tokenize(start, stop,
+                                                   lower=ignore_case)
+        counted = _counted(uniques, stop_words)[codes]
+        tokens[start:stop] = np.bincount(rows[counted] - start,
+                                         minlength=stop - start)
+        for index, rows_list, ids_list in \
+                [(target_index, target_rows, target_ids),
+                 (axis_index, axis_rows, axis_ids)]:
+            ids = index.get_indexer(uniques)[codes]
+            rows_list.append(rows[ids != -1])
+            ids_list.append(ids[ids != -1].astype(np.int64))
+
+    # each (tweet, target) pair once, each (tweet, axis) pair with its count
+    target_pairs = np.unique(np.concatenate(target_rows)*len(targets) +
+                             np.concatenate(target_ids))
+    target_rows = target_pairs//len(targets)
+    target_ids = target_pairs % len(targets)
+    axis_pairs, axis_counts = np.unique(np.concatenate(axis_rows)*len(axes) +
+                                        np.concatenate(axis_ids),
+                                        return_counts=True)
+    pairs = pd.DataFrame({"row": target_rows, "target": target_ids}).merge(
+                pd.DataFrame({"row": axis_pairs//len(axes),
+                              "axis": axis_pairs % len(axes),
+                              "count": axis_counts}), on="row")
+    counts = np.bincount(pairs["target"].values*len(axes) +
+                         pairs["axis"].values,
+                         weights=pairs["count"].values,
+                         minlength=len(targets)*len(axes))
+    counts = counts.reshape(len(targets), len(axes)).astype(np.int64)
+    tweets = np.bincount(target_ids, minlength=len(targets))
+    target_tokens = np.bincount(target_ids, weights=tokens[target_rows],
+                                minlength=len(targets)).astype(np.int64)
+
+    if background_frame is None or not len(background_frame):
+        background = np.zeros(len(axes))
+    else:
+        background = background_frame["background frequency"].reindex(
+                        pd.Index(axes, dtype=object)).fillna(0).values
+    return WordVectors(targets, axes, counts, tweets, target_tokens,
+                       background)
+
+
+class WordVectors(object):
+    """ Axis word counts of each target term, as target by axis matrices.
+
+    targets (list of strings): target terms (rows)
+    axes (list of strings): axis words (columns)
+    counts (numpy int64 matrix): occurrences of each axis word in the tweets
+                                 containing each target
+    tweets (numpy int64 array): number of tweets containing each target
+    tokens (numpy int64 array): number of words (not stop words or
+                                punctuation) in those tweets
+    background (numpy float array): background frequency of each axis word
+                                    (0 if unknown)
+    """
+
+    def __init__(self, targets, axes, counts, tweets, tokens, background):
+        self.targets = targets
+        self.axes = axes
+        self.counts = counts
+        self.tweets = tweets
+        self.tokens = tokens
+        self.background = background
+
+    def __repr__(self):
+        return "WordVectors of %d targets along %d axes" % \
+            (len(self.targets), len(self.axes))
+
+    def frequencies(self):
+        """ Return matrix of the frequency of each axis word in the tweets of
+        each target.
+        """
+        tokens = np.maximum(self.tokens, 1).astype(np.float64)
+        return self.counts/tokens[:, np.newaxis]
+
+    def log_ratios(self):
+        """ Return matrix of log of frequency divided by background frequency
+        of each axis word for each target - 0 where the word doesn't occur or
+        has no background frequency, as in word_freq_df.
+        """
+        frequencies = self.frequencies()
+        known = (frequencies > 0) & (self.background > 0)[np.newaxis, :]
+        ratios = np.zeros(frequencies.shape)
+        ratios[known] = np.log((frequencies /
+                                np.where(self.background > 0,
+                                         self.background, 1))[known])
+        return ratios
+
+    def _values(self, values):
+        if values == "log relative frequency":
+            return self.log_ratios()
+        if values == "frequency":
+            return self.frequencies()
+        if values == "occurrences":
+            return self.counts.astype(np.float64)
+        raise Exception("values must be 'log relative frequency', "
+                        "'frequency' or 'occurrences'")
+
+    def to_frame(self, values="log relative frequency"):
+        """ Return dataframe of values (targets by axes).
+
+        values (string): "log relative frequency", "frequency" or
+                         "occurrences"
+        """
+        return pd.DataFrame(self._values(values),
+                            index=pd.Index(self.targets, name="target"),
+                            columns=pd.Index(self.axes, name="axis"))
+
+    def similarities(self, values="log relative frequency"):
+        """ Return dataframe of cosine similarity of the word vectors of
+        every pair of targets (0 for targets with all-zero vectors).
+        """
+        matrix = self._values(values)
+        norms = np.sqrt((matrix**2).sum(axis=1))
+        unit = matrix/np.where(norms > 0, norms, 1)[:, np.newaxis]
+        return pd.DataFrame(unit.dot(unit.T), index=self.targets,
+                            columns=self.targets)
+
+    def most_similar(self, target, n=10, values="log relative frequency"):
+        """ Return series of the n targets whose word vectors are most
+        similar (by cosine similarity) to that of target.
+        """
+        if type(target) == str:
+            target = target.decode("utf-8")
+        similarity = self.similarities(values)[target].drop(target)
+        return similarity.sort_values(ascending=False)[:n]